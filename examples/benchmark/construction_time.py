@@ -0,0 +1,103 @@
+"""Benchmark the construction time of the parallel models.
+
+Construction should scale with the number of parameters, not with the number of parallel heads:
+for a fixed parameter count, building many small heads should cost about as much as a few large ones.
+The models are timed alone, and through ``make_mdp_model`` and ``make_dreamer`` as the examples build them.
+
+    python examples/benchmark/construction_time.py
+"""
+import time
+
+import torch
+
+from intact.modules.models.dreamer_world_model import CausalRSSMPrior
+from intact.modules.models.layers import ParallelLinear, ParallelGRUCell
+from intact.modules.models.mdp_world_model import CausalWorldModel
+from intact.utils.envs.dreamer_env import make_dreamer_env
+from intact.utils.envs.mdp_env import make_mdp_env
+from intact.utils.models.dreamer import DreamerConfig, make_dreamer
+from intact.utils.models.mdp import MDPConfig, make_mdp_model
+
+
+def timeit(fn, repeat=5):
+    fn()  # warm up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def bench_layers(total_features=2**16):
+    print("layer / heads / seconds (fixed parameter count)")
+    for heads in [1, 16, 256, 4096]:
+        features = int((total_features / heads) ** 0.5)
+        linear_time = timeit(
+            lambda: ParallelLinear(features, features, extra_dims=[heads])
+        )
+        gru_time = timeit(
+            lambda: ParallelGRUCell(features, features, extra_dims=[heads])
+        )
+        print(f"ParallelLinear  {heads:5d} {linear_time:.5f}")
+        print(f"ParallelGRUCell {heads:5d} {gru_time:.5f}")
+
+
+def bench_models():
+    print("model / output dim / seconds")
+    for obs_dim in [4, 32, 128]:
+        wm_time = timeit(
+            lambda: CausalWorldModel(
+                obs_dim=obs_dim,
+                action_dim=obs_dim,
+                meta=True,
+                max_context_dim=10,
+                task_num=50,
+                hidden_dims=[200] * 4,
+            ),
+            repeat=2,
+        )
+        print(f"CausalWorldModel {obs_dim + 2:5d} {wm_time:.4f}")
+    for variable_num in [10, 64, 256]:
+        prior_time = timeit(
+            lambda: CausalRSSMPrior(
+                action_dim=6,
+                variable_num=variable_num,
+                meta=True,
+                max_context_dim=10,
+                task_num=50,
+            ),
+            repeat=2,
+        )
+        print(f"CausalRSSMPrior  {variable_num:5d} {prior_time:.4f}")
+
+
+def bench_factories():
+    # the full builds of the examples, with their envs and wrappers
+    print("factory / config / seconds")
+    mdp_env = make_mdp_env("MyCartPole-v0")
+    for model_type, ensemble_size in [
+        ("plain", 0),
+        ("causal", 0),
+        ("causal", 5),
+    ]:
+        cfg = MDPConfig()
+        cfg.model_type = model_type
+        cfg.ensemble_size = ensemble_size
+        cfg.meta = True
+        mdp_time = timeit(lambda: make_mdp_model(cfg, mdp_env), repeat=2)
+        print(
+            f"make_mdp_model {model_type:>6s} x{ensemble_size} {mdp_time:.4f}"
+        )
+
+    dreamer_env = make_dreamer_env("MyCartPole-v0")
+    for variable_num in [10, 64]:
+        cfg = DreamerConfig()
+        cfg.variable_num = variable_num
+        dreamer_time = timeit(lambda: make_dreamer(cfg, dreamer_env), repeat=2)
+        print(f"make_dreamer   {variable_num:5d} {dreamer_time:.4f}")
+
+
+if __name__ == "__main__":
+    torch.set_num_threads(1)
+    bench_layers()
+    bench_models()
+    bench_factories()
@@ -8,7 +8,7 @@ import torch
 from torch.nn.utils import clip_grad_norm_
 from tqdm import tqdm
 from tensordict.nn.probabilistic import InteractionType
-from torchrl.envs import ParallelEnv, SerialEnv, TransformedEnv
+from torchrl.envs import ParallelEnv, TransformedEnv
 from torchrl.record import VideoRecorder
 from torchrl.modules.tensordict_module.exploration import (
     AdditiveGaussianWrapper,
@@ -26,9 +26,13 @@ from intact.utils import (
     build_logger,
     evaluate_policy,
     plot_context,
-    match_length,
+    chunk_sequences,
+)
+from intact.utils.envs import (
+    make_dreamer_env,
+    create_make_env_list,
+    ParallelMetaEnv,
 )
-from intact.utils.envs import make_dreamer_env, create_make_env_list
 from intact.objectives.causal_dreamer import CausalDreamerModelLoss
 
 from utils import meta_test, train_model, train_agent
@@ -117,8 +121,8 @@ def main(cfg: "DictConfig"):  # noqa: F821
     ).to(device)
 
     collector = aSyncDataCollector(
-        create_env_fn=SerialEnv(
-            task_num, train_make_env_list, shared_memory=False
+        create_env_fn=ParallelMetaEnv(
+            train_make_env_list, num_workers=cfg.env_workers, seed=cfg.seed
         ),
         policy=exploration_policy,
         total_frames=cfg.train_frames_per_task,
@@ -192,8 +196,7 @@ def main(cfg: "DictConfig"):  # noqa: F821
         pbar.update(current_frames)
         collected_frames += current_frames
 
-        tensordict = match_length(tensordict, cfg.batch_length)
-        tensordict = tensordict.reshape(-1, cfg.batch_length)
+        tensordict = chunk_sequences(tensordict, cfg.batch_length)
 
         replay_buffer.extend(tensordict.cpu())
 
@@ -15,7 +15,7 @@ from intact.objectives.causal_dreamer import CausalDreamerModelLoss
 from intact.utils.eval import evaluate_policy
 from intact.utils.envs import make_dreamer_env
 from intact.utils.plot import plot_context
-from intact.utils.data import match_length
+from intact.utils.data import chunk_sequences
 
 
 def grad_norm(optimizer: torch.optim.Optimizer):
@@ -254,7 +254,7 @@ def meta_test(
     for frame, tensordict in enumerate(collector):
         current_frames = tensordict.get(("collector", "mask")).sum().item()
         pbar.update(current_frames)
-        tensordict = match_length(tensordict, cfg.batch_length)
+        tensordict = chunk_sequences(tensordict, cfg.batch_length)
         replay_buffer.extend(tensordict.reshape(-1))
 
         train_model_iters = train_model(
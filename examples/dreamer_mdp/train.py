@@ -5,12 +5,7 @@ from tqdm import tqdm
 import numpy as np
 import hydra
 import torch
-from torchrl.envs import SerialEnv
 from torchrl.collectors.collectors import aSyncDataCollector, SyncDataCollector
-from torchrl.data.replay_buffers import (
-    TensorDictReplayBuffer,
-    LazyMemmapStorage,
-)
 from torchrl.modules.tensordict_module.exploration import (
     AdditiveGaussianWrapper,
 )
@@ -20,10 +15,14 @@ from intact.utils import (
     make_mdp_dreamer,
     build_logger,
     evaluate_policy,
-    plot_context,
-    match_length,
+    ContextPlotter,
+    SequenceReplayBuffer,
+)
+from intact.utils.envs import (
+    make_mdp_env,
+    create_make_env_list,
+    ParallelMetaEnv,
 )
-from intact.utils.envs import make_mdp_env, create_make_env_list
 
 from utils import meta_test, train_model, train_policy, build_loss
 
@@ -77,10 +76,11 @@ def main(cfg):
     )
     del proof_env
 
-    serial_env = SerialEnv(task_num, train_make_env_list, shared_memory=False)
-    serial_env.set_seed(cfg.seed)
+    train_env = ParallelMetaEnv(
+        train_make_env_list, num_workers=cfg.env_workers, seed=cfg.seed
+    )
     collector = aSyncDataCollector(
-        create_env_fn=serial_env,
+        create_env_fn=train_env,
         policy=explore_policy,
         total_frames=cfg.meta_train_frames,
         frames_per_batch=cfg.frames_per_batch,
@@ -90,13 +90,13 @@ def main(cfg):
         split_trajs=True,
     )
 
-    # replay buffer
+    # replay buffer, of the transitions of as many sequences as buffer_size
     buffer_size = (
-        cfg.meta_train_frames if cfg.buffer_size == -1 else cfg.buffer_size
-    )
-    replay_buffer = TensorDictReplayBuffer(
-        storage=LazyMemmapStorage(max_size=buffer_size),
+        cfg.meta_train_frames
+        if cfg.buffer_size == -1
+        else cfg.buffer_size * cfg.batch_length
     )
+    replay_buffer = SequenceReplayBuffer(buffer_size, cfg.batch_length)
     final_seed = collector.set_seed(cfg.seed)
     print(f"init seed: {cfg.seed}, final seed: {final_seed}")
 
@@ -139,6 +139,13 @@ def main(cfg):
     actor_opt = torch.optim.Adam(actor.parameters(), lr=cfg.actor_lr)
     critic_opt = torch.optim.Adam(critic.parameters(), lr=cfg.critic_lr)
 
+    context_plotter = ContextPlotter(
+        cfg,
+        train_oracle_context,
+        logger,
+        plot_interval=cfg.plot_context_interval,
+    )
+
     # Training loop
     collected_frames = 0
     train_model_iters = 0
@@ -151,9 +158,6 @@ def main(cfg):
         pbar.update(current_frames)
         collected_frames += current_frames
 
-        tensordict = match_length(tensordict, cfg.batch_length)
-        tensordict = tensordict.reshape(-1, cfg.batch_length)
-
         replay_buffer.extend(tensordict)
 
         mask = tensordict.get(("collector", "mask"))
@@ -235,13 +239,7 @@ def main(cfg):
             )
 
         if cfg.meta:
-            plot_context(
-                cfg,
-                world_model,
-                train_oracle_context,
-                logger,
-                collected_frames,
-            )
+            context_plotter(world_model, collected_frames)
         if cfg.model_type == "causal":
             print()
             print(world_model.causal_mask.printing_mask)
@@ -266,6 +264,7 @@ def main(cfg):
         logger.dump_scaler(collected_frames)
 
     collector.shutdown()
+    context_plotter.close()
 
 
 if __name__ == "__main__":
@@ -18,7 +18,7 @@ from intact.objectives.mdp import (
     DreamCriticLoss,
 )
 from intact.envs.mdp_env import MDPEnv
-from intact.utils import evaluate_policy, plot_context, match_length
+from intact.utils import evaluate_policy, plot_context, chunk_sequences
 
 
 def reset_module(world_model, actor, critic, new_domain_task_num):
@@ -206,6 +206,7 @@ def build_loss(cfg, world_model, model_based_env, actor, critic):
         context_sparse_weight=cfg.context_sparse_weight,
         context_max_weight=cfg.context_max_weight,
         sampling_times=cfg.sampling_times,
+        bootstrap=cfg.ensemble_bootstrap,
     ).to(device)
     actor_loss = DreamActorLoss(
         actor,
@@ -215,6 +216,7 @@ def build_loss(cfg, world_model, model_based_env, actor, critic):
         discount_loss=cfg.discount_loss,
         pred_continue=cfg.pred_continue,
         lambda_entropy=cfg.lambda_entropy,
+        compact_rollout=cfg.compact_rollout,
     )
     critic_loss = DreamCriticLoss(
         critic,
@@ -251,6 +253,7 @@ def meta_test(
         world_model,
         termination_fns=cfg.termination_fns,
         reward_fns=cfg.reward_fns,
+        compile_step=cfg.compile_step,
     ).to(device)
     model_based_env.set_specs_from_env(proof_env)
     del proof_env
@@ -285,8 +288,7 @@ def meta_test(
         current_frames = tensordict.get(("collector", "mask")).sum().item()
         pbar.update(current_frames)
         collected_frames += current_frames
-        tensordict = match_length(tensordict, cfg.batch_length)
-        tensordict = tensordict.reshape(-1, cfg.batch_length)
+        tensordict = chunk_sequences(tensordict, cfg.batch_length)
         replay_buffer.extend(tensordict)
 
         train_model(
@@ -90,6 +90,8 @@ def main(path, load_frames, train_frames_per_task):
         lambda_reward=cfg.lambda_reward,
         lambda_terminated=cfg.lambda_terminated,
         lambda_mutual_info=cfg.lambda_mutual_info,
+        mutual_info_anchors=cfg.mutual_info_anchors,
+        mutual_info_chunk_size=cfg.mutual_info_chunk_size,
         sparse_weight=cfg.sparse_weight,
         context_sparse_weight=cfg.context_sparse_weight,
         context_max_weight=cfg.context_max_weight,
@@ -102,6 +104,10 @@ def main(path, load_frames, train_frames_per_task):
         optim_steps=cfg.optim_steps,
         num_candidates=cfg.num_candidates,
         top_k=cfg.top_k,
+        backend=cfg.planner_backend,
+        warm_start=cfg.warm_start,
+        warm_optim_steps=cfg.warm_optim_steps,
+        compact_rollout=cfg.compact_rollout,
     )
 
     explore_policy = AdditiveGaussianWrapper(
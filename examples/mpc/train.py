@@ -5,12 +5,7 @@ from tqdm import tqdm
 import numpy as np
 import hydra
 import torch
-from torchrl.envs import SerialEnv
 from torchrl.collectors.collectors import aSyncDataCollector, SyncDataCollector
-from torchrl.data.replay_buffers import (
-    TensorDictReplayBuffer,
-    LazyMemmapStorage,
-)
 from torchrl.modules.tensordict_module.exploration import (
     AdditiveGaussianWrapper,
 )
@@ -19,10 +14,15 @@ from intact.utils import (
     make_mdp_model,
     build_logger,
     evaluate_policy,
-    plot_context,
-    match_length,
+    ContextPlotter,
+    CollectorPipeline,
+    SequenceReplayBuffer,
+)
+from intact.utils.envs import (
+    make_mdp_env,
+    create_make_env_list,
+    ParallelMetaEnv,
 )
-from intact.utils.envs import make_mdp_env, create_make_env_list
 from intact.objectives.mdp.causal_mdp import CausalWorldModelLoss
 from intact.modules.planners.cem import MyCEMPlanner as CEMPlanner
 
@@ -74,6 +74,7 @@ def main(cfg):
         context_sparse_weight=cfg.context_sparse_weight,
         context_max_weight=cfg.context_max_weight,
         sampling_times=cfg.sampling_times,
+        bootstrap=cfg.ensemble_bootstrap,
     ).to(device)
 
     planner = CEMPlanner(
@@ -82,6 +83,10 @@ def main(cfg):
         optim_steps=cfg.optim_steps,
         num_candidates=cfg.num_candidates,
         top_k=cfg.top_k,
+        backend=cfg.planner_backend,
+        warm_start=cfg.warm_start,
+        warm_optim_steps=cfg.warm_optim_steps,
+        compact_rollout=cfg.compact_rollout,
     )
 
     explore_policy = AdditiveGaussianWrapper(
@@ -93,10 +98,11 @@ def main(cfg):
     )
     del proof_env
 
-    serial_env = SerialEnv(task_num, train_make_env_list, shared_memory=False)
-    serial_env.set_seed(cfg.seed)
+    train_env = ParallelMetaEnv(
+        train_make_env_list, num_workers=cfg.env_workers, seed=cfg.seed
+    )
     collector = aSyncDataCollector(
-        create_env_fn=serial_env,
+        create_env_fn=train_env,
         policy=explore_policy,
         total_frames=cfg.meta_train_frames,
         frames_per_batch=cfg.frames_per_batch,
@@ -106,13 +112,13 @@ def main(cfg):
         split_trajs=True,
     )
 
-    # replay buffer
+    # replay buffer, of the transitions of as many sequences as buffer_size
     buffer_size = (
-        cfg.meta_train_frames if cfg.buffer_size == -1 else cfg.buffer_size
-    )
-    replay_buffer = TensorDictReplayBuffer(
-        storage=LazyMemmapStorage(max_size=buffer_size),
+        cfg.meta_train_frames
+        if cfg.buffer_size == -1
+        else cfg.buffer_size * cfg.batch_length
     )
+    replay_buffer = SequenceReplayBuffer(buffer_size, cfg.batch_length)
     final_seed = collector.set_seed(cfg.seed)
     print(f"init seed: {cfg.seed}, final seed: {final_seed}")
 
@@ -152,20 +158,31 @@ def main(cfg):
                 )
             )
 
+    context_plotter = ContextPlotter(
+        cfg,
+        train_oracle_context,
+        logger,
+        plot_interval=cfg.plot_context_interval,
+    )
+
+    # the batches are collected and put in the replay buffer while the model trains
+    pipeline = CollectorPipeline(
+        collector,
+        replay_buffer,
+        max_queue_size=cfg.pipeline_queue_size,
+        max_staleness=cfg.max_policy_staleness,
+        logger=logger,
+    )
+
     # Training loop
     collected_frames = 0
     train_model_iters = 0
     pbar = tqdm(total=cfg.meta_train_frames)
-    for i, tensordict in enumerate(collector):
+    for i, tensordict in enumerate(pipeline):
         current_frames = tensordict.get(("collector", "mask")).sum().item()
         pbar.update(current_frames)
         collected_frames += current_frames
 
-        tensordict = match_length(tensordict, cfg.batch_length)
-        tensordict = tensordict.reshape(-1, cfg.batch_length)
-
-        replay_buffer.extend(tensordict)
-
         mask = tensordict.get(("collector", "mask"))
         episode_reward = tensordict.get(("next", "episode_reward"))[mask]
         episode_length = tensordict["next", "step_count"][mask].float()
@@ -204,6 +221,7 @@ def main(cfg):
             logger,
             iters=train_model_iters,
         )
+        pipeline.record_updates(cfg.optim_steps_per_batch)
 
         if (i + 1) % cfg.eval_interval == 0:
             evaluate_policy(
@@ -225,13 +243,7 @@ def main(cfg):
             )
 
         if cfg.meta:
-            plot_context(
-                cfg,
-                world_model,
-                train_oracle_context,
-                logger,
-                collected_frames,
-            )
+            context_plotter(world_model, collected_frames)
         if cfg.model_type == "causal":
             print()
             print(world_model.causal_mask.printing_mask)
@@ -245,7 +257,9 @@ def main(cfg):
 
         logger.dump_scaler(collected_frames)
 
+    pipeline.shutdown()
     collector.shutdown()
+    context_plotter.close()
 
 
 if __name__ == "__main__":
@@ -11,7 +11,7 @@ from torchrl.data.replay_buffers.storages import ListStorage
 
 from intact.objectives.mdp.causal_mdp import CausalWorldModelLoss
 from intact.envs.mdp_env import MDPEnv
-from intact.utils import evaluate_policy, plot_context, match_length
+from intact.utils import evaluate_policy, plot_context, chunk_sequences
 
 
 def reset_module(policy, task_num):
@@ -78,7 +78,10 @@ def train_model(
             logits_opt.step()
         else:
             loss_td, total_loss = world_model_loss(
-                sampled_tensordict, deterministic_mask, only_train
+                sampled_tensordict,
+                deterministic_mask,
+                only_train,
+                return_loss_td=logger is not None,
             )
             # context_penalty = (world_model.context_model.context_hat ** 2).sum()
             # total_loss += context_penalty * 0.1
@@ -153,6 +156,8 @@ def meta_test(
         lambda_reward=cfg.lambda_reward,
         lambda_terminated=cfg.lambda_terminated,
         lambda_mutual_info=cfg.lambda_mutual_info,
+        mutual_info_anchors=cfg.mutual_info_anchors,
+        mutual_info_chunk_size=cfg.mutual_info_chunk_size,
         sparse_weight=cfg.sparse_weight,
         context_sparse_weight=cfg.context_sparse_weight,
         context_max_weight=cfg.context_max_weight,
@@ -183,21 +188,30 @@ def meta_test(
         current_frames = tensordict.get(("collector", "mask")).sum().item()
         pbar.update(current_frames)
         collected_frames += current_frames
-        tensordict = match_length(tensordict, cfg.batch_length)
-        tensordict = tensordict.reshape(-1, cfg.batch_length)
+        if cfg.fast_context_inference:
+            # closed-form updates on the new transitions instead of optimizer steps on the buffer
+            valid_tensordict = tensordict[
+                tensordict.get(("collector", "mask"))
+            ]
+            world_model.infer_context(
+                valid_tensordict.to(device),
+                newton_steps=cfg.context_newton_steps,
+            )
+        tensordict = chunk_sequences(tensordict, cfg.batch_length)
         replay_buffer.extend(tensordict)
 
-        train_model(
-            cfg,
-            replay_buffer,
-            world_model,
-            world_model_loss,
-            training_steps=cfg.optim_steps_per_batch,
-            model_opt=world_model_opt,
-            logger=logger,
-            log_prefix=f"meta_test_model_{log_idx}",
-            deterministic_mask=True,
-        )
+        if not cfg.fast_context_inference:
+            train_model(
+                cfg,
+                replay_buffer,
+                world_model,
+                world_model_loss,
+                training_steps=cfg.optim_steps_per_batch,
+                model_opt=world_model_opt,
+                logger=logger,
+                log_prefix=f"meta_test_model_{log_idx}",
+                deterministic_mask=True,
+            )
         plot_context(
             cfg,
             world_model,
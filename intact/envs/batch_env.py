@@ -0,0 +1,107 @@
+from typing import Optional
+
+import torch
+from tensordict import TensorDict, TensorDictBase
+from torchrl.data import CompositeSpec, DiscreteTensorSpec
+from torchrl.envs import EnvBase
+
+
+class BatchMetaEnvBase(EnvBase):
+    def __init__(
+        self,
+        num_envs: int,
+        task_idx: Optional[torch.Tensor] = None,
+        task_num: Optional[int] = None,
+        seed: Optional[int] = None,
+        device="cpu",
+    ):
+        """Base class of the batched meta envs, stepping one task per env at once with tensor ops.
+
+        The env has batch size (num_envs,), and writes the task index of every env under "idx" like
+        ``MetaIdxTransform``. Resets are partial: only the envs flagged by "_reset" are reset, which is
+        how ``step_and_maybe_reset`` (in non-stopping rollouts and collectors) auto-resets the envs
+        that are done while keeping their last observation under "next".
+
+        Args:
+            num_envs (int): the number of envs.
+            task_idx (torch.Tensor, optional): the task indices of the envs, with shape (num_envs,).
+                Defaults to None, i.e. ``arange(num_envs)``.
+            task_num (int, optional): the number of tasks. Defaults to None, i.e. num_envs.
+            seed (int, optional): the seed of the resets. Defaults to None.
+            device (str, optional): the device of the env. Defaults to "cpu".
+        """
+        super().__init__(device=device, batch_size=torch.Size([num_envs]))
+        if task_idx is None:
+            task_idx = torch.arange(num_envs)
+        self.idx = torch.as_tensor(task_idx, dtype=torch.long).to(self.device)
+        self.task_num = num_envs if task_num is None else task_num
+
+        self.rng = torch.Generator(device=self.device)
+        if seed is None:
+            self.rng.seed()
+        else:
+            self.rng.manual_seed(seed)
+
+        self.done_spec = CompositeSpec(
+            **{
+                key: DiscreteTensorSpec(
+                    2,
+                    shape=(num_envs, 1),
+                    dtype=torch.bool,
+                    device=self.device,
+                )
+                for key in ["done", "terminated", "truncated"]
+            },
+            shape=(num_envs,),
+        )
+
+    def set_observation_spec(self, **specs):
+        self.observation_spec = CompositeSpec(
+            **specs,
+            idx=DiscreteTensorSpec(
+                n=self.task_num,
+                shape=(*self.batch_size, 1),
+                device=self.device,
+            ),
+            shape=self.batch_size,
+        )
+
+    def get_reset_mask(
+        self, tensordict: Optional[TensorDictBase]
+    ) -> Optional[torch.Tensor]:
+        """Gets the envs to reset, with shape (num_envs, 1), or None to reset all of them."""
+        reset = None if tensordict is None else tensordict.get("_reset", None)
+        if reset is None:
+            return None
+        return reset.reshape(*self.batch_size, 1)
+
+    def build_tensordict(
+        self,
+        observation: torch.Tensor,
+        terminated: Optional[torch.Tensor] = None,
+        reward: Optional[torch.Tensor] = None,
+    ) -> TensorDictBase:
+        if terminated is None:
+            terminated = torch.zeros(
+                *self.batch_size, 1, dtype=torch.bool, device=self.device
+            )
+        tensordict = TensorDict(
+            {
+                "observation": observation,
+                "idx": self.idx.unsqueeze(-1),
+                "done": terminated.clone(),
+                "terminated": terminated,
+                # the truncation is left to ``StepCounter``
+                "truncated": torch.zeros_like(terminated),
+            },
+            batch_size=self.batch_size,
+            device=self.device,
+        )
+        if reward is not None:
+            tensordict.set("reward", reward)
+        return tensordict
+
+    def _set_seed(self, seed: Optional[int]):
+        if seed is not None:
+            self.rng.manual_seed(seed)
+        return seed
@@ -49,3 +49,45 @@ register(
         context_influence_type="linear",
     ),
 )
+
+# batched torch versions of the envs above, which step the contexts of every task at once,
+# see ``intact.utils.envs.make_batch_mdp_env``
+batch_registry = {}
+
+
+def register_batch(id, entry_point, kwargs=None):
+    batch_registry[id] = dict(entry_point=entry_point, kwargs=kwargs or {})
+
+
+register_batch(
+    id="MyCartPole-v0",
+    entry_point="intact.envs.gym_like.cartpole:BatchCartPoleEnv",
+)
+
+register_batch(
+    id="MultiNode53-v0",
+    entry_point="intact.envs.gym_like.multi_node:BatchMultiNodeEnv",
+    kwargs=dict(num_rooms=5, context_dim=3, sparsity=0.5),
+)
+
+register_batch(
+    id="MultiNode53L-v0",
+    entry_point="intact.envs.gym_like.multi_node:BatchMultiNodeEnv",
+    kwargs=dict(
+        num_rooms=5,
+        context_dim=3,
+        sparsity=0.5,
+        context_influence_type="linear",
+    ),
+)
+
+register_batch(
+    id="MultiNode84L-v0",
+    entry_point="intact.envs.gym_like.multi_node:BatchMultiNodeEnv",
+    kwargs=dict(
+        num_rooms=8,
+        context_dim=4,
+        sparsity=0.5,
+        context_influence_type="linear",
+    ),
+)
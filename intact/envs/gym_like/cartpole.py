@@ -9,9 +9,14 @@ from typing import Optional, Union
 
 import gym
 import numpy as np
+import torch
 from gym import logger, spaces
 from gym.envs.classic_control import utils
 from gym.error import DependencyNotInstalled
+from tensordict import TensorDictBase
+from torchrl.data import BoundedTensorSpec, UnboundedContinuousTensorSpec
+
+from intact.envs.batch_env import BatchMetaEnvBase
 
 
 class CartPoleEnv(gym.Env[np.ndarray, Union[int, np.ndarray]]):
@@ -345,3 +350,173 @@ class CartPoleEnv(gym.Env[np.ndarray, Union[int, np.ndarray]]):
             pygame.display.quit()
             pygame.quit()
             self.isopen = False
+
+
+class BatchCartPoleEnv(BatchMetaEnvBase):
+    context_names = (
+        "gravity",
+        "masscart",
+        "masspole",
+        "length",
+        "force_mag",
+        "cart_vel_bias",
+        "pole_vel_bias",
+    )
+
+    def __init__(
+        self,
+        num_envs: int,
+        gravity: Union[float, torch.Tensor] = 9.8,
+        masscart: Union[float, torch.Tensor] = 1.0,
+        masspole: Union[float, torch.Tensor] = 0.1,
+        length: Union[float, torch.Tensor] = 0.5,
+        force_mag: Union[float, torch.Tensor] = 10.0,
+        cart_vel_bias: Union[float, torch.Tensor] = 0.0,
+        pole_vel_bias: Union[float, torch.Tensor] = 0.0,
+        tau: float = 0.02,
+        theta_threshold_degree: float = 12,
+        task_idx: Optional[torch.Tensor] = None,
+        task_num: Optional[int] = None,
+        seed: Optional[int] = None,
+        device="cpu",
+    ):
+        """Batched torch version of ``CartPoleEnv``, stepping every task at once.
+
+        Every context (gravity, masscart, masspole, length, force_mag, cart_vel_bias and pole_vel_bias)
+        is either a float shared by all envs or a tensor with shape (num_envs,), and the euler step of
+        all envs is a handful of tensor ops. The envs that are done are reset by ``step_and_maybe_reset``
+        through "_reset". Rendering goes through a lazily built ``CartPoleEnv``.
+
+        Args:
+            num_envs (int): the number of envs.
+            gravity, masscart, masspole, length, force_mag, cart_vel_bias, pole_vel_bias (float or
+                torch.Tensor, optional): the contexts, see ``CartPoleEnv``.
+            tau (float, optional): the seconds between state updates. Defaults to 0.02.
+            theta_threshold_degree (float, optional): the pole angle of termination. Defaults to 12.
+            task_idx (torch.Tensor, optional): the task indices of the envs, with shape (num_envs,).
+                Defaults to None, i.e. ``arange(num_envs)``.
+            task_num (int, optional): the number of tasks. Defaults to None, i.e. num_envs.
+            seed (int, optional): the seed of the resets. Defaults to None.
+            device (str, optional): the device of the env. Defaults to "cpu".
+        """
+        super().__init__(
+            num_envs,
+            task_idx=task_idx,
+            task_num=task_num,
+            seed=seed,
+            device=device,
+        )
+        contexts = dict(
+            gravity=gravity,
+            masscart=masscart,
+            masspole=masspole,
+            length=length,
+            force_mag=force_mag,
+            cart_vel_bias=cart_vel_bias,
+            pole_vel_bias=pole_vel_bias,
+        )
+        for name, value in contexts.items():
+            value = torch.as_tensor(value, dtype=torch.float32).to(self.device)
+            setattr(self, name, value.expand(num_envs).clone())
+        self.total_mass = self.masspole + self.masscart
+        self.polemass_length = self.masspole * self.length
+        self.tau = tau
+
+        self.theta_threshold_radians = (
+            theta_threshold_degree * 2 * math.pi / 360
+        )
+        self.x_threshold = 2.4
+
+        self.state = torch.zeros(num_envs, 4, device=self.device)
+        self._render_env = None
+
+        self.set_observation_spec(
+            observation=UnboundedContinuousTensorSpec(
+                shape=(num_envs, 4), device=self.device
+            )
+        )
+        self.action_spec = BoundedTensorSpec(
+            -1.0, 1.0, shape=(num_envs, 1), device=self.device
+        )
+        self.reward_spec = UnboundedContinuousTensorSpec(
+            shape=(num_envs, 1), device=self.device
+        )
+
+    @classmethod
+    def from_oracle_context(cls, oracle_context: TensorDictBase, **kwargs):
+        """Builds one env per task of ``oracle_context``, whose keys are the names of the contexts."""
+        for name in oracle_context.keys():
+            if name not in cls.context_names:
+                raise ValueError("Unknown context: {}".format(name))
+        contexts = dict(
+            (name, oracle_context.get(name)) for name in oracle_context.keys()
+        )
+        return cls(oracle_context.shape[0], **contexts, **kwargs)
+
+    def get_obs(self):
+        obs = self.state.clone()
+        obs[:, 1] += self.cart_vel_bias
+        # the pole velocity bias is added twice, as in ``CartPoleEnv.get_obs``
+        obs[:, 3] += 2 * self.pole_vel_bias
+        return obs
+
+    @torch.no_grad()
+    def _step(self, tensordict: TensorDictBase) -> TensorDictBase:
+        x, x_dot, theta, theta_dot = self.state.unbind(-1)
+        force = self.force_mag * tensordict.get("action").squeeze(-1)
+        costheta = torch.cos(theta)
+        sintheta = torch.sin(theta)
+
+        temp = (
+            force + self.polemass_length * theta_dot**2 * sintheta
+        ) / self.total_mass
+        thetaacc = (self.gravity * sintheta - costheta * temp) / (
+            self.length
+            * (4.0 / 3.0 - self.masspole * costheta**2 / self.total_mass)
+        )
+        xacc = (
+            temp - self.polemass_length * thetaacc * costheta / self.total_mass
+        )
+
+        # euler
+        x = x + self.tau * x_dot
+        x_dot = x_dot + self.tau * xacc
+        theta = theta + self.tau * theta_dot
+        theta_dot = theta_dot + self.tau * thetaacc
+        self.state = torch.stack([x, x_dot, theta, theta_dot], dim=-1)
+
+        terminated = (x.abs() > self.x_threshold) | (
+            theta.abs() > self.theta_threshold_radians
+        )
+        # the reward is 1 up to and including the termination step, and the env is reset after it
+        reward = torch.ones(*self.batch_size, 1, device=self.device)
+        return self.build_tensordict(
+            self.get_obs(), terminated=terminated.unsqueeze(-1), reward=reward
+        )
+
+    def _reset(self, tensordict: Optional[TensorDictBase] = None, **kwargs):
+        state = 0.1 * torch.rand(
+            self.state.shape, generator=self.rng, device=self.device
+        )
+        state -= 0.05
+        reset = self.get_reset_mask(tensordict)
+        if reset is None:
+            self.state = state
+        else:
+            self.state = torch.where(reset, state, self.state)
+        return self.build_tensordict(self.get_obs())
+
+    def render(self, env_idx: int = 0):
+        """Renders the env ``env_idx`` as an rgb array."""
+        if self._render_env is None:
+            self._render_env = CartPoleEnv(render_mode="rgb_array")
+        self._render_env.x_threshold = self.x_threshold
+        self._render_env.length = self.length[env_idx].item()
+        self._render_env.state = self.state[env_idx].cpu().numpy()
+        return self._render_env.render()
+
+    def close(self):
+        if self._render_env is not None:
+            self._render_env.close()
+            self._render_env = None
+        super().close()
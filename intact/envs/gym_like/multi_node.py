@@ -4,7 +4,10 @@ import gym
 import numpy as np
 import torch
 from gym.core import ObsType
+from tensordict import TensorDictBase
+from torchrl.data import BoundedTensorSpec, UnboundedContinuousTensorSpec
 
+from intact.envs.batch_env import BatchMetaEnvBase
 from intact.modules.utils import build_mlp
 from intact.utils.graph import check_structural_sparsity
 
@@ -45,6 +48,27 @@ def generate_influence_function(num_rooms, context_dim):
     return func
 
 
+def generate_structure(
+    num_rooms,
+    context_dim,
+    sparsity,
+    context_sparsity,
+    seed,
+    context_influence_type,
+):
+    """Generates the room graph, the context graph and the influence function of a seed."""
+    torch.manual_seed(seed)
+    room_graph = generate_graph_cross_rooms(num_rooms, sparsity)
+    context_graph = generate_graph_between_room_and_context(
+        num_rooms, context_dim, context_sparsity
+    )
+    inf_func = generate_influence_function(
+        num_rooms=num_rooms,
+        context_dim=context_dim if context_influence_type == "neural" else 0,
+    )
+    return room_graph, context_graph, inf_func
+
+
 class MultiNodeEnv(gym.Env):
     def __init__(
         self,
@@ -79,26 +103,22 @@ class MultiNodeEnv(gym.Env):
                 del context_kwargs[f"c{i + 1}"]
         # assert len(context_kwargs) == 0, f"Unknown context variables: {context_kwargs}"
 
-        torch.manual_seed(self.seed)
-        self.room_graph = generate_graph_cross_rooms(
-            self.num_rooms, self.sparsity
-        )
-        self.context_graph = generate_graph_between_room_and_context(
-            self.num_rooms, self.context_dim, self.context_sparsity
+        (
+            self.room_graph,
+            self.context_graph,
+            self.inf_func,
+        ) = generate_structure(
+            self.num_rooms,
+            self.context_dim,
+            self.sparsity,
+            self.context_sparsity,
+            self.seed,
+            self.context_influence_type,
         )
 
         self.masked_context = self.context_graph * self.contexts.expand(
             self.num_rooms, -1
         )
-
-        self.inf_func = generate_influence_function(
-            num_rooms=self.num_rooms,
-            context_dim=(
-                self.context_dim
-                if self.context_influence_type == "neural"
-                else 0
-            ),
-        )
         self.influence = None
 
         self.action_space = gym.spaces.Box(
@@ -181,6 +201,153 @@ class MultiNodeEnv(gym.Env):
         return string
 
 
+class BatchMultiNodeEnv(BatchMetaEnvBase):
+    def __init__(
+        self,
+        contexts: torch.Tensor,
+        num_rooms=5,
+        context_dim=3,
+        sparsity=0.5,
+        context_sparsity=0.3,
+        dt=0.1,
+        seed=42,
+        context_influence_type="neural",
+        task_idx: Optional[torch.Tensor] = None,
+        task_num: Optional[int] = None,
+        device="cpu",
+    ):
+        """Batched torch version of ``MultiNodeEnv``, stepping every task at once.
+
+        The env has batch size (num_envs,), each env with its own contexts and the same graphs and
+        influence function as ``MultiNodeEnv`` with the same seed. There is no termination.
+
+        Args:
+            contexts (torch.Tensor): the contexts of the envs, with shape (num_envs, context_dim).
+            num_rooms (int, optional): the number of rooms. Defaults to 5.
+            context_dim (int, optional): the number of contexts. Defaults to 3.
+            sparsity (float, optional): the density of the room graph. Defaults to 0.5.
+            context_sparsity (float, optional): the density of the context graph. Defaults to 0.3.
+            dt (float, optional): the time step. Defaults to 0.1.
+            seed (int, optional): the seed of the graphs, the influence function and the resets.
+                Defaults to 42.
+            context_influence_type (str, optional): "neural", "linear" or "tanh". Defaults to "neural".
+            task_idx (torch.Tensor, optional): the task indices of the envs, with shape (num_envs,).
+                Defaults to None, i.e. ``arange(num_envs)``.
+            task_num (int, optional): the number of tasks. Defaults to None, i.e. num_envs.
+            device (str, optional): the device of the env. Defaults to "cpu".
+        """
+        assert (
+            context_dim <= num_rooms
+        ), "source variables should be less than observed variables"
+        if context_influence_type not in ["neural", "linear", "tanh"]:
+            raise NotImplementedError(
+                "context influence type {} is not supported".format(
+                    context_influence_type
+                )
+            )
+        contexts = torch.as_tensor(contexts, dtype=torch.float32)
+        assert contexts.shape[-1] == context_dim
+        num_envs = contexts.shape[0]
+        super().__init__(
+            num_envs,
+            task_idx=task_idx,
+            task_num=task_num,
+            seed=seed,
+            device=device,
+        )
+
+        self.num_rooms = num_rooms
+        self.context_dim = context_dim
+        self.dt = dt
+        self.context_influence_type = context_influence_type
+
+        with torch.random.fork_rng(devices=[]):
+            room_graph, context_graph, inf_func = generate_structure(
+                num_rooms,
+                context_dim,
+                sparsity,
+                context_sparsity,
+                seed,
+                context_influence_type,
+            )
+        self.room_graph = room_graph.float().to(self.device)
+        self.context_graph = context_graph.to(self.device)
+        self.inf_func = inf_func.to(self.device).requires_grad_(False)
+
+        self.contexts = contexts.to(self.device)
+        # (num_envs, num_rooms, context_dim)
+        self.masked_context = self.context_graph * self.contexts.unsqueeze(-2)
+
+        self.temperature = torch.zeros(num_envs, num_rooms, device=self.device)
+
+        self.set_observation_spec(
+            observation=UnboundedContinuousTensorSpec(
+                shape=(num_envs, num_rooms), device=self.device
+            )
+        )
+        self.action_spec = BoundedTensorSpec(
+            -1.0, 1.0, shape=(num_envs, num_rooms), device=self.device
+        )
+        self.reward_spec = UnboundedContinuousTensorSpec(
+            shape=(num_envs, 1), device=self.device
+        )
+
+    @classmethod
+    def from_oracle_context(cls, oracle_context: TensorDictBase, **kwargs):
+        """Builds one env per task of ``oracle_context``, whose keys are "c1", "c2", ... like the
+        keyword arguments of ``MultiNodeEnv``. The missing contexts are zero."""
+        context_dim = kwargs.get("context_dim", 3)
+        contexts = torch.zeros(oracle_context.shape[0], context_dim)
+        for i in range(context_dim):
+            if f"c{i + 1}" in oracle_context.keys():
+                contexts[:, i] = oracle_context.get(f"c{i + 1}")
+        return cls(contexts, **kwargs)
+
+    def get_obs(self):
+        return (self.temperature - 20) / 20
+
+    def calculate_influence(self, action):
+        # every room sees the normalized temperatures of its parents
+        temp = self.room_graph * self.get_obs().unsqueeze(-2)
+        inputs = [temp, action.unsqueeze(-1)]
+        if self.context_influence_type == "neural":
+            inputs.append(self.masked_context)
+        # the influence function is parallel over rooms: (num_rooms, num_envs, -1)
+        inputs = torch.cat(inputs, dim=-1).transpose(0, 1)
+        influence = self.inf_func(inputs).squeeze(-1).transpose(0, 1)
+
+        if self.context_influence_type == "linear":
+            influence = influence + self.masked_context.mean(dim=-1) * 5.0
+        elif self.context_influence_type == "tanh":
+            influence = influence + torch.tanh(
+                self.masked_context.mean(dim=-1)
+            )
+        return influence
+
+    @torch.no_grad()
+    def _step(self, tensordict: TensorDictBase) -> TensorDictBase:
+        action = tensordict.get("action").to(self.temperature.dtype)
+        self.temperature += self.calculate_influence(action) * self.dt
+
+        reward = -(self.temperature - 20).abs().mean(dim=-1, keepdim=True)
+        return self.build_tensordict(self.get_obs(), reward=reward)
+
+    def _reset(self, tensordict: Optional[TensorDictBase] = None, **kwargs):
+        temperature = 40 * torch.rand(
+            self.temperature.shape,
+            generator=self.rng,
+            device=self.device,
+        )
+        reset = self.get_reset_mask(tensordict)
+        if reset is None:
+            self.temperature = temperature
+        else:
+            self.temperature = torch.where(
+                reset, temperature, self.temperature
+            )
+        return self.build_tensordict(self.get_obs())
+
+
 if __name__ == "__main__":
     env = MultiNodeEnv()
     # tensor([[0, 0, 0, 1, 0],
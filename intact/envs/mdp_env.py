@@ -1,3 +1,5 @@
+import warnings
+
 import torch
 from tensordict import TensorDict
 from tensordict.nn import TensorDictModuleBase
@@ -5,9 +7,19 @@ from torchrl.envs import EnvBase
 from torchrl.envs.model_based import ModelBasedEnvBase
 
 from intact.envs import reward_fns_dict, termination_fns_dict
+from intact.modules.tensordict_module import MDPWrapper
 
 
 class MDPEnv(ModelBasedEnvBase):
+    # outputs of the world model used to sample a transition
+    model_output_keys = [
+        "obs_mean",
+        "obs_log_var",
+        "reward_mean",
+        "reward_log_var",
+        "terminated",
+    ]
+
     def __init__(
         self,
         world_model: TensorDictModuleBase,
@@ -16,6 +28,8 @@ class MDPEnv(ModelBasedEnvBase):
         batch_size=None,
         termination_fns="",
         reward_fns="",
+        ensemble_sampling="TS1",
+        compile_step=False,
     ):
         """
         Args:
@@ -25,6 +39,12 @@ class MDPEnv(ModelBasedEnvBase):
             batch_size (int, optional): the batch size to use. Defaults to None.
             termination_fns (str, optional): the termination function to use. Defaults to "".
             reward_fns (str, optional): the reward function to use. Defaults to "".
+            ensemble_sampling (str, optional): how to pick the ensemble member of each step when the world
+                model is an ensemble, one of "TS1" (a random member per step), "TSinf" (a fixed member per
+                particle) and "mean" (the average of members). Defaults to "TS1".
+            compile_step (bool, optional): whether to run ``model_step`` (the world model forward and the
+                transition sampling on plain tensors) through ``torch.compile``. Falls back to eager when
+                compilation is unavailable or fails. Defaults to False.
         """
         super().__init__(
             world_model, device=device, dtype=dtype, batch_size=batch_size
@@ -37,6 +57,9 @@ class MDPEnv(ModelBasedEnvBase):
         self.reward_fns = (
             reward_fns_dict[reward_fns] if reward_fns != "" else None
         )
+        self.ensemble_sampling = ensemble_sampling
+        self.compile_step = compile_step
+        self._compiled_model_step = None
 
     def _reset(self, tensordict: TensorDict, **kwargs) -> TensorDict:
         batch_size = tensordict.batch_size if tensordict is not None else []
@@ -52,53 +75,163 @@ class MDPEnv(ModelBasedEnvBase):
         return tensordict
 
     def _step(self, tensordict: TensorDict) -> TensorDict:
-        tensordict_out = tensordict.clone()
-        tensordict_out = self.world_model(tensordict_out)
+        observation, reward, terminated = self.model_step(
+            tensordict.get("observation"),
+            tensordict.get("action"),
+            tensordict.get("idx", None),
+        )
+        # the model never truncates
+        truncated = torch.zeros_like(terminated)
+
+        tensordict_out = tensordict.select(
+            *self.observation_spec.keys(), strict=False
+        )
+        tensordict_out.set("observation", observation)
+        tensordict_out.set("terminated", terminated)
+        tensordict_out.set("truncated", truncated)
+        tensordict_out.set("done", terminated | truncated)
+        tensordict_out.set("reward", reward)
+        return tensordict_out
+
+    def model_step(self, observation, action, idx=None):
+        """Steps the model on plain tensors, without going through ``EnvBase.step``.
+
+        Runs the compiled step if ``compile_step`` is set, and the eager one otherwise.
+
+        Args:
+            observation (torch.Tensor): the observations, with shape (*batch_size, obs_dim)
+            action (torch.Tensor): the actions, with shape (*batch_size, action_dim)
+            idx (torch.Tensor, optional): the task indices, with shape (*batch_size, 1). Defaults to None.
+
+        Returns:
+            tuple: the next observation, reward and terminated (which is also done, as the model never
+                truncates)
+        """
+        if self.compile_step:
+            if self._compiled_model_step is None:
+                self._compiled_model_step = self.compile_model_step()
+            if self._compiled_model_step is not None:
+                try:
+                    return self._compiled_model_step(observation, action, idx)
+                except torch._dynamo.exc.TorchDynamoException as err:
+                    # errors of the model itself, met while tracing, are not compile failures
+                    if isinstance(err, torch._dynamo.exc.TorchRuntimeError):
+                        raise
+                    self.disable_compile_step(err)
+        return self.eager_model_step(observation, action, idx)
+
+    def eager_model_step(self, observation, action, idx=None):
+        if isinstance(self.world_model, MDPWrapper):
+            outputs = self.world_model.world_model(observation, action, idx)
+        else:
+            # other tensordict modules are called on a tensordict of the inputs
+            tensordict = TensorDict(
+                {"observation": observation, "action": action},
+                batch_size=observation.shape[:-1],
+            )
+            if idx is not None:
+                tensordict.set("idx", idx)
+            tensordict = self.world_model(tensordict)
+            outputs = [tensordict.get(key) for key in self.model_output_keys]
+        return self.sample_transition(
+            observation, action, *outputs[: len(self.model_output_keys)]
+        )
+
+    def compile_model_step(self):
+        if not hasattr(torch, "compile"):
+            self.disable_compile_step("torch.compile is not available")
+            return None
+        try:
+            # the batch size changes along compacted rollouts and between planners
+            return torch.compile(self.eager_model_step, dynamic=True)
+        except RuntimeError as err:
+            self.disable_compile_step(err)
+            return None
+
+    def disable_compile_step(self, reason):
+        warnings.warn(
+            "compiling the MDPEnv step failed, falling back to eager: {}".format(
+                reason
+            )
+        )
+        self.compile_step = False
+        self._compiled_model_step = None
+
+    def sample_transition(
+        self,
+        observation,
+        action,
+        obs_mean,
+        obs_log_var,
+        reward_mean,
+        reward_log_var,
+        terminated,
+    ):
+        if getattr(self.world_model, "ensemble_size", 0) > 0:
+            (
+                obs_mean,
+                obs_log_var,
+                reward_mean,
+                reward_log_var,
+                terminated,
+            ) = self.sample_ensemble_member(
+                obs_mean, obs_log_var, reward_mean, reward_log_var, terminated
+            )
 
         if self.world_model.learn_obs_var:
-            obs_std = torch.exp(0.5 * tensordict_out["obs_log_var"])
-            reward_std = torch.exp(0.5 * tensordict_out["reward_log_var"])
+            obs_std = torch.exp(0.5 * obs_log_var)
+            reward_std = torch.exp(0.5 * reward_log_var)
         else:
-            obs_std = torch.zeros_like(tensordict_out["obs_mean"])
-            reward_std = torch.zeros_like(tensordict_out["reward_mean"])
-        tensordict_out["observation"] = tensordict_out[
-            "obs_mean"
-        ] + obs_std * torch.randn_like(obs_std)
+            obs_std = torch.zeros_like(obs_mean)
+            reward_std = torch.zeros_like(reward_mean)
+        next_observation = obs_mean + obs_std * torch.randn_like(obs_std)
 
         if self.termination_fns is None:
-            tensordict_out["terminated"] = (
-                tensordict_out["terminated"] > 0
+            terminated = (
+                terminated > 0
             )  # terminated from world-model are logits
         else:
-            tensordict_out["terminated"] = self.termination_fns(
-                tensordict["observation"],
-                tensordict["action"],
-                tensordict_out["observation"],
+            terminated = self.termination_fns(
+                observation, action, next_observation
             )
 
-        tensordict_out["truncated"] = torch.zeros_like(
-            tensordict_out["truncated"]
-        ).bool()
-        tensordict_out["done"] = torch.logical_or(
-            tensordict_out["terminated"], tensordict_out["truncated"]
-        )
-
         if self.reward_fns is None:
-            tensordict_out["reward"] = tensordict_out[
-                "reward_mean"
-            ] + reward_std * torch.randn_like(reward_std)
+            reward = reward_mean + reward_std * torch.randn_like(reward_std)
+        else:
+            reward = self.reward_fns(observation, action, next_observation)
+
+        return next_observation, reward, terminated
+
+    def sample_ensemble_member(self, *outputs):
+        if self.ensemble_sampling == "mean":
+            return tuple(value.mean(-2) for value in outputs)
+
+        batch_size = outputs[0].shape[:-2]
+        ensemble_size = self.world_model.ensemble_size
+        device = outputs[0].device
+        if self.ensemble_sampling == "TS1":
+            member = torch.randint(ensemble_size, batch_size, device=device)
+        elif self.ensemble_sampling == "TSinf":
+            # the batch layout is kept along a rollout, so every particle keeps its member
+            member = (
+                torch.arange(batch_size.numel(), device=device).reshape(
+                    batch_size
+                )
+                % ensemble_size
+            )
         else:
-            tensordict_out["reward"] = self.reward_fns(
-                tensordict["observation"],
-                tensordict["action"],
-                tensordict_out["observation"],
+            raise NotImplementedError(
+                "{} is not supported as an ensemble sampling".format(
+                    self.ensemble_sampling
+                )
             )
 
-        return tensordict_out.select(
-            *self.observation_spec.keys(),
-            *self.full_done_spec.keys(),
-            *self.full_reward_spec.keys(),
-            strict=False,
+        member = member.reshape(*batch_size, 1, 1)
+        return tuple(
+            value.gather(
+                -2, member.expand(*batch_size, 1, value.shape[-1])
+            ).squeeze(-2)
+            for value in outputs
         )
 
     def set_specs_from_env(self, env: EnvBase):
@@ -0,0 +1,81 @@
+from typing import Callable, Sequence
+
+import torch
+from tensordict.tensordict import TensorDictBase
+from tensordict.utils import NestedKey
+from torchrl.envs.utils import step_mdp
+
+
+def compacted_rollout(
+    step_fn: Callable[..., TensorDictBase],
+    tensordict: TensorDictBase,
+    max_steps: int,
+    done_key: NestedKey = ("next", "done"),
+    fill_true_keys: Sequence[NestedKey] = (
+        ("next", "done"),
+        ("next", "terminated"),
+    ),
+    valid_key: NestedKey = ("collector", "mask"),
+) -> TensorDictBase:
+    """Rolls out ``step_fn`` while dropping the rows that are done from the working batch.
+
+    Every step only runs on the rows that are not done yet, and writes them back into a preallocated
+    full-horizon output through an index map. The steps of a row after its done step are filled with
+    zeros, except ``fill_true_keys`` which are filled with True, and ``valid_key`` flags the steps that
+    were actually simulated, so the losses can leave the filled steps out. Like the uncompacted rollouts,
+    the rollout stops when every row is done.
+
+    Args:
+        step_fn (Callable): called as ``step_fn(tensordict, t, active_idx)``, maps the tensordict of the
+            active rows to the same rows after one step with the results under "next" (e.g. the policy
+            followed by ``env.step``). ``active_idx`` are the indices of the active rows in the flattened
+            initial batch.
+        tensordict (TensorDictBase): the initial tensordict.
+        max_steps (int): the maximum number of steps.
+        done_key (NestedKey, optional): the done key of the stepped tensordict. Defaults to ("next", "done").
+        fill_true_keys (Sequence[NestedKey], optional): the keys filled with True after done.
+            Defaults to (("next", "done"), ("next", "terminated")).
+        valid_key (NestedKey, optional): the key of the mask of the simulated steps, with shape
+            (*batch_size, steps). Defaults to ("collector", "mask").
+
+    Returns:
+        TensorDictBase: the rollout, with shape (*batch_size, steps).
+    """
+    if max_steps < 1:
+        raise ValueError(
+            "max_steps should be positive, got {}".format(max_steps)
+        )
+    batch_size = tensordict.batch_size
+    tensordict = tensordict.reshape(-1)
+    active_idx = torch.arange(tensordict.shape[0], device=tensordict.device)
+
+    out_td = None
+    for t in range(max_steps):
+        tensordict = step_fn(tensordict, t, active_idx)
+        if out_td is None:
+            out_td = (
+                tensordict.unsqueeze(-1)
+                .expand(*tensordict.batch_size, max_steps)
+                .apply(torch.zeros_like)
+            )
+            for key in fill_true_keys:
+                if key in out_td.keys(include_nested=True):
+                    out_td.get(key).fill_(True)
+            out_td.set(
+                valid_key,
+                torch.zeros(
+                    out_td.shape, dtype=torch.bool, device=out_td.device
+                ),
+            )
+        out_td[active_idx, t] = tensordict
+        out_td.get(valid_key)[active_idx, t] = True
+
+        not_done = ~tensordict.get(done_key).reshape(-1)
+        if not not_done.any():
+            break
+        tensordict = step_mdp(tensordict, exclude_action=False)[not_done]
+        active_idx = active_idx[not_done]
+
+    out_td = out_td[:, : t + 1].reshape(*batch_size, t + 1)
+    out_td.refine_names(..., "time")
+    return out_td
@@ -2,7 +2,10 @@ from abc import abstractmethod
 
 import torch.nn as nn
 
-from intact.modules.models.context_model import ContextModel
+from intact.modules.models.context_model import (
+    ContextModel,
+    EncoderContextModel,
+)
 
 
 class BaseWorldModel(nn.Module):
@@ -22,6 +25,7 @@ class BaseWorldModel(nn.Module):
         residual=True,
         learned_reward=True,
         learned_termination=True,
+        amortized_context=False,
     ):
         """
         Initialize the BaseWorldModel.
@@ -35,6 +39,8 @@ class BaseWorldModel(nn.Module):
             residual (bool, optional): Whether to use residual connection for transition model. Defaults to True.
             learned_reward (bool, optional): Whether to learn reward model. Defaults to True.
             learned_termination (bool, optional): Whether to learn termination model. Defaults to True.
+            amortized_context (bool, optional): Whether to infer the contexts from transitions with an
+                ``EncoderContextModel`` instead of learning one context per task. Defaults to False.
         """
         super().__init__()
         self.obs_dim = obs_dim
@@ -45,11 +51,21 @@ class BaseWorldModel(nn.Module):
         self.residual = residual
         self.learned_reward = learned_reward
         self.learned_termination = learned_termination
+        self.amortized_context = amortized_context
 
         # context model
-        self.context_model = ContextModel(
-            meta=meta, max_context_dim=max_context_dim, task_num=task_num
-        )
+        if amortized_context:
+            self.context_model = EncoderContextModel(
+                obs_dim=obs_dim,
+                action_dim=action_dim,
+                meta=meta,
+                max_context_dim=max_context_dim,
+                task_num=task_num,
+            )
+        else:
+            self.context_model = ContextModel(
+                meta=meta, max_context_dim=max_context_dim, task_num=task_num
+            )
 
         # mdp model (transition + reward + termination)
         self.nets = self.build_nets()
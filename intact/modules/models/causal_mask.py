@@ -26,6 +26,37 @@ def get_init(shape, bias, scale):
     return torch.randn(shape) * scale + bias
 
 
+def sample_uniform(shape, sampling_mode="iid", dim=0, device=None):
+    """sample uniform noise for the masks, correlated along ``dim`` according to ``sampling_mode``.
+
+    :param shape: shape of the noise
+    :param sampling_mode: "iid", "antithetic" (pairs u and 1 - u) or "stratified" (one sample in
+        each of the ``shape[dim]`` equal-width strata, randomly permuted per entry)
+    :param dim: the sampling dimension
+    :param device: device of the noise
+    :return:
+        noise: uniform noise in [0, 1) with shape ``shape``
+    """
+    sampling_times = shape[dim]
+    if sampling_mode == "iid":
+        return torch.rand(shape, device=device)
+    elif sampling_mode == "antithetic":
+        assert (
+            sampling_times % 2 == 0
+        ), "sampling_times should be even for antithetic sampling"
+        half_shape = list(shape)
+        half_shape[dim] = sampling_times // 2
+        noise = torch.rand(half_shape, device=device)
+        return torch.cat([noise, 1 - noise], dim=dim)
+    elif sampling_mode == "stratified":
+        strata = torch.argsort(torch.rand(shape, device=device), dim=dim)
+        return (strata + torch.rand(shape, device=device)) / sampling_times
+    else:
+        raise NotImplementedError(
+            "{} is not supported as a sampling mode".format(sampling_mode)
+        )
+
+
 class CausalMask(nn.Module):
     def __init__(
         self,
@@ -96,6 +127,9 @@ class CausalMask(nn.Module):
             )
         )
 
+        self._packed_layout = None
+        self._packed_layout_key = None
+
     def extra_repr(self):
         """
         Return a string representation of the CausalMask.
@@ -177,6 +211,41 @@ class CausalMask(nn.Module):
             self._context_logits, -self.logits_clip, self.logits_clip
         )
 
+    @property
+    def packed_layout(self):
+        """
+        Get the packed layout of the deterministic mask.
+
+        For each output dimension, the indices of the active input dimensions are packed to the
+        front and padded to the largest number of active inputs. The layout is cached and only
+        recomputed when the mask logits change.
+
+        Returns:
+            tuple: ``gather_idx`` (long) and ``gather_mask`` (bool), both of shape
+                (mask_output_dim, max_active_input_num).
+        """
+        assert (
+            self.using_reinforce
+        ), "packed layout is only available for binary (reinforce) masks"
+        key = (
+            self._observed_logits._version,
+            self._observed_logits.data_ptr(),
+            self._context_logits._version,
+            self._context_logits.data_ptr(),
+        )
+        if self._packed_layout is None or self._packed_layout_key != key:
+            with torch.no_grad():
+                mask = self.mask.bool()
+                max_active_num = int(mask.sum(dim=1).max().item())
+                # stable sort moves active inputs to the front, keeping their order
+                gather_idx = torch.argsort((~mask).int(), dim=1, stable=True)[
+                    :, :max_active_num
+                ]
+                gather_mask = mask.gather(1, gather_idx)
+            self._packed_layout = (gather_idx, gather_mask)
+            self._packed_layout_key = key
+        return self._packed_layout
+
     @property
     def valid_context_idx(self):
         """
@@ -213,6 +282,7 @@ class CausalMask(nn.Module):
             bias=self.context_logits_init_bias,
             scale=self.context_logits_init_scale,
         ).to(self._context_logits.device)
+        self._packed_layout = None
 
     def forward(self, inputs, dim_map=None, deterministic=False):
         assert (
@@ -257,6 +327,58 @@ class CausalMask(nn.Module):
         masked_inputs = torch.einsum("boi,obi->obi", mask, repeated_inputs)
         return masked_inputs, original_mask
 
+    def sampling_forward(
+        self, inputs, sampling_times, dim_map=None, sampling_mode="iid"
+    ):
+        """
+        Sample ``sampling_times`` masks per input, for inputs shared by all samples.
+
+        The masks are drawn directly in the head-major layout consumed by ``ParallelLinear.masked_forward``,
+        which applies them to the inputs with one broadcasted multiply, so no repeated copy of the inputs is
+        materialized. The masks are kept boolean.
+
+        Args:
+            inputs (Tensor): The shared inputs, with shape (batch_size, input_dim).
+            sampling_times (int): The number of masks sampled for each input.
+            dim_map (Tensor, optional): The map from input dimensions to mask input dimensions. Defaults to None.
+            sampling_mode (str, optional): How the masks of one input are correlated, one of "iid",
+                "antithetic" and "stratified". Defaults to "iid".
+
+        Returns:
+            tuple: The head-major masks of the inputs with shape (mask_output_dim, sampling_times, batch_size,
+                input_dim), and the sampled masks with shape (sampling_times, batch_size, mask_output_dim,
+                mask_input_dim).
+        """
+        assert (
+            self.using_reinforce
+        ), "sampling_forward is only available for reinforce masks"
+        assert (
+            len(inputs.shape) == 2
+        ), "inputs should be 2D tensor: batch_size x input_dim"
+        batch_size, input_dim = inputs.shape
+
+        probs = torch.sigmoid(self.mask_logits)
+        # shape: mask_output_dim * sampling_times * batch_size * mask_input_dim
+        noise = sample_uniform(
+            (
+                self.mask_output_dim,
+                sampling_times,
+                batch_size,
+                self.mask_input_dim,
+            ),
+            sampling_mode=sampling_mode,
+            dim=1,
+            device=probs.device,
+        )
+        head_major_mask = torch.lt(noise, probs[:, None, None, :])
+        del noise
+        mask = (
+            head_major_mask[..., dim_map]
+            if dim_map is not None
+            else head_major_mask
+        )
+        return mask, head_major_mask.permute(1, 2, 0, 3)
+
     def total_mask_grad(
         self,
         sampling_mask,
@@ -264,24 +386,66 @@ class CausalMask(nn.Module):
         sparse_weight=0.05,
         context_sparse_weight=0.05,
         context_max_weight=0.2,
+        estimator="difference",
+        return_variance=False,
     ):
+        """
+        Estimate the gradient of the sampling loss and the regularization w.r.t. the mask logits.
+
+        Args:
+            sampling_mask (Tensor): The sampled masks, with shape (sampling_times, batch_size, output_dim, input_dim).
+            sampling_loss (Tensor): The loss of each sample, with shape (sampling_times, batch_size, output_dim).
+            sparse_weight (float, optional): The weight of the sparse regularization of observed logits. Defaults to 0.05.
+            context_sparse_weight (float, optional): The weight of the sparse regularization of context logits.
+                Defaults to 0.05.
+            context_max_weight (float, optional): The weight of the max regularization of context logits.
+                Defaults to 0.2.
+            estimator (str, optional): "difference" for the difference between the mean loss of positive and
+                negative samples, or "loo" for REINFORCE with a per-entry leave-one-out baseline.
+                Defaults to "difference".
+            return_variance (bool, optional): Whether to also return the variance of the gradient estimate,
+                estimated from its spread over the batch. Defaults to False.
+
+        Returns:
+            Tensor: The gradient w.r.t. the mask logits, and its variance if ``return_variance``.
+        """
+        sampling_times = sampling_mask.shape[0]
+        sampling_mask = sampling_mask.to(sampling_loss.dtype)
         num_pos = sampling_mask.sum(dim=0)
-        num_neg = sampling_mask.shape[0] - num_pos
+        num_neg = sampling_times - num_pos
 
         # one sample is valid if its ``sampling_mask`` contains both positive and negative logit
         is_valid = ((num_pos > 0) * (num_neg > 0)).float()
 
-        # calculate the gradient of the sampling loss w.r.t. the logits
-        pos_grads = torch.einsum(
-            "sbo,sboi->sboi", sampling_loss, sampling_mask
-        ).sum(dim=0) / (num_pos + 1e-6)
-        neg_grads = torch.einsum(
-            "sbo,sboi->sboi", sampling_loss, 1 - sampling_mask
-        ).sum(dim=0) / (num_neg + 1e-6)
-
-        g = self.mask_logits.sigmoid() * (1 - self.mask_logits.sigmoid())
-
-        sampling_grad = (pos_grads - neg_grads) * g
+        probs = self.mask_logits.sigmoid()
+        if estimator == "difference":
+            # calculate the gradient of the sampling loss w.r.t. the logits
+            pos_grads = torch.einsum(
+                "sbo,sboi->sboi", sampling_loss, sampling_mask
+            ).sum(dim=0) / (num_pos + 1e-6)
+            neg_grads = torch.einsum(
+                "sbo,sboi->sboi", sampling_loss, 1 - sampling_mask
+            ).sum(dim=0) / (num_neg + 1e-6)
+
+            sampling_grad = (pos_grads - neg_grads) * probs * (1 - probs)
+        elif estimator == "loo":
+            assert sampling_times > 1, "loo needs at least two samples"
+            # the baseline of each sample is the mean loss of the other samples
+            baseline = (
+                sampling_loss.sum(dim=0, keepdim=True) - sampling_loss
+            ) / (sampling_times - 1)
+            sampling_grad = (
+                torch.einsum(
+                    "sbo,sboi->boi",
+                    sampling_loss - baseline,
+                    sampling_mask - probs,
+                )
+                / sampling_times
+            )
+        else:
+            raise NotImplementedError(
+                "{} is not supported as an estimator".format(estimator)
+            )
         reg_grad = torch.ones_like(self.mask_logits)
         reg_grad[:, : self.observed_input_dim] *= sparse_weight
         # if self.latent:
@@ -294,6 +458,10 @@ class CausalMask(nn.Module):
             self.mask_logits[:, self.observed_input_dim :]
         )
         grad = is_valid * (sampling_grad + reg_grad)
+        if return_variance:
+            batch_size = grad.shape[0]
+            variance = grad.var(dim=0, unbiased=batch_size > 1) / batch_size
+            return grad.mean(dim=0), variance
         return grad.mean(dim=0)
 
     @property
@@ -1,11 +1,81 @@
+import weakref
+from contextlib import contextmanager
+
 import torch
 from torch import nn
 
+from intact.modules.utils import build_mlp
 from intact.stats.mcc import mean_corr_coef
 from intact.stats.metric import mutual_info_estimation
 
 
-class ContextModel(nn.Module):
+class BaseContextModel(nn.Module):
+    """Base class of the context models, looking up the contexts of the tasks with ``forward(idx)``.
+
+    Subclasses set ``meta``, ``max_context_dim`` and ``task_num``, and implement ``context_hat``, the contexts
+    of all tasks with shape (task_num, max_context_dim).
+    """
+
+    @property
+    def context_dim(self):
+        return self.max_context_dim if self.meta else 0
+
+    def extra_repr(self):
+        if self.meta:
+            return "max_context_dim={}, task_num={}".format(
+                self.max_context_dim,
+                self.task_num,
+            )
+        else:
+            return ""
+
+    def get_mutual_info(
+        self,
+        idx,
+        valid_context_idx=None,
+        reduction="mean",
+        num_anchors=None,
+        chunk_size=None,
+    ):
+        context_hat = self(idx)
+        if valid_context_idx is not None:
+            context_hat = context_hat[..., valid_context_idx]
+        mutual_info = mutual_info_estimation(
+            context_hat.reshape(-1, context_hat.shape[-1]),
+            reduction=reduction,
+            num_anchors=num_anchors,
+            chunk_size=chunk_size,
+        )
+        if reduction == "none":
+            return mutual_info.reshape(idx.shape[:-1])
+        return mutual_info
+
+    def get_mcc(
+        self,
+        context_gt,
+        valid_idx=None,
+        return_permutation=True,
+        method="pearson",
+    ):
+        if isinstance(context_gt, torch.Tensor):
+            context_gt = context_gt.detach().cpu().numpy()
+
+        if valid_idx is None:
+            context_hat = self.context_hat.detach().cpu().numpy()
+        else:
+            context_hat = self.context_hat[:, valid_idx].detach().cpu().numpy()
+
+        mcc, permutation = mean_corr_coef(
+            context_hat, context_gt, return_permutation=True, method=method
+        )
+
+        if return_permutation:
+            return mcc, permutation, context_hat
+        else:
+            return mcc
+
+
+class ContextModel(BaseContextModel):
     def __init__(
         self,
         meta=False,
@@ -27,15 +97,28 @@ class ContextModel(nn.Module):
         )
 
         self.fixed_idx = None
+        self._fixed_mask = None
+        # bumped whenever the table is replaced or the fixed dims change
+        self._cache_version = 0
+        self._cached_source = None
+        self._cached_key = None
+        self._cached_context_hat = None
 
-    @property
-    def context_dim(self):
-        return self.max_context_dim if self.meta else 0
+        # precision of the contexts accumulated by streaming inference, see ``update_context``
+        self.context_precision = None
 
     @property
     def device(self):
         return self._context_hat.device
 
+    def __getstate__(self):
+        # weak references can't be pickled, drop the cache
+        state = super().__getstate__().copy()
+        state.update(
+            _cached_source=None, _cached_key=None, _cached_context_hat=None
+        )
+        return state
+
     def set_context(self, context):
         assert context.shape == self._context_hat.shape
         if self.context_clip > 0:
@@ -43,6 +126,29 @@ class ContextModel(nn.Module):
                 context, -self.context_clip, self.context_clip
             )
         self._context_hat.data = context.to(self.device)
+        self._cache_version += 1
+        self.context_precision = None
+
+    def get_context_precision(self, prior_precision=1.0):
+        """Gets the accumulated precision of the contexts, with shape (task_num, max_context_dim, max_context_dim).
+
+        Starts from ``prior_precision`` times the identity after a reset or ``set_context``.
+        """
+        shape = (*self._context_hat.shape, self._context_hat.shape[-1])
+        if (
+            self.context_precision is None
+            or self.context_precision.shape != shape
+        ):
+            eye = torch.eye(shape[-1], device=self.device)
+            self.context_precision = prior_precision * eye.expand(shape)
+        return self.context_precision.to(self.device)
+
+    def update_context(self, context, context_precision):
+        """Sets the contexts refined by streaming inference and the precision they were refined with."""
+        assert context.shape == self._context_hat.shape
+        self._context_hat.data = context.detach().to(self.device)
+        self._cache_version += 1
+        self.context_precision = context_precision.detach()
 
     def fix(self, idx=None):
         assert self.meta
@@ -50,25 +156,60 @@ class ContextModel(nn.Module):
             self.fixed_idx = torch.arange(self.max_context_dim).to(self.device)
         else:
             self.fixed_idx = torch.tensor(idx).to(int).to(self.device)
+        self._fixed_mask = torch.zeros(
+            self.max_context_dim, dtype=torch.bool, device=self.device
+        )
+        self._fixed_mask[self.fixed_idx] = True
+        self._cache_version += 1
 
     def unfix(self):
         self.fixed_idx = None
+        self._fixed_mask = None
+        self._cache_version += 1
+
+    def _table(self):
+        if self._fixed_mask is None:
+            return self._context_hat
+        # the fixed dims take no gradient
+        return torch.where(
+            self._fixed_mask.to(self.device),
+            self._context_hat.detach(),
+            self._context_hat,
+        )
+
+    def _use_cache(self):
+        # only the own parameter is cached, not tensors swapped in by functional calls,
+        # and a cached graph would be freed by the first backward
+        return isinstance(self._context_hat, nn.Parameter) and not (
+            torch.is_grad_enabled() and self._context_hat.requires_grad
+        )
+
+    def _cache_key(self):
+        return (
+            self._cache_version,
+            self._context_hat._version,
+            self._context_hat.data_ptr(),
+            self._context_hat.device,
+        )
 
     @property
     def context_hat(self):
-        if self.fixed_idx is None:
-            context_hat = self._context_hat
-        else:
-            context_hat = torch.zeros_like(self._context_hat).to(self.device)
-            context_hat[:, self.fixed_idx] += self._context_hat.detach()[
-                :, self.fixed_idx
-            ]
-            unfixed_idx = ~torch.isin(
-                torch.arange(self.max_context_dim).to(self.device),
-                self.fixed_idx,
+        if not self._use_cache():
+            return torch.clamp(
+                self._table(), -self.context_clip, self.context_clip
             )
-            context_hat[:, unfixed_idx] += self._context_hat[:, unfixed_idx]
-        return torch.clamp(context_hat, -self.context_clip, self.context_clip)
+
+        key = self._cache_key()
+        source = self._cached_source and self._cached_source()
+        if source is not self._context_hat or (self._cached_key != key):
+            with torch.no_grad():
+                self._cached_context_hat = torch.clamp(
+                    self._table(), -self.context_clip, self.context_clip
+                )
+            # a weak reference, assigning the parameter would register it
+            self._cached_source = weakref.ref(self._context_hat)
+            self._cached_key = key
+        return self._cached_context_hat
 
     def reset(self, task_num=None):
         self.task_num = task_num or self.task_num
@@ -77,15 +218,8 @@ class ContextModel(nn.Module):
             torch.randn(self.task_num, self.max_context_dim) * self.init_scale
         )
         self._context_hat.data = init_context_hat.to(self.device)
-
-    def extra_repr(self):
-        if self.meta:
-            return "max_context_dim={}, task_num={}".format(
-                self.max_context_dim,
-                self.task_num,
-            )
-        else:
-            return ""
+        self._cache_version += 1
+        self.context_precision = None
 
     def forward(self, idx=None):
         if idx is None:
@@ -95,34 +229,271 @@ class ContextModel(nn.Module):
         assert (
             idx.shape[-1] == 1
         ), f"last dim of idx should be 1, got {idx.shape}"
+        if not self._use_cache():
+            # clamp only the gathered rows instead of the whole table
+            return torch.clamp(
+                self._table()[idx[..., 0]],
+                -self.context_clip,
+                self.context_clip,
+            )
         return self.context_hat[idx[..., 0]]
 
-    def get_mutual_info(self, idx, valid_context_idx=None, reduction="mean"):
-        context_hat = self(idx)
-        if valid_context_idx is not None:
-            context_hat = context_hat[:, valid_context_idx]
-        return mutual_info_estimation(context_hat, reduction=reduction)
 
-    def get_mcc(
+class EncoderContextModel(BaseContextModel):
+    def __init__(
         self,
-        context_gt,
-        valid_idx=None,
-        return_permutation=True,
-        method="pearson",
+        obs_dim,
+        action_dim,
+        meta=False,
+        max_context_dim=0,
+        task_num=0,
+        hidden_dims=None,
+        context_clip=0.3,
     ):
-        if isinstance(context_gt, torch.Tensor):
-            context_gt = context_gt.detach().cpu().numpy()
+        """Context model inferring the context of every task from its transitions with a set encoder.
 
-        if valid_idx is None:
-            context_hat = self.context_hat.detach().cpu().numpy()
+        Every transition (observation, action, next observation, reward) is embedded, the embeddings are
+        averaged over the transitions of each task and the average is decoded into the context of the task.
+        Only the encoder is learned, so the parameters don't grow with ``task_num`` and new tasks get their
+        contexts in one forward pass. ``forward(idx)`` looks up the contexts of the last ``encode`` of every
+        task, like ``ContextModel`` looks up its parameters. In training, ``encoding`` leaves every
+        transition out of the set its own context is encoded from.
+
+        Args:
+            obs_dim (int): the number of observation dimensions.
+            action_dim (int): the number of action dimensions.
+            meta (bool, optional): whether to use meta-RL. Defaults to False.
+            max_context_dim (int, optional): the number of context dimensions. Defaults to 0.
+            task_num (int, optional): the number of tasks. Defaults to 0.
+            hidden_dims (list, optional): the hidden dimensions of the encoder, the last one is the
+                dimension of the embeddings. Defaults to [128, 128].
+            context_clip (float, optional): the bound of the contexts. Defaults to 0.3.
+        """
+        super().__init__()
+        self.obs_dim = obs_dim
+        self.action_dim = action_dim
+        self.meta = meta
+        self.max_context_dim = max_context_dim
+        self.task_num = task_num
+        self.hidden_dims = hidden_dims or [128, 128]
+        self.context_clip = context_clip
+
+        self.embedding = build_mlp(
+            input_dim=2 * obs_dim + action_dim + 1,
+            output_dim=self.hidden_dims[-1],
+            hidden_dims=self.hidden_dims[:-1],
+            activate_name="SiLU",
+            last_activate_name="SiLU",
+        )
+        self.decoder = build_mlp(
+            input_dim=self.hidden_dims[-1], output_dim=max_context_dim
+        )
+
+        self.register_buffer(
+            "_context_hat",
+            torch.zeros(task_num, max_context_dim),
+            persistent=False,
+        )
+        # running sums of the embeddings of streaming inference, see ``encode``
+        self.register_buffer(
+            "_embedding_sum",
+            torch.zeros(task_num, self.hidden_dims[-1]),
+            persistent=False,
+        )
+        self.register_buffer(
+            "_embedding_num", torch.zeros(task_num, 1), persistent=False
+        )
+        # contexts with gradients to the encoder, only set in the scope of ``encoding``
+        self._encoded_context_hat = None
+        self._encoded_idx = None
+        self._own_context_hat = None
+
+        self.fixed_idx = None
+        self._fixed_mask = None
+
+    @property
+    def device(self):
+        return self._context_hat.device
+
+    def set_context(self, context):
+        assert context.shape == self._context_hat.shape
+        if self.context_clip > 0:
+            context = torch.clamp(
+                context, -self.context_clip, self.context_clip
+            )
+        self._context_hat = context.detach().to(self.device)
+
+    def fix(self, idx=None):
+        assert self.meta
+        if idx is None:
+            self.fixed_idx = torch.arange(self.max_context_dim).to(self.device)
         else:
-            context_hat = self.context_hat[:, valid_idx].detach().cpu().numpy()
+            self.fixed_idx = torch.tensor(idx).to(int).to(self.device)
+        self._fixed_mask = torch.zeros(
+            self.max_context_dim, dtype=torch.bool, device=self.device
+        )
+        self._fixed_mask[self.fixed_idx] = True
 
-        mcc, permutation = mean_corr_coef(
-            context_hat, context_gt, return_permutation=True, method=method
+    def unfix(self):
+        self.fixed_idx = None
+        self._fixed_mask = None
+
+    @property
+    def context_hat(self):
+        if self._encoded_context_hat is None:
+            return self._context_hat
+        return self._fix(self._encoded_context_hat)
+
+    def reset(self, task_num=None):
+        self.task_num = task_num or self.task_num
+        self._context_hat = self._context_hat.new_zeros(
+            self.task_num, self.max_context_dim
         )
+        self._embedding_sum = self._embedding_sum.new_zeros(
+            self.task_num, self.hidden_dims[-1]
+        )
+        self._embedding_num = self._embedding_num.new_zeros(self.task_num, 1)
 
-        if return_permutation:
-            return mcc, permutation, context_hat
+    def encode(
+        self,
+        observation,
+        action,
+        next_observation,
+        reward,
+        idx,
+        mask=None,
+        accumulate=False,
+    ):
+        """Infers the contexts of the tasks in ``idx`` from their transitions.
+
+        Args:
+            observation (torch.Tensor): the observations, with shape (*batch_size, obs_dim).
+            action (torch.Tensor): the actions, with shape (*batch_size, action_dim).
+            next_observation (torch.Tensor): the next observations, with shape (*batch_size, obs_dim).
+            reward (torch.Tensor): the rewards, with shape (*batch_size, 1).
+            idx (torch.Tensor): the task indices, with shape (*batch_size, 1).
+            mask (torch.Tensor, optional): the valid transitions, with shape (*batch_size,), e.g. the
+                ("collector", "mask") of padded sequences. The invalid ones are left out of the averages.
+                Defaults to None, all transitions are valid.
+            accumulate (bool, optional): whether to average the embeddings together with those of the
+                previous accumulated calls, which refines the contexts along a stream of batches, instead of
+                using this batch only. Defaults to False.
+
+        Returns:
+            torch.Tensor: the contexts of all tasks, with shape (task_num, max_context_dim), the tasks
+                without transitions keep their previous contexts.
+        """
+        assert self.meta, "contexts are only encoded when meta is True"
+        _, _, _, embedding_sum, embedding_num = self._pool(
+            observation, action, next_observation, reward, idx, mask
+        )
+        if accumulate:
+            embedding_sum = embedding_sum + self._embedding_sum
+            embedding_num = embedding_num + self._embedding_num
+            self._embedding_sum = embedding_sum.detach()
+            self._embedding_num = embedding_num
+
+        context_hat = self._decode(
+            embedding_sum, embedding_num, self._context_hat
+        )
+        self._context_hat = context_hat.detach()
+        return context_hat
+
+    def _pool(self, observation, action, next_observation, reward, idx, mask):
+        inputs = torch.cat(
+            [observation, action, next_observation, reward], dim=-1
+        )
+        inputs = inputs.reshape(-1, inputs.shape[-1])
+        idx = idx.reshape(-1)
+
+        embedding = self.embedding(inputs)
+        if mask is None:
+            valid = torch.ones_like(embedding[:, :1])
         else:
-            return mcc
+            # padded transitions would bias the task they are indexed to
+            valid = mask.reshape(-1, 1).to(embedding.dtype)
+        embedding_sum = embedding.new_zeros(
+            self.task_num, embedding.shape[-1]
+        ).index_add(0, idx, embedding * valid)
+        embedding_num = embedding.new_zeros(self.task_num, 1).index_add(
+            0, idx, valid
+        )
+        return embedding, valid, idx, embedding_sum, embedding_num
+
+    def _decode(self, embedding_sum, embedding_num, default_context):
+        context_hat = self.decoder(embedding_sum / embedding_num.clamp(min=1))
+        if self.context_clip > 0:
+            context_hat = self.context_clip * torch.tanh(
+                context_hat / self.context_clip
+            )
+        return torch.where(embedding_num > 0, context_hat, default_context)
+
+    def _fix(self, context_hat):
+        if self._fixed_mask is None:
+            return context_hat
+        # the fixed dims take no gradient
+        return torch.where(self._fixed_mask, context_hat.detach(), context_hat)
+
+    @contextmanager
+    def encoding(
+        self, observation, action, next_observation, reward, idx, mask=None
+    ):
+        """Looks up the contexts encoded from the given transitions, with gradients to the encoder, in the scope.
+
+        The contexts of the given transitions themselves (``forward`` called with this very ``idx``) are
+        encoded from the other transitions of their task, leaving each one out of its own set, so that
+        its targets (next observation and reward) never leak into the context it is predicted with. A
+        transition alone in its task gets the previous context of the task. Other lookups see the
+        contexts encoded from all the transitions.
+
+        Out of the scope, the lookups see the encoded contexts without gradients, so that a graph freed by
+        a backward pass is never reused.
+        """
+        assert self.meta, "contexts are only encoded when meta is True"
+        embedding, valid, flat_idx, embedding_sum, embedding_num = self._pool(
+            observation, action, next_observation, reward, idx, mask
+        )
+        previous_context_hat = self._context_hat
+        context_hat = self._decode(
+            embedding_sum, embedding_num, previous_context_hat
+        )
+        self._context_hat = context_hat.detach()
+
+        # leave-one-out contexts of every transition
+        own_context_hat = self._decode(
+            embedding_sum[flat_idx] - embedding * valid,
+            embedding_num[flat_idx] - valid,
+            previous_context_hat[flat_idx],
+        )
+        self._encoded_context_hat = context_hat
+        self._encoded_idx = idx
+        self._own_context_hat = own_context_hat.reshape(*idx.shape[:-1], -1)
+        try:
+            yield context_hat
+        finally:
+            self._encoded_context_hat = None
+            self._encoded_idx = None
+            self._own_context_hat = None
+
+    def _is_encoded_idx(self, idx):
+        encoded_idx = self._encoded_idx
+        return encoded_idx is not None and (
+            idx is encoded_idx
+            or (
+                idx.shape == encoded_idx.shape
+                and idx.stride() == encoded_idx.stride()
+                and idx.data_ptr() == encoded_idx.data_ptr()
+            )
+        )
+
+    def forward(self, idx=None):
+        if idx is None:
+            assert not self.meta, "idx should not be None when meta is True"
+            return torch.empty(0).to(self.device)
+
+        assert (
+            idx.shape[-1] == 1
+        ), f"last dim of idx should be 1, got {idx.shape}"
+        if self._is_encoded_idx(idx):
+            return self._fix(self._own_context_hat)
+        return self.context_hat[idx[..., 0]]
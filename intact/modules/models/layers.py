@@ -1,5 +1,4 @@
 import math
-from itertools import product
 from typing import List, Optional
 
 import torch
@@ -57,17 +56,26 @@ class ParallelLinear(nn.Module):
         else:
             self.register_parameter("bias", None)
 
+        # packed weight of ``gathered_forward``, see ``pack_weight``
+        self._packed_weight = None
+        self._packed_weight_key = None
+        self._packed_layout = None
+
         self.reset_parameters()
 
     def reset_parameters(self):
-        for dims in product(*map(range, self.extra_dims)):
-            nn.init.kaiming_uniform_(self.weight[dims], a=math.sqrt(5))
-            if self.bias is not None:
-                fan_in, _ = nn.init._calculate_fan_in_and_fan_out(
-                    self.weight[dims]
-                )
-                bound = 1 / math.sqrt(fan_in) if fan_in > 0 else 0
-                nn.init.uniform_(self.bias[dims], -bound, bound)
+        # same init as nn.Linear for every slice over ``extra_dims``, i.e.
+        # kaiming_uniform_(a=sqrt(5)) on the weight: all slices share the
+        # same fan_in, so one uniform_ call with its bound fills the tensor
+        fan_in = self.in_features
+        gain = nn.init.calculate_gain("leaky_relu", math.sqrt(5))
+        weight_bound = (
+            math.sqrt(3.0) * gain / math.sqrt(fan_in) if fan_in > 0 else 0
+        )
+        nn.init.uniform_(self.weight, -weight_bound, weight_bound)
+        if self.bias is not None:
+            bias_bound = 1 / math.sqrt(fan_in) if fan_in > 0 else 0
+            nn.init.uniform_(self.bias, -bias_bound, bias_bound)
 
     def forward(self, x: torch.Tensor) -> torch.Tensor:
         ret = x.matmul(self.weight.transpose(-1, -2))
@@ -76,6 +84,102 @@ class ParallelLinear(nn.Module):
 
         return ret
 
+    def gathered_forward(
+        self,
+        x: torch.Tensor,
+        gather_idx: torch.Tensor,
+        gather_mask: torch.Tensor,
+    ) -> torch.Tensor:
+        """
+        Forward a shared input through the layer using only a packed subset of input columns.
+
+        Every element of ``extra_dims`` reads the columns of ``x`` given by its row of ``gather_idx``,
+        so the matmul costs ``k`` instead of ``in_features`` per output. Padded entries (where
+        ``gather_mask`` is False) are zeroed in the packed weight, so they do not contribute.
+
+        Args:
+            x (torch.Tensor): The shared input tensor of shape (batch_size, in_features).
+            gather_idx (torch.Tensor): The packed column indices of shape (*extra_dims, k).
+            gather_mask (torch.Tensor): The validity of each packed column, of shape (*extra_dims, k).
+
+        Returns:
+            torch.Tensor: The output tensor of shape (*extra_dims, batch_size, out_features).
+        """
+        packed_weight = self.pack_weight(gather_idx, gather_mask)
+        # shape: batch_size * (*extra_dims) * k -> (*extra_dims) * batch_size * k
+        packed_x = x[:, gather_idx].movedim(0, -2)
+
+        ret = packed_x.matmul(packed_weight.transpose(-1, -2))
+        if self.bias is not None:
+            ret += self.bias.unsqueeze(-2)
+
+        return ret
+
+    def pack_weight(
+        self, gather_idx: torch.Tensor, gather_mask: torch.Tensor
+    ) -> torch.Tensor:
+        """
+        Get the weight columns of the packed layout, with shape (*extra_dims, out_features, k).
+
+        Without gradients to the weight, the packed weight is cached and only gathered again when the
+        weight or the layout changes, like ``CausalMask.packed_layout`` for the mask logits.
+        """
+
+        def pack():
+            return self.weight.gather(
+                -1,
+                gather_idx.unsqueeze(-2).expand(
+                    *gather_idx.shape[:-1], self.out_features, -1
+                ),
+            ) * gather_mask.unsqueeze(-2).to(self.weight.dtype)
+
+        # only the own parameter is cached, not tensors swapped in by
+        # functional calls, and a cached graph would be freed by a backward
+        if not isinstance(self.weight, nn.Parameter) or (
+            torch.is_grad_enabled() and self.weight.requires_grad
+        ):
+            return pack()
+
+        # the cached layout keeps its storage alive, so its data pointers
+        # are not reused by another layout
+        key = (
+            self.weight._version,
+            self.weight.data_ptr(),
+            self.weight.device,
+            gather_idx._version,
+            gather_idx.data_ptr(),
+            gather_idx.shape,
+            gather_mask._version,
+            gather_mask.data_ptr(),
+            gather_mask.shape,
+        )
+        if self._packed_weight is None or self._packed_weight_key != key:
+            with torch.no_grad():
+                self._packed_weight = pack()
+            self._packed_weight_key = key
+            self._packed_layout = (gather_idx, gather_mask)
+        return self._packed_weight
+
+    def masked_forward(
+        self, x: torch.Tensor, mask: torch.Tensor
+    ) -> torch.Tensor:
+        """
+        Forward a shared input through the layer under a different input mask per sample.
+
+        The last element of ``extra_dims`` indexes the heads. The masked inputs of all heads are built with
+        one broadcasted multiply and contracted with one batched matmul, broadcast over the leading
+        ``extra_dims`` (e.g. the ensemble members).
+
+        Args:
+            x (torch.Tensor): The shared input tensor of shape (batch_size, in_features).
+            mask (torch.Tensor): The input masks of shape (heads, sampling_times, batch_size, in_features).
+
+        Returns:
+            torch.Tensor: The output tensor of shape (*extra_dims, sampling_times * batch_size, out_features).
+        """
+        masked_x = (mask * x).reshape(mask.shape[0], -1, self.in_features)
+        return self(masked_x)
+
     def extra_repr(self):
         return (
             "in_features={}, out_features={}, extra_dims={}, bias={}".format(
@@ -131,6 +235,12 @@ class ParallelGRUCell(nn.Module):
             self.register_parameter("bias_ih", None)
             self.register_parameter("bias_hh", None)
 
+        # fused weights and gate buffers, reused across steps without grad,
+        # kept out of the module state (``_buffers`` is torch's registry)
+        self._fused_cache = None
+        self._fused_cache_key = None
+        self._gate_buffers = {}
+
         self.reset_parameters()
 
     def reset_parameters(self) -> None:
@@ -138,8 +248,7 @@ class ParallelGRUCell(nn.Module):
             1.0 / math.sqrt(self.hidden_size) if self.hidden_size > 0 else 0
         )
         for weight in self.parameters():
-            for dims in product(*map(range, self.extra_dims)):
-                nn.init.uniform_(weight[dims], -stddev, stddev)
+            nn.init.uniform_(weight, -stddev, stddev)
 
     def forward(
         self, input: torch.Tensor, hx: Optional[torch.Tensor] = None
@@ -176,20 +285,97 @@ class ParallelGRUCell(nn.Module):
         else:
             hx = hx.unsqueeze(-2) if not is_batched else hx
 
-        ret = parallel_gru_cell(
-            input,
-            hx,
-            self.weight_ih,
-            self.weight_hh,
-            self.bias_ih,
-            self.bias_hh,
-        )
+        if _requires_grad(input, hx, *self.parameters()):
+            weight, bias = fuse_gru_weights(
+                self.weight_ih, self.weight_hh, self.bias_ih, self.bias_hh
+            )
+            ret = fused_parallel_gru_cell(input, hx, weight, bias)
+        else:
+            weight, bias = self._fused_weights()
+            ret = fused_parallel_gru_cell(
+                input, hx, weight, bias, self._get_gate_buffers(hx)
+            )
 
         if not is_batched:
             ret = ret.squeeze(0)
 
         return ret
 
+    def rollout(
+        self, inputs_seq: torch.Tensor, h0: Optional[torch.Tensor] = None
+    ) -> torch.Tensor:
+        """
+        Unroll the cell over a sequence of known inputs.
+
+        Every step runs the fused projection. Without gradient, the fused weights are built once,
+        the gate buffers are reused across steps and the hidden states are written into a
+        preallocated output, so the loop does not allocate.
+
+        :param inputs_seq: with shape: (time_steps, *extra_dims, batch_size, input_size)
+        :param h0: with shape: (*extra_dims, batch_size, hidden_size), zeros if None
+        :return:
+            outputs: hidden states of every step, with shape (time_steps, *extra_dims, batch_size, hidden_size)
+        """
+        if inputs_seq.dim() != 3 + len(self.extra_dims):
+            raise ValueError(
+                f"GRUCell: Expected inputs_seq to be {3 + len(self.extra_dims)}D, "
+                f"got {inputs_seq.dim()}D instead"
+            )
+        time_steps = inputs_seq.shape[0]
+        if h0 is None:
+            hx = torch.zeros(
+                *inputs_seq.shape[1:-1],
+                self.hidden_size,
+                dtype=inputs_seq.dtype,
+                device=inputs_seq.device,
+            )
+        else:
+            hx = h0
+
+        if _requires_grad(inputs_seq, hx, *self.parameters()):
+            weight, bias = fuse_gru_weights(
+                self.weight_ih, self.weight_hh, self.bias_ih, self.bias_hh
+            )
+            outputs = []
+            for t in range(time_steps):
+                hx = fused_parallel_gru_cell(inputs_seq[t], hx, weight, bias)
+                outputs.append(hx)
+            return torch.stack(outputs)
+
+        weight, bias = self._fused_weights()
+        buffers = self._get_gate_buffers(hx)
+        outputs = hx.new_empty(time_steps, *hx.shape)
+        for t in range(time_steps):
+            hx = fused_parallel_gru_cell(
+                inputs_seq[t], hx, weight, bias, buffers, out=outputs[t]
+            )
+        return outputs
+
+    def _fused_weights(self):
+        key = tuple((p._version, p.data_ptr()) for p in self.parameters())
+        if self._fused_cache is None or self._fused_cache_key != key:
+            with torch.no_grad():
+                self._fused_cache = fuse_gru_weights(
+                    self.weight_ih, self.weight_hh, self.bias_ih, self.bias_hh
+                )
+            self._fused_cache_key = key
+        return self._fused_cache
+
+    def _get_gate_buffers(self, hx):
+        batch_shape = hx.shape[:-1]
+        key = (batch_shape, hx.dtype, hx.device)
+        if key not in self._gate_buffers:
+            last_dims = (
+                self.input_size + self.hidden_size,
+                4 * self.hidden_size,
+                2 * self.hidden_size,
+                self.hidden_size,
+            )
+            self._gate_buffers = {
+                key: tuple(hx.new_empty(*batch_shape, d) for d in last_dims)
+            }
+        return self._gate_buffers[key]
+
 
 def parallel_gru_cell(input, hx, weight_ih, weight_hh, bias_ih, bias_hh):
     """
@@ -228,3 +414,105 @@ def parallel_gru_cell(input, hx, weight_ih, weight_hh, bias_ih, bias_hh):
     hy = (1 - update_gate) * hx + update_gate * new_gate
 
     return hy
+
+
+def _requires_grad(*tensors):
+    return torch.is_grad_enabled() and any(t.requires_grad for t in tensors)
+
+
+def fuse_gru_weights(weight_ih, weight_hh, bias_ih, bias_hh):
+    """
+    Fuse the input-hidden and hidden-hidden weights of a GRU cell into a single projection.
+
+    The fused weight maps the concatenation ``[input, hx]`` to ``[r + u pre-activations, i_n, h_n]``:
+    the reset and update gates sum both projections, while the new gate keeps them apart because
+    ``h_n`` is scaled by the reset gate.
+
+    Args:
+        weight_ih (torch.Tensor): The input-hidden weights tensor of shape (*extra_dims, 3 * hidden_size, input_size).
+        weight_hh (torch.Tensor): The hidden-hidden weights tensor of shape (*extra_dims, 3 * hidden_size, hidden_size).
+        bias_ih (torch.Tensor): The input-hidden bias tensor of shape (*extra_dims, 3 * hidden_size) or None.
+        bias_hh (torch.Tensor): The hidden-hidden bias tensor of shape (*extra_dims, 3 * hidden_size) or None.
+
+    Returns:
+        tuple: The transposed fused weight of shape (*extra_dims, input_size + hidden_size, 4 * hidden_size),
+            and the fused bias of shape (*extra_dims, 4 * hidden_size) or None.
+    """
+    hidden_size = weight_hh.shape[-1]
+    ih_ru, ih_n = weight_ih.split([2 * hidden_size, hidden_size], dim=-2)
+    hh_ru, hh_n = weight_hh.split([2 * hidden_size, hidden_size], dim=-2)
+    weight = torch.cat(
+        [
+            torch.cat([ih_ru, hh_ru], dim=-1),
+            torch.cat([ih_n, torch.zeros_like(hh_n)], dim=-1),
+            torch.cat([torch.zeros_like(ih_n), hh_n], dim=-1),
+        ],
+        dim=-2,
+    )
+    weight = weight.transpose(-1, -2).contiguous()
+
+    if bias_ih is None and bias_hh is None:
+        return weight, None
+    if bias_ih is None:
+        bias_ih = torch.zeros_like(bias_hh)
+    if bias_hh is None:
+        bias_hh = torch.zeros_like(bias_ih)
+    b_ih_ru, b_ih_n = bias_ih.split([2 * hidden_size, hidden_size], dim=-1)
+    b_hh_ru, b_hh_n = bias_hh.split([2 * hidden_size, hidden_size], dim=-1)
+    bias = torch.cat([b_ih_ru + b_hh_ru, b_ih_n, b_hh_n], dim=-1)
+    return weight, bias
+
+
+def fused_parallel_gru_cell(input, hx, weight, bias, buffers=None, out=None):
+    """
+    Perform a GRU cell operation with extra dimensions, using a single fused projection.
+
+    Equivalent to ``parallel_gru_cell`` with weights fused by ``fuse_gru_weights``: the input and
+    hidden projections run as one batched matmul over ``[input, hx]``. When ``buffers`` are given
+    (only valid without gradient), the concatenated input and all gates are computed in place in
+    them instead of allocating temporaries.
+
+    Args:
+        input (torch.Tensor): The input tensor of shape (*extra_dims, batch_size, input_size).
+        hx (torch.Tensor): The hidden state tensor of shape (*extra_dims, batch_size, hidden_size).
+        weight (torch.Tensor): The transposed fused weights tensor of shape
+            (*extra_dims, input_size + hidden_size, 4 * hidden_size).
+        bias (torch.Tensor): The fused bias tensor of shape (*extra_dims, 4 * hidden_size) or None.
+        buffers (tuple, optional): Buffers for ``[input, hx]``, the fused gates, the reset-update gates
+            and the new gate, each of shape (*extra_dims, batch_size, ...). Defaults to None.
+        out (torch.Tensor, optional): The output tensor to write the new hidden state in. Defaults to None.
+
+    Returns:
+        torch.Tensor: The output tensor of shape (*extra_dims, batch_size, hidden_size).
+    """
+    hidden_size = hx.shape[-1]
+
+    if buffers is None:
+        gates = torch.cat([input, hx], dim=-1).matmul(weight)
+        if bias is not None:
+            gates = gates + bias.unsqueeze(-2)
+        reset_gate, update_gate = F.sigmoid(
+            gates[..., : 2 * hidden_size]
+        ).chunk(2, dim=-1)
+        new_gate = F.tanh(
+            gates[..., 2 * hidden_size : 3 * hidden_size]
+            + reset_gate * gates[..., 3 * hidden_size :]
+        )
+    else:
+        xh_buffer, gates_buffer, ru_buffer, new_buffer = buffers
+        torch.cat([input, hx], dim=-1, out=xh_buffer)
+        gates = torch.matmul(xh_buffer, weight, out=gates_buffer)
+        if bias is not None:
+            gates += bias.unsqueeze(-2)
+        torch.sigmoid(gates[..., : 2 * hidden_size], out=ru_buffer)
+        reset_gate, update_gate = ru_buffer.chunk(2, dim=-1)
+        new_gate = torch.addcmul(
+            gates[..., 2 * hidden_size : 3 * hidden_size],
+            reset_gate,
+            gates[..., 3 * hidden_size :],
+            out=new_buffer,
+        ).tanh_()
+
+    if out is None:
+        return torch.lerp(hx, new_gate, update_gate)
+    return torch.lerp(hx, new_gate, update_gate, out=out)
@@ -23,6 +23,9 @@ class CausalWorldModel(PlainMDPWorldModel):
         observed_logits_init_bias=0.5,
         context_logits_init_bias=0.5,
         logits_init_scale=0.0,
+        sparse_inference=False,
+        ensemble_size=0,
+        amortized_context=False,
     ):
         """Initializes the CausalWorldModel class.
 
@@ -41,12 +44,19 @@ class CausalWorldModel(PlainMDPWorldModel):
             observed_logits_init_bias (float, optional): Bias for mask logits for observed variables initialization. Defaults to 0.5.
             context_logits_init_bias (float, optional): Bias for mask logits for context variables initialization. Defaults to 0.5.
             logits_init_scale (float, optional): Scale for mask logits initialization. Defaults to 0.0.
+            sparse_inference (bool, optional): Whether to run the first layer only on the active inputs of
+                each output when the mask is deterministic. Defaults to False.
+            ensemble_size (int, optional): Number of ensemble members sharing the causal mask and the batch,
+                run as one batched network. Set to 0 for a single model. Defaults to 0.
+            amortized_context (bool, optional): Whether to infer the contexts from transitions with a set
+                encoder instead of learning one context per task. Defaults to False.
         """
         self.using_reinforce = using_reinforce
         self.logits_clip = logits_clip
         self.observed_logits_init_bias = observed_logits_init_bias
         self.context_logits_init_bias = context_logits_init_bias
         self.logits_init_scale = logits_init_scale
+        self.sparse_inference = sparse_inference
 
         super().__init__(
             obs_dim=obs_dim,
@@ -57,6 +67,8 @@ class CausalWorldModel(PlainMDPWorldModel):
             residual=residual,
             hidden_dims=hidden_dims,
             log_var_bounds=log_var_bounds,
+            ensemble_size=ensemble_size,
+            amortized_context=amortized_context,
         )
 
         self.causal_mask = CausalMask(
@@ -79,11 +91,26 @@ class CausalWorldModel(PlainMDPWorldModel):
             input_dim=self.all_input_dim,
             output_dim=2,
             hidden_dims=self.hidden_dims,
-            extra_dims=[self.output_dim],
+            extra_dims=[self.ensemble_size, self.output_dim]
+            if self.ensemble_size > 0
+            else [self.output_dim],
             activate_name="ReLU",
         )
         return ModuleDict(dict(para_mlp=para_mlp))
 
+    def split_outputs(self, outputs):
+        """Splits the outputs of ``para_mlp`` into mean and log_var.
+
+        Args:
+            outputs (Tensor): The outputs with shape ([ensemble_size,] output_dim, batch_size, 2).
+
+        Returns:
+            tuple: The mean and log_var, each with shape (batch_size [* ensemble_size], output_dim).
+        """
+        if self.ensemble_size > 0:
+            return outputs.permute(3, 2, 0, 1).reshape(2, -1, outputs.shape[1])
+        return outputs.permute(2, 1, 0)
+
     @property
     def params_dict(self):
         """Gets the parameters of the model.
@@ -115,11 +142,22 @@ class CausalWorldModel(PlainMDPWorldModel):
         )
         batch_shape, dim = inputs.shape[:-1], inputs.shape[-1]
 
-        masked_inputs, mask = self.causal_mask(
-            inputs.reshape(-1, dim), deterministic=deterministic_mask
-        )
-
-        mean, log_var = self.nets["para_mlp"](masked_inputs).permute(2, 1, 0)
+        if (
+            deterministic_mask
+            and self.sparse_inference
+            and self.causal_mask.using_reinforce
+        ):
+            mean, log_var = self.sparse_forward(inputs.reshape(-1, dim))
+            mask = self.causal_mask.mask.float().expand(
+                batch_shape.numel(), -1, -1
+            )
+        else:
+            masked_inputs, mask = self.causal_mask(
+                inputs.reshape(-1, dim), deterministic=deterministic_mask
+            )
+            mean, log_var = self.split_outputs(
+                self.nets["para_mlp"](masked_inputs)
+            )
 
         mask = mask.reshape(
             *batch_shape,
@@ -127,3 +165,74 @@ class CausalWorldModel(PlainMDPWorldModel):
             self.causal_mask.mask_input_dim,
         )
         return *self.get_outputs(mean, log_var, observation, batch_shape), mask
+
+    def sampling_forward(
+        self,
+        observation,
+        action,
+        idx=None,
+        sampling_times=50,
+        sampling_mode="iid",
+    ):
+        """Performs a forward pass with ``sampling_times`` sampled masks for every input.
+
+        The observation, action and context are shared by all samples and only broadcast against
+        the sampled masks, so the inputs are never repeated.
+
+        Args:
+            observation (Tensor): The observations.
+            action (Tensor): The actions.
+            idx (int, optional): The index. Defaults to None.
+            sampling_times (int, optional): The number of sampled masks per input. Defaults to 50.
+            sampling_mode (str, optional): The sampling mode of the masks, see ``CausalMask.sampling_forward``.
+                Defaults to "iid".
+
+        Returns:
+            tuple: The outputs of the forward pass, with a leading sampling dimension.
+        """
+        inputs = torch.cat(
+            [observation, action, self.context_model(idx)], dim=-1
+        )
+        batch_shape, dim = inputs.shape[:-1], inputs.shape[-1]
+
+        inputs = inputs.reshape(-1, dim)
+        head_major_mask, mask = self.causal_mask.sampling_forward(
+            inputs,
+            sampling_times,
+            sampling_mode=sampling_mode,
+        )
+
+        para_mlp = self.nets["para_mlp"]
+        hidden = para_mlp[0].masked_forward(inputs, head_major_mask)
+        mean, log_var = self.split_outputs(para_mlp[1:](hidden))
+
+        sampling_shape = torch.Size([sampling_times, *batch_shape])
+        mask = mask.reshape(
+            *sampling_shape,
+            self.causal_mask.mask_output_dim,
+            self.causal_mask.mask_input_dim,
+        )
+        return (
+            *self.get_outputs(mean, log_var, observation, sampling_shape),
+            mask,
+        )
+
+    def sparse_forward(self, inputs):
+        """Runs ``para_mlp`` with the deterministic mask, feeding each output head only its active inputs.
+
+        Equivalent to masking the inputs with the deterministic mask, but the first layer is a gathered
+        batched matmul over the packed layout of ``causal_mask``.
+
+        Args:
+            inputs (Tensor): The unmasked inputs, with shape (batch_size, all_input_dim).
+
+        Returns:
+            tuple: The mean and log_var, each with shape (batch_size [* ensemble_size], output_dim).
+        """
+        gather_idx, gather_mask = self.causal_mask.packed_layout
+        if self.ensemble_size > 0:
+            gather_idx = gather_idx.expand(self.ensemble_size, -1, -1)
+            gather_mask = gather_mask.expand(self.ensemble_size, -1, -1)
+        para_mlp = self.nets["para_mlp"]
+        hidden = para_mlp[0].gathered_forward(inputs, gather_idx, gather_mask)
+        return self.split_outputs(para_mlp[1:](hidden))
@@ -18,6 +18,8 @@ class PlainMDPWorldModel(BaseWorldModel):
         learn_obs_var=True,
         hidden_dims=None,
         log_var_bounds=(-10.0, 0.5),
+        ensemble_size=0,
+        amortized_context=False,
     ):
         """World-model class for environment learning with causal discovery.
 
@@ -29,9 +31,14 @@ class PlainMDPWorldModel(BaseWorldModel):
         :param residual: whether to use residual connection for transition model
         :param hidden_dims: hidden dimensions for transition model
         :param log_var_bounds: bounds for log_var of gaussian nll loss
+        :param ensemble_size: number of ensemble members, which share the batch and run as one batched
+            network, set to 0 for a single model. Outputs get an extra member dim before the last dim
+        :param amortized_context: whether to infer the contexts from transitions with a set encoder instead of
+            learning one context per task
         """
 
         self.hidden_dims = hidden_dims or [256, 256]
+        self.ensemble_size = ensemble_size
         self.log_var_bounds = log_var_bounds
         self._learn_obs_var = learn_obs_var
 
@@ -42,6 +49,7 @@ class PlainMDPWorldModel(BaseWorldModel):
             max_context_dim=max_context_dim,
             task_num=task_num,
             residual=residual,
+            amortized_context=amortized_context,
         )
 
     @property
@@ -53,7 +61,9 @@ class PlainMDPWorldModel(BaseWorldModel):
             input_dim=self.all_input_dim,
             output_dim=self.output_dim * 2,
             hidden_dims=self.hidden_dims,
-            extra_dims=None,
+            extra_dims=[self.ensemble_size]
+            if self.ensemble_size > 0
+            else None,
             activate_name="SiLU",
         )
 
@@ -65,7 +75,17 @@ class PlainMDPWorldModel(BaseWorldModel):
         log_var = min_log_var + F.softplus(log_var - min_log_var)
         return log_var
 
+    def split_outputs(self, outputs):
+        if self.ensemble_size > 0:
+            # ensemble_size * batch_size * dim -> (batch_size * ensemble_size) * dim
+            outputs = outputs.transpose(0, 1).reshape(-1, outputs.shape[-1])
+        return outputs.chunk(2, dim=-1)
+
     def get_outputs(self, mean, log_var, observation, batch_size):
+        if self.ensemble_size > 0:
+            observation = observation.unsqueeze(-2)
+            batch_size = (*batch_size, self.ensemble_size)
+
         next_obs_mean, reward_mean, terminated = (
             mean[:, :-2],
             mean[:, -2:-1],
@@ -100,7 +120,121 @@ class PlainMDPWorldModel(BaseWorldModel):
         inputs = torch.cat([observation, action, context], dim=-1)
         batch_shape, dim = inputs.shape[:-1], inputs.shape[-1]
 
-        mean, log_var = self.nets["mlp"](inputs.reshape(-1, dim)).chunk(
-            2, dim=-1
+        mean, log_var = self.split_outputs(
+            self.nets["mlp"](inputs.reshape(-1, dim))
         )
         return self.get_outputs(mean, log_var, observation, batch_shape)
+
+    @torch.no_grad()
+    def infer_context(
+        self,
+        observation,
+        action,
+        idx,
+        next_observation,
+        reward,
+        newton_steps=1,
+        prior_precision=1.0,
+        **forward_kwargs,
+    ):
+        """Refines the contexts of the tasks in ``idx`` from a batch of their transitions, without an optimizer.
+
+        With an amortized context model, the encoder accumulates the batch instead. Otherwise the nets are
+        frozen, and every task is updated as an iterated extended kalman filter in information
+        form: the gaussian likelihood of the next observations and rewards is linearized around the current
+        contexts with forward-mode jacobians (``max_context_dim`` forward passes per newton step), and the
+        newton step is solved in closed form together with the precision accumulated by the previous
+        batches of the task. Calling it on a stream of batches refines the contexts incrementally; tasks
+        without transitions in the batch are left untouched, and fixed context dims get no update.
+
+        :param observation: observations, with shape (*batch_size, obs_dim)
+        :param action: actions, with shape (*batch_size, action_dim)
+        :param idx: task indices, with shape (*batch_size, 1)
+        :param next_observation: next observations, with shape (*batch_size, obs_dim)
+        :param reward: rewards, with shape (*batch_size, 1)
+        :param newton_steps: number of relinearizations on the batch
+        :param prior_precision: precision of the contexts before the first batch of a task
+        :param forward_kwargs: extra keyword arguments of ``forward``
+        :return: the updated contexts, with shape (task_num, max_context_dim)
+        """
+        assert (
+            self.meta
+        ), "context inference is only available for meta world models"
+        if self.amortized_context:
+            # the encoder infers the contexts in one pass
+            return self.context_model.encode(
+                observation,
+                action,
+                next_observation,
+                reward,
+                idx,
+                accumulate=True,
+            )
+
+        context_model = self.context_model
+        context_dim = context_model.max_context_dim
+        batch_num = idx.shape[:-1].numel()
+
+        observation = observation.reshape(batch_num, -1)
+        action = action.reshape(batch_num, -1)
+        idx = idx.reshape(batch_num, 1)
+        target = torch.cat([next_observation, reward], dim=-1).reshape(
+            batch_num, -1
+        )
+
+        def predict(context):
+            outputs = torch.func.functional_call(
+                self,
+                {"context_model._context_hat": context},
+                (observation, action, idx),
+                forward_kwargs,
+            )
+            obs_mean, obs_log_var, reward_mean, reward_log_var = outputs[:4]
+            mean = torch.cat([obs_mean, reward_mean], dim=-1)
+            log_var = torch.cat([obs_log_var, reward_log_var], dim=-1)
+            if self.ensemble_size > 0:
+                # moment-match the members, their disagreement adds to the variance
+                var = log_var.exp().mean(-2) + mean.var(-2, unbiased=False)
+                mean, log_var = mean.mean(-2), var.log()
+            return mean, log_var
+
+        prior_context = context_model._context_hat.detach().clone()
+        prior_precision = context_model.get_context_precision(prior_precision)
+        context, precision = prior_context, prior_precision
+        for _ in range(newton_steps):
+            jacobian = []
+            for i in range(context_dim):
+                tangent = torch.zeros_like(context)
+                tangent[:, i] = 1.0
+                (mean, log_var), (d_mean, _) = torch.func.jvp(
+                    predict, (context,), (tangent,)
+                )
+                jacobian.append(d_mean)
+            jacobian = torch.stack(jacobian, dim=-1)
+            weight = torch.exp(-log_var)
+
+            # residual of the likelihood linearized around the current contexts, relative to the prior
+            delta = (context - prior_context)[idx[:, 0]]
+            residual = target - mean + (jacobian @ delta.unsqueeze(-1))[..., 0]
+
+            precision = prior_precision.index_add(
+                0,
+                idx[:, 0],
+                torch.einsum("ndc,nd,nde->nce", jacobian, weight, jacobian),
+            )
+            information = torch.zeros_like(context).index_add(
+                0,
+                idx[:, 0],
+                torch.einsum("ndc,nd,nd->nc", jacobian, weight, residual),
+            )
+            context = prior_context + torch.linalg.solve(
+                precision, information
+            )
+            context = torch.clamp(
+                context,
+                -context_model.context_clip,
+                context_model.context_clip,
+            )
+
+        context_model.update_context(context, precision)
+        return context_model.context_hat
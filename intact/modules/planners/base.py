@@ -0,0 +1,62 @@
+from typing import Sequence
+
+import torch
+from tensordict.tensordict import TensorDictBase
+from torchrl.modules.planners.common import MPCPlannerBase
+
+from intact.envs.mdp_env import MDPEnv
+from intact.modules.planners.rollout import truncated_return
+
+
+class TensorPlannerBase(MPCPlannerBase):
+    def __init__(
+        self,
+        env: MDPEnv,
+        planning_horizon: int,
+        optim_steps: int,
+        num_candidates: int,
+        compact_rollout: bool = False,
+        action_key: str = "action",
+    ):
+        """Base class of sampling-based planners scoring action sequences with ``truncated_return``.
+
+        Args:
+            env (MDPEnv): the model-based environment, stepped through ``MDPEnv.model_step``.
+            planning_horizon (int): the length of the planned action sequences.
+            optim_steps (int): the number of optimization iterations per planning call.
+            num_candidates (int): the number of sampled action sequences per iteration.
+            compact_rollout (bool, optional): whether to drop done sequences from the working batch of the
+                rollouts. Defaults to False.
+            action_key (str, optional): the action key. Defaults to "action".
+        """
+        super().__init__(env=env, action_key=action_key)
+        self.planning_horizon = planning_horizon
+        self.optim_steps = optim_steps
+        self.num_candidates = num_candidates
+        self.compact_rollout = compact_rollout
+
+    def action_sequence_shape(
+        self, batch_size: Sequence[int], num: int
+    ) -> torch.Size:
+        return torch.Size(
+            (*batch_size, num, self.planning_horizon, *self.action_spec.shape)
+        )
+
+    def init_action_means(self, tensordict: TensorDictBase) -> torch.Tensor:
+        return torch.zeros(
+            self.action_sequence_shape(tensordict.batch_size, 1),
+            device=tensordict.get("observation").device,
+            dtype=self.env.action_spec.dtype,
+        )
+
+    def evaluate(
+        self, tensordict: TensorDictBase, actions: torch.Tensor
+    ) -> torch.Tensor:
+        """Gets the returns of the action sequences, with shape (*batch_size, num, 1)."""
+        return truncated_return(
+            self.env,
+            tensordict.get("observation"),
+            actions,
+            tensordict.get("idx", None),
+            compact=self.compact_rollout,
+        )
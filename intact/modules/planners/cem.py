@@ -9,6 +9,25 @@ from torchrl.envs.common import EnvBase
 from torchrl.envs.utils import step_mdp
 from torchrl.modules import CEMPlanner
 
+from intact.envs.rollout import compacted_rollout
+from intact.modules.planners.rollout import truncated_return, project_actions_
+
+
+def episode_start(tensordict: TensorDictBase):
+    """Gets the batch elements whose observation starts an episode, or None if it is unknown.
+
+    Collectors and non-stopping rollouts reset the done elements before the policy runs, so the policy
+    never sees their "done" flag. The starts are read from "is_init" (``InitTracker``), or from a
+    "step_count" of 0 (``StepCounter``), and only fall back to "done" without them.
+    """
+    is_init = tensordict.get("is_init", None)
+    if is_init is not None:
+        return is_init
+    step_count = tensordict.get("step_count", None)
+    if step_count is not None:
+        return step_count == 0
+    return tensordict.get("done", None)
+
 
 class MyCEMPlanner(CEMPlanner):
     def __init__(
@@ -21,7 +40,31 @@ class MyCEMPlanner(CEMPlanner):
         reward_key: str = ("next", "reward"),
         action_key: str = "action",
         alpha=0.1,
+        backend="tensordict",
+        warm_start=False,
+        warm_optim_steps=None,
+        compact_rollout=False,
     ):
+        """
+        Args:
+            env (EnvBase): the model-based environment.
+            planning_horizon (int): the length of the planned action sequences.
+            optim_steps (int): the number of CEM iterations per planning call.
+            num_candidates (int): the number of sampled action sequences per iteration.
+            top_k (int): the number of elite sequences used to refit the sampling distribution.
+            reward_key (str, optional): the reward key of the rollouts. Defaults to ("next", "reward").
+            action_key (str, optional): the action key. Defaults to "action".
+            alpha (float, optional): the weight of the old distribution in the refit. Defaults to 0.1.
+            backend (str, optional): "tensordict" rolls out through ``env.step``, "tensor" steps an
+                ``MDPEnv`` model directly on preallocated tensors. Defaults to "tensordict".
+            warm_start (bool, optional): whether to start every planning call from the previous action means
+                of the same batch element, shifted by one step. Elements starting an episode start from
+                scratch, see ``episode_start``. Defaults to False.
+            warm_optim_steps (int, optional): the number of CEM iterations when every batch element is warm
+                started. Defaults to None, which uses ``optim_steps``.
+            compact_rollout (bool, optional): whether to drop done candidates from the working batch of the
+                rollouts instead of simulating them until every candidate is done. Defaults to False.
+        """
         super().__init__(
             env=env,
             planning_horizon=planning_horizon,
@@ -33,18 +76,64 @@ class MyCEMPlanner(CEMPlanner):
         )
 
         self.alpha = alpha
+        self.backend = backend
+        self.warm_start = warm_start
+        self.warm_optim_steps = warm_optim_steps
+        self._last_action_means = None
+        self.compact_rollout = compact_rollout
 
     def planning(self, tensordict: TensorDictBase) -> torch.Tensor:
+        if self.backend == "tensordict":
+            return self.tensordict_planning(tensordict)
+        elif self.backend == "tensor":
+            return self.tensor_planning(tensordict)
+        else:
+            raise NotImplementedError(
+                "{} is not supported as a planner backend".format(self.backend)
+            )
+
+    def reset(self):
+        """Drops the solution kept for warm starting."""
+        self._last_action_means = None
+
+    def init_action_stats(self, tensordict: TensorDictBase):
+        """Gets the initial action means and stds of a planning call, and its number of CEM iterations."""
         batch_size = tensordict.batch_size
-        action_shape = (
+        action_means = torch.zeros(
             *batch_size,
-            self.num_candidates,
+            1,
             self.planning_horizon,
             *self.action_spec.shape,
+            device=tensordict.get("observation").device,
+            dtype=self.env.action_spec.dtype,
         )
-        action_stats_shape = (
+        action_stds = torch.ones_like(action_means)
+
+        last_action_means = self._last_action_means
+        if (
+            not self.warm_start
+            or last_action_means is None
+            or last_action_means.shape != action_means.shape
+        ):
+            return action_means, action_stds, self.optim_steps
+
+        # receding horizon: drop the executed step and pad the tail with the initial mean
+        action_means[..., :-1, :] = last_action_means[..., 1:, :]
+        optim_steps = self.warm_optim_steps or self.optim_steps
+
+        start = episode_start(tensordict)
+        if start is not None:
+            start = start.reshape(*batch_size, 1, 1, 1)
+            if start.any():
+                action_means.masked_fill_(start, 0.0)
+                optim_steps = self.optim_steps
+        return action_means, action_stds, optim_steps
+
+    def tensordict_planning(self, tensordict: TensorDictBase) -> torch.Tensor:
+        batch_size = tensordict.batch_size
+        action_shape = (
             *batch_size,
-            1,
+            self.num_candidates,
             self.planning_horizon,
             *self.action_spec.shape,
         )
@@ -61,12 +150,9 @@ class MyCEMPlanner(CEMPlanner):
             .expand(*batch_size, self.num_candidates)
             .to_tensordict()
         )
-        _action_means = torch.zeros(
-            *action_stats_shape,
-            device=tensordict.device,
-            dtype=self.env.action_spec.dtype,
+        _action_means, _action_stds, optim_steps = self.init_action_stats(
+            tensordict
         )
-        _action_stds = torch.ones_like(_action_means)
         container = TensorDict(
             {
                 "tensordict": expanded_original_tensordict,
@@ -81,7 +167,7 @@ class MyCEMPlanner(CEMPlanner):
             batch_size,
         )
 
-        for _ in range(self.optim_steps):
+        for _ in range(optim_steps):
             actions_means = container.get(("stats", "_action_means"))
             actions_stds = container.get(("stats", "_action_stds"))
             actions = actions_means + actions_stds * torch.randn(
@@ -108,6 +194,62 @@ class MyCEMPlanner(CEMPlanner):
                 container,
             )
         action_means = container.get(("stats", "_action_means"))
+        self._last_action_means = action_means.clone()
+        return action_means[..., 0, 0, :]
+
+    @torch.no_grad()
+    def tensor_planning(self, tensordict: TensorDictBase) -> torch.Tensor:
+        batch_size = tensordict.batch_size
+        observation = tensordict.get("observation")
+        idx = tensordict.get("idx", None)
+        action_shape = (
+            *batch_size,
+            self.num_candidates,
+            self.planning_horizon,
+            *self.action_spec.shape,
+        )
+        action_topk_shape = (
+            *batch_size,
+            self.top_k,
+            self.planning_horizon,
+            *self.action_spec.shape,
+        )
+        K_DIM = len(self.action_spec.shape) - 4
+
+        action_means, action_stds, optim_steps = self.init_action_stats(
+            tensordict
+        )
+        actions = torch.empty(
+            action_shape, device=observation.device, dtype=action_means.dtype
+        )
+
+        for _ in range(optim_steps):
+            torch.randn(action_shape, out=actions)
+            actions.mul_(action_stds).add_(action_means)
+            project_actions_(self.env.action_spec, actions)
+
+            sum_rewards = truncated_return(
+                self.env,
+                observation,
+                actions,
+                idx,
+                compact=self.compact_rollout,
+            )
+            _, top_k = sum_rewards.topk(self.top_k, dim=-2)
+            top_k = top_k.reshape(*top_k.shape[:-1], 1, 1).expand(
+                action_topk_shape
+            )
+            best_actions = actions.gather(K_DIM, top_k)
+
+            action_means.mul_(self.alpha).add_(
+                best_actions.mean(dim=K_DIM, keepdim=True),
+                alpha=1 - self.alpha,
+            )
+            action_stds.mul_(self.alpha).add_(
+                best_actions.std(dim=K_DIM, keepdim=True),
+                alpha=1 - self.alpha,
+            )
+        self._last_action_means = action_means
         return action_means[..., 0, 0, :]
 
     def update_stats(self, means, stds, container):
@@ -125,6 +267,11 @@ class MyCEMPlanner(CEMPlanner):
         container.set_(("stats", "_action_stds"), new_stds)
 
     def reward_truncated_rollout(self, policy, tensordict):
+        if self.compact_rollout:
+            return self.compacted_reward_truncated_rollout(
+                policy.actions, tensordict
+            )
+
         tensordicts = []
         ever_done = torch.zeros(*tensordict.batch_size, 1, dtype=bool).to(
             self.device
@@ -151,6 +298,22 @@ class MyCEMPlanner(CEMPlanner):
 
         return out_td
 
+    def compacted_reward_truncated_rollout(self, actions, tensordict):
+        # flat candidates * planning_horizon * action_dim
+        actions = actions.reshape(
+            -1, *actions.shape[len(tensordict.batch_size) :]
+        )
+
+        def step_fn(tensordict, t, active_idx):
+            tensordict.set("action", actions[active_idx, t])
+            return self.env.step(tensordict)
+
+        # the rewards after done are filled with zeros, as in the truncated rollout
+        with torch.no_grad():
+            return compacted_rollout(
+                step_fn, tensordict, self.planning_horizon
+            )
+
 
 class _PrecomputedActionsSequentialSetter:
     def __init__(self, actions):
@@ -0,0 +1,103 @@
+import torch
+from tensordict.tensordict import TensorDictBase
+
+from intact.envs.mdp_env import MDPEnv
+from intact.modules.planners.base import TensorPlannerBase
+from intact.modules.planners.rollout import project_actions_
+
+
+class GradCEMPlanner(TensorPlannerBase):
+    def __init__(
+        self,
+        env: MDPEnv,
+        planning_horizon: int,
+        optim_steps: int,
+        num_candidates: int,
+        top_k: int,
+        grad_steps: int = 1,
+        grad_lr: float = 0.01,
+        alpha: float = 0.1,
+        compact_rollout: bool = False,
+        action_key: str = "action",
+    ):
+        """Cross entropy method planner whose elites are refined by gradient ascent on the model return.
+
+        The rollout is differentiable w.r.t. the actions (the model noise is reparameterized), so every
+        iteration the elites take ``grad_steps`` gradient steps before the sampling distribution is refit.
+        Only the actions receive gradients, the model parameters are untouched.
+
+        Args:
+            env (MDPEnv): the model-based environment.
+            planning_horizon (int): the length of the planned action sequences.
+            optim_steps (int): the number of CEM iterations per planning call.
+            num_candidates (int): the number of sampled action sequences per iteration.
+            top_k (int): the number of elite sequences used to refit the sampling distribution.
+            grad_steps (int, optional): the number of gradient steps on the elites per iteration. Defaults to 1.
+            grad_lr (float, optional): the step size of the gradient ascent. Defaults to 0.01.
+            alpha (float, optional): the weight of the old distribution in the refit. Defaults to 0.1.
+            compact_rollout (bool, optional): whether to drop done sequences from the working batch of the
+                rollouts. Defaults to False.
+            action_key (str, optional): the action key. Defaults to "action".
+        """
+        super().__init__(
+            env=env,
+            planning_horizon=planning_horizon,
+            optim_steps=optim_steps,
+            num_candidates=num_candidates,
+            compact_rollout=compact_rollout,
+            action_key=action_key,
+        )
+        self.top_k = top_k
+        self.grad_steps = grad_steps
+        self.grad_lr = grad_lr
+        self.alpha = alpha
+
+    def refine(
+        self, tensordict: TensorDictBase, actions: torch.Tensor
+    ) -> torch.Tensor:
+        for _ in range(self.grad_steps):
+            with torch.enable_grad():
+                actions = actions.detach().requires_grad_(True)
+                sum_rewards = self.evaluate(tensordict, actions)
+                (grad,) = torch.autograd.grad(sum_rewards.sum(), actions)
+            actions = self.env.action_spec.project(
+                actions.detach() + self.grad_lr * grad
+            )
+        return actions
+
+    @torch.no_grad()
+    def planning(self, tensordict: TensorDictBase) -> torch.Tensor:
+        batch_size = tensordict.batch_size
+        action_means = self.init_action_means(tensordict)
+        action_stds = torch.ones_like(action_means)
+        action_shape = self.action_sequence_shape(
+            batch_size, self.num_candidates
+        )
+        actions = torch.empty(
+            action_shape, device=action_means.device, dtype=action_means.dtype
+        )
+        K_DIM = len(self.action_spec.shape) - 4
+
+        for _ in range(self.optim_steps):
+            torch.randn(action_shape, out=actions)
+            actions.mul_(action_stds).add_(action_means)
+            project_actions_(self.env.action_spec, actions)
+
+            sum_rewards = self.evaluate(tensordict, actions)
+            _, top_k = sum_rewards.topk(self.top_k, dim=-2)
+            top_k = top_k.unsqueeze(-1).expand(
+                self.action_sequence_shape(batch_size, self.top_k)
+            )
+            best_actions = self.refine(
+                tensordict, actions.gather(K_DIM, top_k)
+            )
+
+            action_means.mul_(self.alpha).add_(
+                best_actions.mean(dim=K_DIM, keepdim=True),
+                alpha=1 - self.alpha,
+            )
+            action_stds.mul_(self.alpha).add_(
+                best_actions.std(dim=K_DIM, keepdim=True),
+                alpha=1 - self.alpha,
+            )
+        return action_means[..., 0, 0, :]
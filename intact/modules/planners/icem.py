@@ -0,0 +1,188 @@
+import torch
+from tensordict.tensordict import TensorDictBase
+
+from intact.envs.mdp_env import MDPEnv
+from intact.modules.planners.base import TensorPlannerBase
+from intact.modules.planners.cem import episode_start
+from intact.modules.planners.rollout import project_actions_
+
+
+def colored_noise(
+    shape, beta: float, time_dim: int = -2, device=None, dtype=None
+) -> torch.Tensor:
+    """Samples unit-variance gaussian noise with a power spectral density of 1 / f ** beta along ``time_dim``.
+
+    ``beta=0`` is white noise, larger ``beta`` gives smoother, lower-frequency noise.
+    """
+    shape = list(shape)
+    time_dim = time_dim % len(shape)
+    length = shape[time_dim]
+
+    freqs = torch.fft.rfftfreq(length, device=device)
+    # the zero frequency would get an infinite scale, clip it to the lowest resolvable one
+    freqs[0] = 1.0 / length
+    scale = freqs.pow(-beta / 2.0)
+
+    # irfft keeps only the real part of the zero (and even-length nyquist) frequency, and counts
+    # the others twice, so this is the variance of every time step
+    counts = torch.full_like(scale, 4.0)
+    counts[0] = 1.0
+    if length % 2 == 0:
+        counts[-1] = 1.0
+    std = torch.sqrt((counts * scale**2).sum()) / length
+
+    spectrum_shape = shape.copy()
+    spectrum_shape[time_dim] = freqs.shape[0]
+    scale_shape = [1] * len(shape)
+    scale_shape[time_dim] = freqs.shape[0]
+    scale = scale.reshape(scale_shape)
+
+    spectrum = torch.complex(
+        torch.randn(spectrum_shape, device=device),
+        torch.randn(spectrum_shape, device=device),
+    ) * (scale / std)
+    noise = torch.fft.irfft(spectrum, n=length, dim=time_dim)
+    return noise.to(dtype) if dtype is not None else noise
+
+
+class ICEMPlanner(TensorPlannerBase):
+    def __init__(
+        self,
+        env: MDPEnv,
+        planning_horizon: int,
+        optim_steps: int,
+        num_candidates: int,
+        top_k: int,
+        noise_beta: float = 2.0,
+        keep_elite_frac: float = 0.3,
+        population_decay: float = 1.25,
+        alpha: float = 0.1,
+        warm_start: bool = True,
+        compact_rollout: bool = False,
+        action_key: str = "action",
+    ):
+        """Improved cross entropy method planner.
+
+        Compared to CEM, the action perturbations are temporally correlated colored noise, a fraction of
+        the elites of an iteration is carried over to the candidates of the next one, and the number of
+        candidates shrinks every iteration. The elites kept by the last iteration are also shifted by one
+        step and carried over to the first iteration of the next planning call.
+
+        Args:
+            env (MDPEnv): the model-based environment.
+            planning_horizon (int): the length of the planned action sequences.
+            optim_steps (int): the number of iCEM iterations per planning call.
+            num_candidates (int): the number of sampled action sequences in the first iteration.
+            top_k (int): the number of elite sequences used to refit the sampling distribution.
+            noise_beta (float, optional): the exponent of the colored noise, 0 for white noise. Defaults to 2.0.
+            keep_elite_frac (float, optional): the fraction of elites carried over to the next iteration, at
+                least one elite unless it is 0. Defaults to 0.3.
+            population_decay (float, optional): the factor dividing the number of candidates every iteration.
+                Defaults to 1.25.
+            alpha (float, optional): the weight of the old distribution in the refit. Defaults to 0.1.
+            warm_start (bool, optional): whether to carry the shifted elites over to the next planning call.
+                The elites of the batch elements starting an episode (see ``episode_start``) are replaced by
+                the initial action means. Defaults to True.
+            compact_rollout (bool, optional): whether to drop done sequences from the working batch of the
+                rollouts. Defaults to False.
+            action_key (str, optional): the action key. Defaults to "action".
+        """
+        super().__init__(
+            env=env,
+            planning_horizon=planning_horizon,
+            optim_steps=optim_steps,
+            num_candidates=num_candidates,
+            compact_rollout=compact_rollout,
+            action_key=action_key,
+        )
+        self.top_k = top_k
+        self.noise_beta = noise_beta
+        if not 0.0 <= keep_elite_frac <= 1.0:
+            raise ValueError(
+                "keep_elite_frac should be in [0, 1], got {}".format(
+                    keep_elite_frac
+                )
+            )
+        self.keep_elite_num = (
+            max(1, int(keep_elite_frac * top_k)) if keep_elite_frac > 0 else 0
+        )
+        self.population_decay = population_decay
+        self.alpha = alpha
+        self.warm_start = warm_start
+        self._last_elites = None
+
+    def reset(self):
+        """Drops the elites kept for warm starting."""
+        self._last_elites = None
+
+    def init_elites(self, tensordict: TensorDictBase, action_means):
+        """Gets the elites of the previous planning call shifted by one step, or None."""
+        last_elites = self._last_elites
+        if (
+            not self.warm_start
+            or last_elites is None
+            or last_elites.shape[: len(tensordict.batch_size)]
+            != tensordict.batch_size
+        ):
+            return None
+
+        # receding horizon: drop the executed step, pad with the initial mean
+        elites = torch.empty_like(last_elites)
+        elites[..., :-1, :] = last_elites[..., 1:, :]
+        elites[..., -1:, :] = action_means[..., -1:, :]
+
+        start = episode_start(tensordict)
+        if start is not None:
+            start = start.reshape(*tensordict.batch_size, 1, 1, 1)
+            elites = torch.where(start, action_means, elites)
+        return elites
+
+    def get_num_candidates(self, step: int) -> int:
+        num_candidates = int(
+            self.num_candidates * self.population_decay ** (-step)
+        )
+        return max(num_candidates, 2 * self.top_k)
+
+    @torch.no_grad()
+    def planning(self, tensordict: TensorDictBase) -> torch.Tensor:
+        batch_size = tensordict.batch_size
+        action_means = self.init_action_means(tensordict)
+        action_stds = torch.ones_like(action_means)
+        K_DIM = len(self.action_spec.shape) - 4
+
+        kept_elites = self.init_elites(tensordict, action_means)
+        for step in range(self.optim_steps):
+            action_shape = self.action_sequence_shape(
+                batch_size, self.get_num_candidates(step)
+            )
+            actions = colored_noise(
+                action_shape,
+                self.noise_beta,
+                time_dim=-2,
+                device=action_means.device,
+                dtype=action_means.dtype,
+            )
+            actions.mul_(action_stds).add_(action_means)
+            if kept_elites is not None:
+                actions = torch.cat([actions, kept_elites], dim=K_DIM)
+            project_actions_(self.env.action_spec, actions)
+
+            sum_rewards = self.evaluate(tensordict, actions)
+            _, top_k = sum_rewards.topk(self.top_k, dim=-2)
+            top_k = top_k.unsqueeze(-1).expand(
+                self.action_sequence_shape(batch_size, self.top_k)
+            )
+            best_actions = actions.gather(K_DIM, top_k)
+            # topk is sorted, so the carried over elites are the best ones
+            kept_elites = best_actions[..., : self.keep_elite_num, :, :]
+
+            action_means.mul_(self.alpha).add_(
+                best_actions.mean(dim=K_DIM, keepdim=True),
+                alpha=1 - self.alpha,
+            )
+            action_stds.mul_(self.alpha).add_(
+                best_actions.std(dim=K_DIM, keepdim=True),
+                alpha=1 - self.alpha,
+            )
+        self._last_elites = kept_elites
+        return action_means[..., 0, 0, :]
@@ -0,0 +1,69 @@
+import torch
+from tensordict.tensordict import TensorDictBase
+
+from intact.envs.mdp_env import MDPEnv
+from intact.modules.planners.base import TensorPlannerBase
+from intact.modules.planners.rollout import project_actions_
+
+
+class MPPIPlanner(TensorPlannerBase):
+    def __init__(
+        self,
+        env: MDPEnv,
+        planning_horizon: int,
+        optim_steps: int,
+        num_candidates: int,
+        temperature: float = 1.0,
+        noise_std: float = 1.0,
+        compact_rollout: bool = False,
+        action_key: str = "action",
+    ):
+        """Model predictive path integral planner.
+
+        Every candidate contributes to the new action means with weight softmax(return / temperature),
+        instead of only a top-k subset as in CEM.
+
+        Args:
+            env (MDPEnv): the model-based environment.
+            planning_horizon (int): the length of the planned action sequences.
+            optim_steps (int): the number of MPPI iterations per planning call.
+            num_candidates (int): the number of sampled action sequences per iteration.
+            temperature (float, optional): the temperature of the importance weights. Defaults to 1.0.
+            noise_std (float, optional): the std of the action perturbations. Defaults to 1.0.
+            compact_rollout (bool, optional): whether to drop done sequences from the working batch of the
+                rollouts. Defaults to False.
+            action_key (str, optional): the action key. Defaults to "action".
+        """
+        super().__init__(
+            env=env,
+            planning_horizon=planning_horizon,
+            optim_steps=optim_steps,
+            num_candidates=num_candidates,
+            compact_rollout=compact_rollout,
+            action_key=action_key,
+        )
+        self.temperature = temperature
+        self.noise_std = noise_std
+
+    @torch.no_grad()
+    def planning(self, tensordict: TensorDictBase) -> torch.Tensor:
+        action_means = self.init_action_means(tensordict)
+        action_shape = self.action_sequence_shape(
+            tensordict.batch_size, self.num_candidates
+        )
+        actions = torch.empty(
+            action_shape, device=action_means.device, dtype=action_means.dtype
+        )
+        K_DIM = len(self.action_spec.shape) - 4
+
+        for _ in range(self.optim_steps):
+            torch.randn(action_shape, out=actions)
+            actions.mul_(self.noise_std).add_(action_means)
+            project_actions_(self.env.action_spec, actions)
+
+            sum_rewards = self.evaluate(tensordict, actions)
+            weights = torch.softmax(sum_rewards / self.temperature, dim=-2)
+            action_means = (weights.unsqueeze(-1) * actions).sum(
+                dim=K_DIM, keepdim=True
+            )
+        return action_means[..., 0, 0, :]
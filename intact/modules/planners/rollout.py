@@ -0,0 +1,102 @@
+from typing import Optional
+
+import torch
+
+from intact.envs.mdp_env import MDPEnv
+
+
+def project_actions_(action_spec, actions: torch.Tensor) -> torch.Tensor:
+    """Projects the actions onto the action spec in place, so a preallocated buffer is kept.
+
+    Bounded specs are clamped into ``actions`` directly, other specs write their projection back.
+
+    Args:
+        action_spec (TensorSpec): the action spec.
+        actions (torch.Tensor): the actions, with the action dim last.
+
+    Returns:
+        torch.Tensor: ``actions``, projected.
+    """
+    space = getattr(action_spec, "space", None)
+    if hasattr(space, "low") and hasattr(space, "high"):
+        return torch.clamp(
+            actions,
+            space.low.to(actions.device),
+            space.high.to(actions.device),
+            out=actions,
+        )
+    projected = action_spec.project(actions)
+    if projected is not actions:
+        actions.copy_(projected)
+    return actions
+
+
+def truncated_return(
+    env: MDPEnv,
+    observation: torch.Tensor,
+    actions: torch.Tensor,
+    idx: Optional[torch.Tensor] = None,
+    compact: bool = False,
+) -> torch.Tensor:
+    """Sums the model rewards of candidate action sequences, ignoring rewards after the first done.
+
+    The model is stepped through ``MDPEnv.model_step`` on flat tensors, so no tensordict is built
+    along the rollout. Gradients flow to ``actions`` unless called under ``torch.no_grad``.
+
+    Args:
+        env (MDPEnv): the model-based environment.
+        observation (torch.Tensor): the start observations, with shape (*batch_size, obs_dim).
+        actions (torch.Tensor): the candidate action sequences, with shape
+            (*batch_size, num_candidates, planning_horizon, action_dim).
+        idx (torch.Tensor, optional): the task indices, with shape (*batch_size, 1). Defaults to None.
+        compact (bool, optional): whether to drop done sequences from the working batch, instead of
+            stepping them until every sequence is done. Defaults to False.
+
+    Returns:
+        torch.Tensor: the returns, with shape (*batch_size, num_candidates, 1).
+    """
+    *candidate_shape, planning_horizon, action_dim = actions.shape
+    flat_num = torch.Size(candidate_shape).numel()
+
+    observation = observation.unsqueeze(-2).expand(
+        *candidate_shape, observation.shape[-1]
+    )
+    observation = observation.reshape(flat_num, -1)
+    if idx is not None:
+        idx = idx.unsqueeze(-2).expand(*candidate_shape, 1).reshape(-1, 1)
+    # horizon-major, so every step reads a contiguous slice
+    actions = actions.reshape(flat_num, planning_horizon, action_dim)
+    actions = actions.transpose(0, 1).contiguous()
+
+    returns = observation.new_zeros(flat_num, 1)
+    if compact:
+        # indices of the sequences that are not done yet
+        active_idx = torch.arange(flat_num, device=observation.device)
+        for t in range(planning_horizon):
+            observation, reward, terminated = env.model_step(
+                observation, actions[t, active_idx], idx
+            )
+            returns.index_add_(0, active_idx, reward)
+
+            not_done = ~terminated.reshape(-1)
+            if not not_done.any():
+                break
+            observation = observation[not_done]
+            active_idx = active_idx[not_done]
+            if idx is not None:
+                idx = idx[not_done]
+        return returns.reshape(*candidate_shape, 1)
+
+    alive = torch.ones(
+        flat_num, 1, dtype=torch.bool, device=observation.device
+    )
+    for t in range(planning_horizon):
+        observation, reward, terminated = env.model_step(
+            observation, actions[t], idx
+        )
+        returns.add_(reward * alive)
+        alive = alive & ~terminated
+        if not alive.any():
+            break
+
+    return returns.reshape(*candidate_shape, 1)
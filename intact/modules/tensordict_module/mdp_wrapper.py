@@ -1,3 +1,5 @@
+from contextlib import nullcontext
+
 from tensordict import TensorDictBase
 from tensordict.nn import TensorDictModule
 
@@ -44,6 +46,10 @@ class MDPWrapper(TensorDictModule):
         assert isinstance(self.module, BaseWorldModel)
         return self.module
 
+    @property
+    def ensemble_size(self):
+        return self.world_model.ensemble_size
+
     def get_parameter(self, key):
         return self.world_model.get_parameter(key)
 
@@ -61,7 +67,45 @@ class MDPWrapper(TensorDictModule):
     def reset(self, task_num=None):
         self.world_model.reset(task_num)
 
-    def parallel_forward(self, tensordict, sampling_times=50):
+    def context_scope(self, tensordict):
+        """Encodes the contexts from the transitions of ``tensordict`` for the scope, if they are amortized."""
+        if not self.world_model.amortized_context or (
+            ("next", "observation") not in tensordict.keys(include_nested=True)
+        ):
+            return nullcontext()
+        return self.context_model.encoding(
+            tensordict.get("observation"),
+            tensordict.get("action"),
+            tensordict.get(("next", "observation")),
+            tensordict.get(("next", "reward")),
+            tensordict.get("idx"),
+            mask=tensordict.get(("collector", "mask"), None),
+        )
+
+    def infer_context(
+        self, tensordict, newton_steps=1, prior_precision=1.0, **kwargs
+    ):
+        """Refines the contexts from a batch of transitions with ``world_model.infer_context``.
+
+        Calling it on every newly collected batch refines the contexts incrementally. The masks of a
+        causal world model are deterministic unless ``deterministic_mask=False`` is given.
+        """
+        if self.model_type == "causal":
+            kwargs.setdefault("deterministic_mask", True)
+        return self.world_model.infer_context(
+            tensordict.get("observation"),
+            tensordict.get("action"),
+            tensordict.get("idx"),
+            tensordict.get(("next", "observation")),
+            tensordict.get(("next", "reward")),
+            newton_steps=newton_steps,
+            prior_precision=prior_precision,
+            **kwargs,
+        )
+
+    def parallel_forward(
+        self, tensordict, sampling_times=50, sampling_mode="iid"
+    ):
         assert (
             self.model_type == "causal"
         ), "causal_mask is only available for CausalWorldModel"
@@ -72,13 +116,20 @@ class MDPWrapper(TensorDictModule):
         assert len(tensordict.batch_size) == 1, "batch_size should be 1-d"
         batch_size = tensordict.batch_size[0]
 
-        repeat_tensordict = tensordict.expand(
-            sampling_times, batch_size
-        ).reshape(-1)
-        out_tensordict = self.forward(
-            repeat_tensordict, deterministic_mask=False
+        tensors = tuple(
+            tensordict.get(in_key, None) for in_key in self.in_keys
+        )
+        with self.context_scope(tensordict):
+            tensors = self.world_model.sampling_forward(
+                *tensors,
+                sampling_times=sampling_times,
+                sampling_mode=sampling_mode,
+            )
+        # the inputs are shared by all samples, expand them without copying
+        expanded_tensordict = tensordict.expand(sampling_times, batch_size)
+        out_tensordict = self._write_to_tensordict(
+            expanded_tensordict, tensors
         )
-        out_tensordict = out_tensordict.reshape(sampling_times, batch_size)
 
         return out_tensordict
 
@@ -105,6 +156,7 @@ class MDPWrapper(TensorDictModule):
         tensors = tuple(
             tensordict.get(in_key, None) for in_key in self.in_keys
         )
-        tensors = self.world_model(*tensors, **kwargs)
+        with self.context_scope(tensordict):
+            tensors = self.world_model(*tensors, **kwargs)
         tensordict_out = self._write_to_tensordict(tensordict, tensors)
         return tensordict_out
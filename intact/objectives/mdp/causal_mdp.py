@@ -1,3 +1,5 @@
+import warnings
+
 import torch
 import torch.nn.functional as F
 from tensordict import TensorDict
@@ -14,10 +16,17 @@ class CausalWorldModelLoss(LossModule):
         lambda_reward: float = 1.0,
         lambda_terminated: float = 1.0,
         lambda_mutual_info: float = 0.0,  # use for envs identify
+        mutual_info_anchors: int = None,
+        mutual_info_chunk_size: int = None,
         sparse_weight: float = 0.05,
         context_sparse_weight: float = 0.01,
         context_max_weight: float = 0.1,
         sampling_times: int = 50,
+        mask_sampling_mode: str = "iid",
+        mask_grad_estimator: str = "difference",
+        teacher_forcing: bool = False,
+        loss_mask_mode: str = "gather",
+        bootstrap: bool = False,
     ):
         super().__init__()
         self.world_model = world_model
@@ -35,55 +44,140 @@ class CausalWorldModelLoss(LossModule):
         self.lambda_reward = lambda_reward
         self.lambda_terminated = lambda_terminated
         self.lambda_mutual_info = lambda_mutual_info
+        if (
+            lambda_mutual_info > 0
+            and world_model.world_model.amortized_context
+        ):
+            # the loss looks up the contexts out of the scope of ``encoding``
+            warnings.warn(
+                "lambda_mutual_info has no effect with amortized contexts, "
+                "the mutual info loss has no gradient to the encoder"
+            )
+        self.mutual_info_anchors = mutual_info_anchors
+        self.mutual_info_chunk_size = mutual_info_chunk_size
         self.sparse_weight = sparse_weight
         self.context_sparse_weight = context_sparse_weight
         self.context_max_weight = context_max_weight
         self.sampling_times = sampling_times
+        self.mask_sampling_mode = mask_sampling_mode
+        self.mask_grad_estimator = mask_grad_estimator
+        self.teacher_forcing = teacher_forcing
+        self.loss_mask_mode = loss_mask_mode
+        self.bootstrap = bootstrap
 
-    def loss(self, tensordict, reduction="none"):
-        mask = tensordict.get(("collector", "mask")).clone()
+    def loss(
+        self,
+        tensordict,
+        reduction="none",
+        return_loss_td=True,
+        bootstrap=False,
+    ):
+        mask = tensordict.get(("collector", "mask"))
+        if self.loss_mask_mode == "gather":
+            mask = mask.clone()
+
+            def get(key):
+                return tensordict.get(key)[mask]
+
+        elif self.loss_mask_mode == "weight":
+            # keep the padded layout and zero out padded steps afterwards
+            get = tensordict.get
+        else:
+            raise NotImplementedError(
+                f"loss_mask_mode {self.loss_mask_mode} is not supported"
+            )
+
+        ensemble = self.world_model.ensemble_size > 0
+
+        def get_target(key, pred):
+            target = get(key).to(pred.dtype)
+            if ensemble:
+                # ensemble members share the batch, so share the targets too
+                target = target.unsqueeze(-2).expand_as(pred)
+            return target
+
+        obs_mean = get("obs_mean")
+        reward_mean = get("reward_mean")
+        terminated = get("terminated")
+        next_obs = get_target(("next", "observation"), obs_mean)
+        next_reward = get_target(("next", "reward"), reward_mean)
+        next_terminated = get_target(("next", "terminated"), terminated)
 
         if self.learn_obs_var:
             transition_loss = F.gaussian_nll_loss(
-                tensordict.get("obs_mean")[mask],
-                tensordict.get(("next", "observation"))[mask],
-                torch.exp(tensordict.get("obs_log_var"))[mask],
+                obs_mean,
+                next_obs,
+                torch.exp(get("obs_log_var")),
                 reduction=reduction,
             )
         else:
             transition_loss = F.mse_loss(
-                tensordict.get("obs_mean")[mask],
-                tensordict.get(("next", "observation"))[mask],
+                obs_mean,
+                next_obs,
                 reduction=reduction,
             )
 
         if self.learn_obs_var:
             reward_loss = F.gaussian_nll_loss(
-                tensordict.get("reward_mean")[mask],
-                tensordict.get(("next", "reward"))[mask],
-                torch.exp(tensordict.get("reward_log_var"))[mask],
+                reward_mean,
+                next_reward,
+                torch.exp(get("reward_log_var")),
                 reduction=reduction,
             )
         else:
             reward_loss = F.mse_loss(
-                tensordict.get("reward_mean")[mask],
-                tensordict.get(("next", "reward"))[mask],
+                reward_mean,
+                next_reward,
                 reduction=reduction,
             )
         terminated_loss = F.binary_cross_entropy_with_logits(
-            tensordict.get("terminated")[mask],
-            tensordict.get(("next", "terminated"))[mask].float(),
+            terminated,
+            next_terminated,
             reduction=reduction,
         )
 
-        loss_td = TensorDict(
-            {
-                "transition_loss": transition_loss.clone(),
-                "reward_loss": reward_loss.clone(),
-                "terminated_loss": terminated_loss.clone(),
-            },
-            batch_size=transition_loss.shape[0],
-        )
+        if ensemble and bootstrap:
+            # online bootstrap: every member sees every transition a
+            # poisson(1) number of times, so the members fit different
+            # resamples of the batch
+            bootstrap_weight = torch.poisson(
+                torch.ones_like(transition_loss[..., :1])
+            )
+            transition_loss = transition_loss * bootstrap_weight
+            reward_loss = reward_loss * bootstrap_weight
+            terminated_loss = terminated_loss * bootstrap_weight
+
+        if ensemble:
+            transition_loss = transition_loss.mean(-2)
+            reward_loss = reward_loss.mean(-2)
+            terminated_loss = terminated_loss.mean(-2)
+
+        if self.loss_mask_mode == "weight":
+            weight = mask.unsqueeze(-1).to(transition_loss.dtype)
+            transition_loss = transition_loss * weight
+            reward_loss = reward_loss * weight
+            terminated_loss = terminated_loss * weight
+
+        if not return_loss_td:
+            loss_td = None
+        elif self.loss_mask_mode == "weight":
+            loss_td = TensorDict(
+                {
+                    "transition_loss": transition_loss,
+                    "reward_loss": reward_loss,
+                    "terminated_loss": terminated_loss,
+                },
+                batch_size=transition_loss.shape[:-1],
+            )
+        else:
+            loss_td = TensorDict(
+                {
+                    "transition_loss": transition_loss.clone(),
+                    "reward_loss": reward_loss.clone(),
+                    "terminated_loss": terminated_loss.clone(),
+                },
+                batch_size=transition_loss.shape[0],
+            )
 
         loss_tensor = torch.cat(
             [
@@ -91,7 +185,7 @@ class CausalWorldModelLoss(LossModule):
                 reward_loss * self.lambda_reward,
                 terminated_loss * self.lambda_terminated,
             ],
-            dim=1,
+            dim=-1,
         )
 
         return loss_td, loss_tensor
@@ -102,34 +196,56 @@ class CausalWorldModelLoss(LossModule):
         tensordict = tensordict.clone(recurse=False)
         assert len(tensordict.shape) == 2
 
-        tensordict_out = []
         *batch, time_steps = tensordict.shape
+        if self.model_type == "causal":
+            model_kwargs = dict(deterministic_mask=deterministic_mask)
+        else:
+            model_kwargs = {}
 
+        if self.teacher_forcing or time_steps == 1:
+            # no step depends on a previous prediction, evaluate all steps in one batched call
+            return self.world_model(tensordict, **model_kwargs)
+
+        out_keys = ["observation", *self.world_model.out_keys]
+        buffers = None
+        obs_mean = None
         for t in range(time_steps):
             _tensordict = tensordict[..., t]
             if t > 0:
-                _tensordict["observation"] = tensordict_out[-1][
-                    "obs_mean"
-                ].clone()
+                _tensordict.set("observation", obs_mean)
 
-            if self.model_type == "causal":
-                _tensordict = self.world_model(
-                    _tensordict, deterministic_mask=deterministic_mask
-                )
-            else:
-                _tensordict = self.world_model(_tensordict)
+            _tensordict = self.world_model(_tensordict, **model_kwargs)
+            obs_mean = _tensordict.get("obs_mean")
+            if self.world_model.ensemble_size > 0:
+                # feed the members' mean prediction back
+                obs_mean = obs_mean.mean(-2)
 
-            tensordict_out.append(_tensordict)
-        return torch.stack(
-            tensordict_out, tensordict.ndimension() - 1
-        ).contiguous()
+            if buffers is None:
+                buffers = {}
+                for key in out_keys:
+                    value = _tensordict.get(key)
+                    buffers[key] = value.new_empty(
+                        *batch, time_steps, *value.shape[len(batch) :]
+                    )
+            for key in out_keys:
+                buffers[key][:, t] = _tensordict.get(key)
+
+        for key in out_keys:
+            tensordict.set(key, buffers[key])
+        return tensordict
 
     def forward(
-        self, tensordict: TensorDict, deterministic_mask=False, only_train=None
+        self,
+        tensordict: TensorDict,
+        deterministic_mask=False,
+        only_train=None,
+        return_loss_td=True,
     ):
-        tensordict = self.rollout_forward(tensordict)
+        tensordict = self.rollout_forward(tensordict, deterministic_mask)
 
-        loss_td, loss_tensor = self.loss(tensordict)
+        loss_td, loss_tensor = self.loss(
+            tensordict, return_loss_td=return_loss_td, bootstrap=self.bootstrap
+        )
         if self.lambda_mutual_info > 0:
             if self.model_type == "causal":
                 valid_context_idx = self.causal_mask.valid_context_idx
@@ -141,8 +257,15 @@ class CausalWorldModelLoss(LossModule):
                 idx=tensordict["idx"],
                 valid_context_idx=valid_context_idx,
                 reduction="none",
-            ).reshape(-1, 1)
-            loss_td.set("mutual_info_loss", mutual_info_loss)
+                num_anchors=self.mutual_info_anchors,
+                chunk_size=self.mutual_info_chunk_size,
+            ).reshape(*loss_tensor.shape[:-1], 1)
+            if self.loss_mask_mode == "weight":
+                mutual_info_loss = mutual_info_loss * tensordict.get(
+                    ("collector", "mask")
+                ).unsqueeze(-1)
+            if return_loss_td:
+                loss_td.set("mutual_info_loss", mutual_info_loss)
             loss_tensor = torch.cat(
                 [loss_tensor, mutual_info_loss * self.lambda_mutual_info],
                 dim=-1,
@@ -153,7 +276,8 @@ class CausalWorldModelLoss(LossModule):
 
             gt_context = self.context_model(tensordict["idx"])
             context_loss = 0.5 * (tensordict["inv_context"] - gt_context) ** 2
-            loss_td.set("context_loss", context_loss)
+            if return_loss_td:
+                loss_td.set("context_loss", context_loss)
             # TODO: cat loss_tensor
 
         if only_train is not None and self.model_type == "causal":
@@ -161,7 +285,14 @@ class CausalWorldModelLoss(LossModule):
             not_train[only_train] = False
             loss_tensor[..., not_train] = 0
 
-        total_loss = loss_tensor.mean()
+        if self.loss_mask_mode == "weight":
+            # mean over valid steps only, padded entries are already zero
+            valid_num = tensordict.get(("collector", "mask")).sum()
+            total_loss = loss_tensor.sum() / (
+                valid_num.clamp(min=1) * loss_tensor.shape[-1]
+            )
+        else:
+            total_loss = loss_tensor.mean()
         if self.model_type == "causal" and not self.using_reinforce:
             total_loss += (
                 torch.sigmoid(self.causal_mask.observed_logits).sum()
@@ -180,7 +311,9 @@ class CausalWorldModelLoss(LossModule):
                 )
         return loss_td, total_loss
 
-    def reinforce_forward(self, tensordict: TensorDict, only_train=None):
+    def reinforce_forward(
+        self, tensordict: TensorDict, only_train=None, return_variance=False
+    ):
         assert (
             self.model_type == "causal"
         ), "reinforce is only available for CausalWorldModel"
@@ -194,25 +327,32 @@ class CausalWorldModelLoss(LossModule):
 
         with torch.no_grad():
             tensordict = self.world_model.parallel_forward(
-                tensordict, self.sampling_times
+                tensordict,
+                self.sampling_times,
+                sampling_mode=self.mask_sampling_mode,
             )
             _, loss_tensor = self.loss(
-                tensordict.reshape(-1), reduction="none"
+                tensordict, reduction="none", return_loss_td=False
             )
 
             sampling_loss = loss_tensor.reshape(*tensordict.batch_size, -1)
 
-            mask_grad = self.causal_mask.total_mask_grad(
+            mask_grad, mask_grad_var = self.causal_mask.total_mask_grad(
                 sampling_mask=tensordict.get("causal_mask"),
                 sampling_loss=sampling_loss,
                 sparse_weight=self.sparse_weight,
                 context_sparse_weight=self.context_sparse_weight,
                 context_max_weight=self.context_max_weight,
+                estimator=self.mask_grad_estimator,
+                return_variance=True,
             )
 
         if only_train is not None:
             not_train = torch.ones(mask_grad.shape[0]).to(bool)
             not_train[only_train] = False
             mask_grad[not_train] = 0
+            mask_grad_var[not_train] = 0
 
+        if return_variance:
+            return mask_grad, mask_grad_var
         return mask_grad
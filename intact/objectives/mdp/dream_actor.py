@@ -26,6 +26,7 @@ from torchrl.objectives.value import (
 )
 
 from intact.envs.mdp_env import MDPEnv
+from intact.envs.rollout import compacted_rollout
 
 
 class DreamActorLoss(LossModule):
@@ -52,6 +53,7 @@ class DreamActorLoss(LossModule):
         gamma: int = None,
         lmbda: int = None,
         lambda_entropy: float = 3e-4,
+        compact_rollout: bool = False,
     ):
         super().__init__()
         self.actor_model = actor_model
@@ -61,6 +63,9 @@ class DreamActorLoss(LossModule):
         self.discount_loss = discount_loss
         self.pred_continue = pred_continue
         self.lambda_entropy = lambda_entropy
+        # drop done rows from the imagination batch, their later steps are
+        # zero-filled, terminated and masked out of the actor and critic losses
+        self.compact_rollout = compact_rollout
 
         if gamma is not None:
             warnings.warn(
@@ -79,20 +84,29 @@ class DreamActorLoss(LossModule):
                 value=self._tensor_keys.value,
             )
 
+    def imagination_step(self, tensordict, *args):
+        tensordict = self.actor_model(tensordict)
+        tensordict = self.model_based_env.step(tensordict)
+
+        entropy = 0.5 * torch.log(
+            2 * math.pi * math.e * tensordict["scale"] ** 2
+        )
+        tensordict.set("entropy", entropy)
+        return tensordict
+
     def rollout(self, tensordict):
+        if self.compact_rollout:
+            return compacted_rollout(
+                self.imagination_step, tensordict, self.imagination_horizon
+            )
+
         tensordicts = []
         ever_done = torch.zeros(*tensordict.batch_size, 1, dtype=bool).to(
             tensordict.device
         )
         for i in range(self.imagination_horizon):
-            tensordict = self.actor_model(tensordict)
-            tensordict = self.model_based_env.step(tensordict)
+            tensordict = self.imagination_step(tensordict)
             next_tensordict = step_mdp(tensordict, exclude_action=False)
-
-            entropy = 0.5 * torch.log(
-                2 * math.pi * math.e * tensordict["scale"] ** 2
-            )
-            tensordict.set("entropy", entropy)
             tensordicts.append(tensordict)
 
             ever_done |= tensordict.get(("next", "done"))
@@ -134,6 +148,9 @@ class DreamActorLoss(LossModule):
         actor_target = lambda_target + self.lambda_entropy * fake_data.get(
             "entropy"
         )
+        # the steps filled after done by the compacted rollout are not simulated
+        valid = fake_data.get(("collector", "mask")).unsqueeze(-1)
+        actor_target = actor_target * valid
 
         if self.discount_loss:
             gamma = self.value_estimator.gamma.to(tensordict.device)
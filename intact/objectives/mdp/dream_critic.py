@@ -70,6 +70,10 @@ class DreamCriticLoss(LossModule):
             discount = fake_data.get("discount")
         else:
             discount = torch.ones_like(lambda_target).to(fake_data.device)
+        valid = fake_data.get(("collector", "mask"), None)
+        if valid is not None:
+            # leave out the steps filled after done by the compacted rollout
+            discount = discount * valid.unsqueeze(-1)
 
         # tensordict_select = fake_data.select(*self.value_model.in_keys)
         self.value_model(fake_data)
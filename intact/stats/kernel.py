@@ -31,6 +31,17 @@ class Kernel(abc.ABC, nn.Module):
     def sample(self, train_Xs):
         """Generates samples from the kernel distribution."""
 
+    def joint_and_marginals(self, test_Xs, train_Xs):
+        """Computes log p(x) and log p(x_i) of every dim i for each x in test_Xs given train_Xs.
+
+        The difference tensor is shared by the joint and all marginals.
+        """
+        raise NotImplementedError(
+            "{} does not support batched marginals".format(
+                self.__class__.__name__
+            )
+        )
+
 
 class ParzenWindowKernel(Kernel):
     """Implementation of the Parzen window kernel."""
@@ -43,6 +54,16 @@ class ParzenWindowKernel(Kernel):
         coef = 1 / self.bandwidth**dim
         return torch.log((coef * inside).mean(dim=1))
 
+    def joint_and_marginals(self, test_Xs, train_Xs):
+        abs_diffs = torch.abs(self._diffs(test_Xs, train_Xs))
+        inside = abs_diffs / self.bandwidth <= 0.5
+        dim = test_Xs.shape[-1]
+        joint = torch.log(
+            inside.all(dim=-1).float().mean(dim=1) / self.bandwidth**dim
+        )
+        marginals = torch.log(inside.float().mean(dim=1) / self.bandwidth)
+        return joint, marginals
+
     @torch.no_grad()
     def sample(self, train_Xs):
         device = train_Xs.device
@@ -64,6 +85,17 @@ class GaussianKernel(Kernel):
 
         return torch.logsumexp(log_exp - Z, dim=-1)
 
+    def joint_and_marginals(self, test_Xs, train_Xs):
+        n, d = train_Xs.shape
+        # the normalizer of a single dim, without the number of samples
+        Z = 0.5 * np.log(2 * np.pi) + np.log(self.bandwidth)
+        diffs = self._diffs(test_Xs, train_Xs) / self.bandwidth
+        log_exp = -0.5 * diffs**2
+
+        joint = torch.logsumexp(log_exp.sum(dim=-1), dim=-1) - d * Z
+        marginals = torch.logsumexp(log_exp, dim=1) - Z
+        return joint - np.log(n), marginals - np.log(n)
+
     @torch.no_grad()
     def sample(self, train_Xs):
         device = train_Xs.device
@@ -1,42 +1,209 @@
 import numpy as np
-from causallearn.utils.KCI.KCI import KCI_UInd
+import torch
+from causallearn.utils.KCI.GaussianKernel import GaussianKernel
+from scipy.linalg import cho_factor, cho_solve
 from scipy.optimize import linear_sum_assignment
-from scipy.stats import spearmanr
-from sklearn.kernel_ridge import KernelRidge
-from sklearn.metrics import r2_score
+from scipy.stats import gamma as gamma_distribution
+from scipy.stats import spearmanr, zscore
 
 
-def kernel_independence_test(x, y):
-    x_dim, y_dim = x.shape[1], y.shape[1]
+def _landmarks(x, num_landmarks):
+    if num_landmarks is None or num_landmarks >= x.shape[0]:
+        return None
+    return np.random.permutation(x.shape[0])[:num_landmarks]
 
-    ci_test = KCI_UInd(approx=False)
 
-    result_matrix = np.zeros((x_dim, y_dim))
-    for i in range(x_dim):
-        for j in range(y_dim):
-            p_value, test_stat = ci_test.compute_pvalue(
-                x[:, i : i + 1], y[:, j : j + 1]
+def _inv_sqrt(matrix, thresh=1e-8):
+    eigvals, eigvecs = np.linalg.eigh(matrix)
+    keep = eigvals > eigvals.max() * thresh
+    return eigvecs[:, keep] / np.sqrt(eigvals[keep])
+
+
+def _nystrom_features(kernel, x, landmarks):
+    """Gets features whose inner products approximate the gram matrix of ``x``, with shape (n, <=m)."""
+    z = x[landmarks]
+    return kernel(x, z) @ _inv_sqrt(kernel(z, z))
+
+
+def _hsic_grams(x, landmarks=None):
+    """Gets the centered gaussian gram matrix of every column of ``x`` as KCI_UInd builds it.
+
+    Returns a stack with shape (dim, n, n), or the stacked nystrom features with shape (dim, n, m) if
+    ``landmarks`` is given.
+    """
+    x = zscore(x, ddof=1, axis=0)
+    x[np.isnan(x)] = 0.0  # in case some dim of x is constant
+
+    grams = []
+    for i in range(x.shape[1]):
+        kernel = GaussianKernel()
+        kernel.set_width_empirical_hsic(x[:, i : i + 1])
+        if landmarks is None:
+            gram = kernel.kernel(x[:, i : i + 1])
+            col_sums = gram.sum(axis=0)
+            gram = (
+                gram
+                - (col_sums[None, :] + col_sums[:, None]) / gram.shape[0]
+                + col_sums.sum() / gram.shape[0] ** 2
+            )
+        else:
+            gram = _nystrom_features(kernel.kernel, x[:, i : i + 1], landmarks)
+            gram = gram - gram.mean(axis=0)
+        grams.append(gram)
+    if landmarks is not None:
+        # the ranks of the features can differ, pad them with zeros
+        rank = max(gram.shape[1] for gram in grams)
+        grams = [
+            np.pad(gram, ((0, 0), (0, rank - gram.shape[1]))) for gram in grams
+        ]
+    return np.stack(grams)
+
+
+def kernel_independence_test(
+    x, y, approx=False, null_ss=1000, thresh=1e-6, num_landmarks=None
+):
+    """Tests the independence between every column of ``x`` and every column of ``y`` with HSIC.
+
+    Computes the same statistics and p-values as ``KCI_UInd`` on every pair, but the centered gram matrix
+    and the spectrum of every column are computed once and shared by all pairs, and all pairs are
+    evaluated with batched matrix products.
+
+    Args:
+        x (np.ndarray): with shape (n, x_dim).
+        y (np.ndarray): with shape (n, y_dim).
+        approx (bool, optional): whether to use the gamma approximation of the null distribution instead
+            of sampling it from the spectra. Defaults to False.
+        null_ss (int, optional): the number of samples of the null distribution. Defaults to 1000.
+        thresh (float, optional): the relative threshold of the eigenvalue products in the null
+            distribution. Defaults to 1e-6.
+        num_landmarks (int, optional): the number of landmarks of the nystrom approximation of the gram
+            matrices. Defaults to None, for exact gram matrices.
+
+    Returns:
+        np.ndarray: 1 - min(0.05, p_value) * 20 of every pair, with shape (x_dim, y_dim).
+    """
+    n = x.shape[0]
+    landmarks = _landmarks(x, num_landmarks)
+    kx, ky = _hsic_grams(x, landmarks), _hsic_grams(y, landmarks)
+
+    if landmarks is None:
+        test_stat = kx.reshape(kx.shape[0], -1) @ ky.reshape(ky.shape[0], -1).T
+        kx_square = np.einsum("inm,inm->i", kx, kx)
+        ky_square = np.einsum("inm,inm->i", ky, ky)
+        kx_trace = np.einsum("inn->i", kx)
+        ky_trace = np.einsum("inn->i", ky)
+    else:
+        # tr(Kx Ky) = ||Fx^T Fy||^2 for K = F F^T
+        test_stat = np.square(np.einsum("inp,jnq->ijpq", kx, ky)).sum(
+            axis=(-2, -1)
+        )
+        kx_cov = np.einsum("inp,inq->ipq", kx, kx)
+        ky_cov = np.einsum("inp,inq->ipq", ky, ky)
+        kx_square = np.square(kx_cov).sum(axis=(-2, -1))
+        ky_square = np.square(ky_cov).sum(axis=(-2, -1))
+        kx_trace = np.einsum("ipp->i", kx_cov)
+        ky_trace = np.einsum("ipp->i", ky_cov)
+
+    if approx:
+        mean_appr = np.outer(kx_trace, ky_trace) / n
+        var_appr = 2 * np.outer(kx_square, ky_square) / n / n
+        with np.errstate(divide="ignore", invalid="ignore"):
+            p_value = 1 - gamma_distribution.cdf(
+                test_stat, mean_appr**2 / var_appr, 0, var_appr / mean_appr
             )
-            result_matrix[i, j] = 1 - min(0.05, p_value) * 20
-    return result_matrix
+    else:
+        num_eig = int(np.floor(n / 2)) if n > 1000 else n
+        if landmarks is None:
+            lambda_x, lambda_y = np.linalg.eigvalsh(kx), np.linalg.eigvalsh(ky)
+        else:
+            lambda_x = np.linalg.eigvalsh(kx_cov)
+            lambda_y = np.linalg.eigvalsh(ky_cov)
+        lambda_x = -np.sort(-lambda_x, axis=-1)[:, :num_eig]
+        lambda_y = -np.sort(-lambda_y, axis=-1)[:, :num_eig]
+        # a product can only pass the threshold if both factors pass it
+        lambda_x = lambda_x[
+            :, : (lambda_x > lambda_x[:, :1] * thresh).sum(-1).max()
+        ]
+        lambda_y = lambda_y[
+            :, : (lambda_y > lambda_y[:, :1] * thresh).sum(-1).max()
+        ]
+
+        lambda_prod = lambda_x[:, None, :, None] * lambda_y[None, :, None, :]
+        max_prod = lambda_prod.max(axis=(-2, -1), keepdims=True)
+        lambda_prod = np.where(
+            lambda_prod > max_prod * thresh, lambda_prod, 0.0
+        )
+        f_rand = np.random.chisquare(
+            1, (lambda_x.shape[-1], lambda_y.shape[-1], null_ss)
+        )
+        null_dstr = np.einsum("ijab,abs->ijs", lambda_prod, f_rand) / n
+        p_value = (null_dstr > test_stat[..., None]).mean(axis=-1)
+
+    return 1 - np.minimum(0.05, p_value) * 20
+
+
+def _rbf(gamma):
+    def kernel(x, y):
+        return np.exp(
+            -gamma * np.square(x[:, None, :] - y[None, :, :]).sum(-1)
+        )
 
+    return kernel
 
-def kernel_ridge_regression(x, y):
-    x_dim, y_dim = x.shape[1], y.shape[1]
 
-    result_matrix = np.zeros((x_dim, y_dim))
-    for i in range(x_dim):
-        for j in range(y_dim):
-            krr = KernelRidge(alpha=1.0, kernel="rbf", gamma=3.0)
-            krr.fit(x[:, i : i + 1], y[:, j])
-            y_hat = krr.predict(x[:, i : i + 1])
-            r2 = r2_score(y[:, j], y_hat)
+def kernel_ridge_regression(x, y, alpha=1.0, gamma=3.0, num_landmarks=None):
+    """Gets the R2 score of the kernel ridge regression of every column of ``y`` on every column of ``x``.
 
-            result_matrix[i, j] = r2
-    return result_matrix
+    Matches ``KernelRidge(alpha, kernel="rbf", gamma)`` fitted and scored on every pair, but the gram
+    matrix of every column of ``x`` is decomposed once and the regressions of all columns of ``y`` are
+    solved together.
 
+    Args:
+        x (np.ndarray): with shape (n, x_dim).
+        y (np.ndarray): with shape (n, y_dim).
+        alpha (float, optional): the ridge regularization. Defaults to 1.0.
+        gamma (float, optional): the rbf kernel coefficient. Defaults to 3.0.
+        num_landmarks (int, optional): the number of landmarks of the nystrom approximation of the gram
+            matrices. Defaults to None, for exact gram matrices.
 
-def mean_corr_coef(x, y, method="pearson", return_permutation=False):
+    Returns:
+        np.ndarray: the R2 scores, with shape (x_dim, y_dim).
+    """
+    kernel = _rbf(gamma)
+    landmarks = _landmarks(x, num_landmarks)
+
+    y_hat = []
+    for i in range(x.shape[1]):
+        if landmarks is None:
+            # one factorization of K + alpha I solves the regressions of all columns of y
+            gram = kernel(x[:, i : i + 1], x[:, i : i + 1])
+            dual_coef = cho_solve(
+                cho_factor(gram + alpha * np.eye(gram.shape[0])), y
+            )
+            y_hat.append(gram @ dual_coef)
+        else:
+            # with K = F F^T, K (K + alpha I)^-1 = U diag(s^2 / (s^2 + alpha)) U^T for F = U diag(s) V^T
+            features = _nystrom_features(kernel, x[:, i : i + 1], landmarks)
+            u, singular_values, _ = np.linalg.svd(
+                features, full_matrices=False
+            )
+            shrink = singular_values**2 / (singular_values**2 + alpha)
+            y_hat.append(u @ (shrink[:, None] * (u.T @ y)))
+    y_hat = np.stack(y_hat)
+
+    ss_res = np.square(y[None] - y_hat).sum(axis=1)
+    ss_tot = np.square(y - y.mean(axis=0)).sum(axis=0)[None]
+    # r2_score of a constant target is 1 for a perfect fit and 0 otherwise
+    return np.where(
+        ss_tot > 0,
+        1 - ss_res / np.where(ss_tot > 0, ss_tot, 1.0),
+        (ss_res == 0).astype(float),
+    )
+
+
+def mean_corr_coef(
+    x, y, method="pearson", return_permutation=False, num_landmarks=None
+):
     """
     A numpy implementation of the mean correlation coefficient metric.
 
@@ -52,6 +219,9 @@ def mean_corr_coef(x, y, method="pearson", return_permutation=False):
                 'kernel':
                     use KCI
     :param return_permutation: bool, optional
+    :param num_landmarks: int, optional
+            The number of landmarks of the nystrom approximation of the gram matrices
+                for 'kit' and 'krr', None for exact gram matrices
     :return: float
     """
 
@@ -63,9 +233,9 @@ def mean_corr_coef(x, y, method="pearson", return_permutation=False):
         cc = spearmanr(x, y)[0][:d, d:]
         cc = np.abs(cc)
     elif method == "kit":
-        cc = kernel_independence_test(x, y)
+        cc = kernel_independence_test(x, y, num_landmarks=num_landmarks)
     elif method == "krr":
-        cc = kernel_ridge_regression(x, y)
+        cc = kernel_ridge_regression(x, y, num_landmarks=num_landmarks)
     else:
         raise ValueError("not a valid method: {}".format(method))
 
@@ -84,3 +254,82 @@ def mean_corr_coef(x, y, method="pearson", return_permutation=False):
         return score, permutation
     else:
         return score
+
+
+class MCCTracker:
+    def __init__(self, context_gt, method="pearson"):
+        """Tracks the mean correlation coefficient between estimated and true contexts on their device.
+
+        The true contexts are standardized once, so every ``update`` is a single matrix product on the
+        estimated contexts. The assignment is only solved (on cpu) when it is not certified by the
+        correlation matrix itself: when every estimated dim has a distinct best matching true dim, that
+        matching is optimal and is taken directly. Otherwise the optimal assignment is solved with
+        ``linear_sum_assignment``, so the mcc is always the exact one of ``mean_corr_coef``.
+
+        Args:
+            context_gt (torch.Tensor or np.ndarray): the true contexts, with shape (task_num, gt_dim).
+            method (str, optional): "pearson", or "spearman" (with ties broken by order). Defaults to "pearson".
+        """
+        if method not in ["pearson", "spearman"]:
+            raise ValueError("not a valid method: {}".format(method))
+        self.method = method
+        self.context_gt = self.standardize(
+            torch.as_tensor(context_gt, dtype=torch.float32)
+        )
+
+        self.mcc = None
+        self.permutation = None
+        self.solve_num = 0
+
+    def standardize(self, values):
+        if self.method == "spearman":
+            values = values.argsort(dim=0).argsort(dim=0).float()
+        values = values - values.mean(dim=0)
+        # a constant dim gets zero correlations, like the nan_to_num of mean_corr_coef
+        return values / values.norm(dim=0).clamp(min=1e-12)
+
+    def assign(self, cc):
+        transposed = cc.shape[0] > cc.shape[1]
+        if transposed:
+            cc = cc.T
+
+        best = cc.argmax(dim=1).cpu().numpy()
+        if len(np.unique(best)) == len(best):
+            # every row gets its best column, which is an optimal assignment
+            cols = best
+        else:
+            self.solve_num += 1
+            cols = linear_sum_assignment(-1 * cc.cpu().numpy())[1]
+
+        rows = np.arange(len(cols))
+        if transposed:
+            order = np.argsort(cols)
+            return cols[order], rows[order]
+        return rows, cols
+
+    @torch.no_grad()
+    def update(self, context_hat):
+        """Updates the tracked mcc with the estimated contexts, with shape (task_num, hat_dim).
+
+        Returns:
+            torch.Tensor: the mcc, a scalar on the device of the estimated contexts.
+        """
+        context_gt = self.context_gt.to(context_hat.device)
+        self.context_gt = context_gt
+        context_hat = self.standardize(context_hat.detach().float())
+
+        cc = (context_hat.T @ context_gt).abs()
+        if cc.numel() == 0:
+            self.permutation = (
+                np.array([], dtype=int),
+                np.array([], dtype=int),
+            )
+            self.mcc = cc.new_zeros(())
+            return self.mcc
+
+        self.permutation = self.assign(cc)
+        rows, cols = (
+            torch.as_tensor(idx, device=cc.device) for idx in self.permutation
+        )
+        self.mcc = cc[rows, cols].mean()
+        return self.mcc
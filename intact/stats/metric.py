@@ -1,26 +1,68 @@
 import torch
+from torch.utils.checkpoint import checkpoint
 
 from intact.stats.kernel import kernel_classes
 
 
 def mutual_info_estimation(
-    values, bandwidth=1.0, kernel_type="gaussian", reduction="mean"
+    values,
+    bandwidth=1.0,
+    kernel_type="gaussian",
+    reduction="mean",
+    num_anchors=None,
+    chunk_size=None,
 ):
+    """Estimates the mutual information between the dims of ``values`` with kernel density estimation.
+
+    By default the densities of every sample are estimated from all samples, which is quadratic in the
+    batch size. ``num_anchors`` estimates them from a random subset of the samples instead, and
+    ``chunk_size`` bounds the memory by evaluating the samples in chunks. With gradients, every chunk is
+    checkpointed and recomputed in the backward pass, so the memory stays bounded by one chunk instead of
+    keeping the differences of all chunks for the backward pass. The joint and all marginal densities
+    share a single difference tensor.
+
+    Args:
+        values (torch.Tensor): the samples, with shape (batch_size, dim).
+        bandwidth (float, optional): the bandwidth of the kernel. Defaults to 1.0.
+        kernel_type (str, optional): the kernel, "gaussian" or "parzen". Defaults to "gaussian".
+        reduction (str, optional): "mean" or "none". Defaults to "mean".
+        num_anchors (int, optional): the number of samples the densities are estimated from. Defaults to
+            None, for all samples.
+        chunk_size (int, optional): the number of samples evaluated at once. Defaults to None, for all
+            samples.
+
+    Returns:
+        torch.Tensor: the estimated mutual information, a scalar or with shape (batch_size,).
+    """
     # values: batch * dim
     kernel_class = kernel_classes[kernel_type]
 
     kernel = kernel_class(bandwidth=bandwidth)
-    joint_log_pdf = kernel(values, values)
+    anchors = values
+    if num_anchors is not None and num_anchors < values.shape[0]:
+        anchor_idx = torch.randperm(values.shape[0], device=values.device)
+        anchors = values[anchor_idx[:num_anchors]]
 
-    sum_margin_log_pdf = 0
-    for i in range(values.shape[1]):
-        log_pdf = kernel(values[:, i : i + 1], values[:, i : i + 1])
-        sum_margin_log_pdf += log_pdf
+    def chunk_mutual_info(chunk, anchors):
+        joint_log_pdf, margin_log_pdf = kernel.joint_and_marginals(
+            chunk, anchors
+        )
+        return joint_log_pdf - margin_log_pdf.sum(dim=-1)
+
+    chunks = values.split(chunk_size or values.shape[0])
+    if len(chunks) > 1 and torch.is_grad_enabled() and values.requires_grad:
+        mutual_info = [
+            checkpoint(chunk_mutual_info, chunk, anchors, use_reentrant=False)
+            for chunk in chunks
+        ]
+    else:
+        mutual_info = [chunk_mutual_info(chunk, anchors) for chunk in chunks]
+    mutual_info = torch.cat(mutual_info)
 
     if reduction == "mean":
-        return torch.mean(joint_log_pdf - sum_margin_log_pdf)
+        return torch.mean(mutual_info)
     elif reduction == "none":
-        return joint_log_pdf - sum_margin_log_pdf
+        return mutual_info
     else:
         raise NotImplementedError
 
@@ -1,5 +1,10 @@
-from intact.utils.data import match_length
+from intact.utils.data import (
+    match_length,
+    chunk_sequences,
+    SequenceReplayBuffer,
+)
 from intact.utils.eval import evaluate_policy
 from intact.utils.logger import build_logger
 from intact.utils.models import make_mdp_model, make_dreamer, make_mdp_dreamer
-from intact.utils.plot import plot_context
+from intact.utils.pipeline import CollectorPipeline
+from intact.utils.plot import plot_context, ContextPlotter
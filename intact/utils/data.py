@@ -2,6 +2,11 @@ import tensordict
 import torch
 
 
+def _padded_length(seq_len: int, length: int) -> int:
+    # min multiple of length that larger than or equal to seq_len
+    return (seq_len + length - 1) // length * length
+
+
 def match_length(batch_td: tensordict.TensorDict, length: int):
     """
     Match the length of the sequence to the specified length.
@@ -16,14 +21,193 @@ def match_length(batch_td: tensordict.TensorDict, length: int):
     assert len(batch_td.shape) == 2, "batch_td must be 2D"
 
     batch_size, seq_len = batch_td.shape
-    # min multiple of length that larger than or equal to seq_len
-    new_seq_len = (seq_len + length - 1) // length * length
-    # pad the sequence to the new length, add 0 to the end
-    matched_td = torch.stack(
-        [
-            tensordict.pad(tensordict=td, pad_size=[0, new_seq_len - seq_len])
-            for td in batch_td
-        ],
-        0,
-    ).contiguous()
-    return matched_td
+    new_seq_len = _padded_length(seq_len, length)
+    if new_seq_len == seq_len:
+        return batch_td.contiguous()
+
+    # pad the sequence to the new length, add 0 to the end, with one copy per entry
+    def pad(x):
+        out = x.new_zeros(batch_size, new_seq_len, *x.shape[2:])
+        out[:, :seq_len] = x
+        return out
+
+    return batch_td.apply(pad, batch_size=[batch_size, new_seq_len])
+
+
+def chunk_sequences(
+    batch_td: tensordict.TensorDict, length: int, mode: str = "pad"
+):
+    """
+    Split the batch of sequences into sequences of the specified length.
+
+    With mode "pad", every sequence is padded with 0 to a multiple of the length like ``match_length``,
+    and split into consecutive chunks, i.e. ``match_length(batch_td, length).reshape(-1, length)``
+    without the intermediate copy.
+
+    With mode "window", only the valid steps (those flagged by ("collector", "mask"), if any) are chunked,
+    so no chunk is made of padding only: a sequence of n steps gives the windows starting at 0, length,
+    2 * length, ..., and the last window is shifted to end at step n instead of being padded. A sequence
+    shorter than the length gives one window, padded with the invalid steps (or 0).
+
+    Args:
+        batch_td (tensordict.TensorDict): the batch of sequences, e.g. collected with ``split_trajs``.
+        length (int): the specified length.
+        mode (str, optional): "pad" or "window". Defaults to "pad".
+
+    Returns:
+        tensordict.TensorDict: the sequences, with shape (N, length).
+    """
+    assert len(batch_td.shape) == 2, "batch_td must be 2D"
+
+    if mode == "pad":
+        batch_size, seq_len = batch_td.shape
+        new_seq_len = _padded_length(seq_len, length)
+        chunk_num = batch_size * new_seq_len // length
+
+        def pad(x):
+            out = x.new_zeros(chunk_num, length, *x.shape[2:])
+            out.view(batch_size, new_seq_len, *x.shape[2:])[:, :seq_len] = x
+            return out
+
+        return batch_td.apply(pad, batch_size=[chunk_num, length])
+    elif mode == "window":
+        if batch_td.shape[1] < length:
+            batch_td = match_length(batch_td, length)
+        batch_size, seq_len = batch_td.shape
+
+        mask = batch_td.get(("collector", "mask"), None)
+        if mask is None:
+            valid_len = torch.full((batch_size,), seq_len, dtype=torch.long)
+        else:
+            valid_len = mask.reshape(batch_size, seq_len).sum(-1).cpu()
+        window_num = (valid_len + length - 1) // length
+        rows = torch.arange(batch_size).repeat_interleave(window_num)
+        # the index of every window in its sequence
+        offsets = torch.arange(len(rows)) - (
+            window_num.cumsum(0) - window_num
+        ).repeat_interleave(window_num)
+        starts = torch.minimum(
+            offsets * length, valid_len[rows] - length
+        ).clamp(min=0)
+        steps = starts.unsqueeze(-1) + torch.arange(length)
+
+        rows = rows.unsqueeze(-1).to(batch_td.device)
+        steps = steps.to(batch_td.device)
+        return batch_td.apply(
+            lambda x: x[rows, steps], batch_size=[len(starts), length]
+        )
+    else:
+        raise NotImplementedError("Unknown mode: {}".format(mode))
+
+
+class SequenceReplayBuffer:
+    def __init__(self, max_size: int, batch_length: int):
+        """
+        Replay buffer storing flat transitions and sampling windows of consecutive transitions.
+
+        The valid transitions of the extended batches (those flagged by ("collector", "mask"), if any) are
+        stored one after the other in a ring storage, with the episode of every transition. An episode
+        starts at every sequence of a batch, at every change of the task "idx" and after every ("next",
+        "done"). Windows are sampled uniformly among all the windows of ``batch_length`` transitions that
+        start in an episode and do not start after its last ``batch_length`` transitions, so they never
+        cross the boundary of an episode. The windows of the episodes shorter than ``batch_length`` are
+        padded with 0, which is flagged by ("collector", "mask") like ``match_length``.
+
+        Args:
+            max_size (int): the maximum number of stored transitions.
+            batch_length (int): the length of the sampled windows.
+        """
+        self.max_size = max_size
+        self.batch_length = batch_length
+
+        self._storage = None
+        self._episode = torch.full((max_size,), -1, dtype=torch.long)
+        self._cursor = 0
+        self._size = 0
+        self._episode_num = 0
+        self._windows = None
+
+    def __len__(self):
+        return self._size
+
+    def extend(self, batch_td: tensordict.TensorDictBase):
+        """Stores the valid transitions of a batch of shape (batch_size, seq_len) or (frames,)."""
+        assert len(batch_td.shape) in [1, 2], "batch_td must be 1D or 2D"
+
+        mask = batch_td.get(("collector", "mask"), None)
+        if mask is None:
+            mask = torch.ones(batch_td.shape, dtype=torch.bool)
+        mask = mask.reshape(batch_td.shape).to(torch.bool)
+        new_episode = torch.zeros(batch_td.shape, dtype=torch.bool)
+        new_episode[..., 0] = True
+        new_episode = new_episode[mask.cpu()]
+
+        batch_td = batch_td[mask].exclude("collector").cpu()
+        frames = batch_td.shape[0]
+        if frames == 0:
+            return
+        if "idx" in batch_td.keys():
+            idx = batch_td.get("idx").reshape(frames, -1)
+            new_episode[1:] |= (idx[1:] != idx[:-1]).any(-1)
+        if ("next", "done") in batch_td.keys(True):
+            done = batch_td.get(("next", "done")).reshape(frames, -1)
+            new_episode[1:] |= done[:-1].any(-1)
+        episode = new_episode.long().cumsum(0) - 1 + self._episode_num
+        self._episode_num = episode[-1].item() + 1
+
+        if frames > self.max_size:
+            batch_td = batch_td[-self.max_size :]
+            episode = episode[-self.max_size :]
+            frames = self.max_size
+        if self._storage is None:
+            # the last transition stays 0, and pads the windows of the short episodes
+            self._storage = batch_td.apply(
+                lambda x: x.new_zeros(self.max_size + 1, *x.shape[1:]),
+                batch_size=[self.max_size + 1],
+            )
+
+        positions = (self._cursor + torch.arange(frames)) % self.max_size
+        self._storage[positions] = batch_td
+        self._episode[positions] = episode
+        self._cursor = (self._cursor + frames) % self.max_size
+        self._size = min(self._size + frames, self.max_size)
+        self._windows = None
+
+    def _get_windows(self):
+        # the stored transitions from the oldest to the newest, whose episodes are non-decreasing
+        order = (
+            self._cursor - self._size + torch.arange(self._size)
+        ) % self.max_size
+        _, episode_len = torch.unique_consecutive(
+            self._episode[order], return_counts=True
+        )
+        episode_start = episode_len.cumsum(0) - episode_len
+        window_num = (episode_len - self.batch_length + 1).clamp(min=1)
+        return order, episode_start, episode_len, window_num
+
+    def sample(self, batch_size: int) -> tensordict.TensorDictBase:
+        """Samples windows of consecutive transitions, with shape (batch_size, batch_length)."""
+        if self._size == 0:
+            raise ValueError("Cannot sample from an empty buffer")
+        if self._windows is None:
+            self._windows = self._get_windows()
+        order, episode_start, episode_len, window_num = self._windows
+
+        # draw the windows uniformly, and find their episodes and offsets in them
+        window_cumsum = window_num.cumsum(0)
+        window = torch.randint(window_cumsum[-1].item(), (batch_size,))
+        episode = torch.searchsorted(window_cumsum, window, right=True)
+        offset = window - (window_cumsum[episode] - window_num[episode])
+
+        steps = offset.unsqueeze(-1) + torch.arange(self.batch_length)
+        mask = steps < episode_len[episode].unsqueeze(-1)
+        steps = (episode_start[episode].unsqueeze(-1) + steps).clamp(
+            max=self._size - 1
+        )
+        index = torch.where(mask, order[steps], self.max_size)
+
+        sampled_td = self._storage.apply(
+            lambda x: x[index], batch_size=[batch_size, self.batch_length]
+        )
+        sampled_td.set(("collector", "mask"), mask)
+        return sampled_td
@@ -1,6 +1,7 @@
 from intact.utils.envs.dreamer_env import make_dreamer_env
-from intact.utils.envs.mdp_env import make_mdp_env
+from intact.utils.envs.mdp_env import make_mdp_env, make_batch_mdp_env
 from intact.utils.envs.meta_env import (
     create_make_env_list,
     build_make_env_list,
 )
+from intact.utils.envs.parallel_env import ParallelMetaEnv
@@ -1,3 +1,5 @@
+import importlib
+
 from torchrl.envs.libs import GymEnv
 from torchrl.envs.transforms import (
     TransformedEnv,
@@ -6,6 +8,7 @@ from torchrl.envs.transforms import (
     DoubleToFloat,
     StepCounter,
 )
+from intact.envs.gym_like import batch_registry
 from intact.envs.meta_transform import MetaIdxTransform
 
 
@@ -56,3 +59,42 @@ def make_mdp_env(
     if idx is not None:
         transforms.append(MetaIdxTransform(idx, task_num))
     return TransformedEnv(env, transform=Compose(*transforms))
+
+
+def make_batch_mdp_env(
+    env_name,
+    oracle_context,
+    env_kwargs=None,
+    max_steps=1000,
+    device="cpu",
+):
+    """
+    Function to create a batched MDP environment, stepping every meta task at once.
+
+    Args:
+        env_name (str): The name of the environment, a key of ``intact.envs.gym_like.batch_registry``.
+        oracle_context (TensorDictBase): The contexts of the tasks, with batch size (task_num,).
+        env_kwargs (dict, optional): Additional keyword arguments for the environment. Defaults to None.
+        max_steps (int, optional): The maximum number of steps for the environment. Defaults to 1000.
+        device (str, optional): The device of the environment. Defaults to "cpu".
+
+    Raises:
+        ValueError: If there is no batched version of the environment.
+
+    Returns:
+        TransformedEnv: The created batched environment with batch size (task_num,), with applied
+            transformations. The task index of every env is under "idx".
+    """
+    if env_name not in batch_registry:
+        raise ValueError(f"No batched version of env: {env_name}")
+    spec = batch_registry[env_name]
+    module_name, cls_name = spec["entry_point"].split(":")
+    env_cls = getattr(importlib.import_module(module_name), cls_name)
+
+    env_kwargs = {**spec["kwargs"], **(env_kwargs or {})}
+    env = env_cls.from_oracle_context(
+        oracle_context, device=device, **env_kwargs
+    )
+
+    transforms = [RewardSum(), StepCounter(max_steps)]
+    return TransformedEnv(env, transform=Compose(*transforms))
@@ -0,0 +1,251 @@
+import traceback
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+from tensordict import TensorDictBase
+from torchrl.envs import EnvBase
+
+
+class TaskShard:
+    def __init__(
+        self,
+        make_env_fns: Sequence[Callable[[], EnvBase]],
+        task_ids: Sequence[int],
+        seed: Optional[int] = None,
+    ):
+        """The envs of a contiguous range of tasks, stepped one after the other.
+
+        Args:
+            make_env_fns (Sequence[Callable]): the env constructors of the tasks of the shard.
+            task_ids (Sequence[int]): the indices of the tasks of the shard, i.e. their rows in the buffers.
+            seed (int, optional): the base seed, task ``k`` is seeded with ``seed + k``. Defaults to None.
+        """
+        self.task_ids = [int(k) for k in task_ids]
+        self.envs = [make_env_fn() for make_env_fn in make_env_fns]
+        self.set_seed(seed)
+
+    def set_seed(self, seed: Optional[int]):
+        if seed is None:
+            return
+        for k, env in zip(self.task_ids, self.envs):
+            env.set_seed(seed + k)
+
+    def reset(
+        self,
+        reset_buffer: TensorDictBase,
+        reset: Optional[torch.Tensor] = None,
+    ):
+        for k, env in zip(self.task_ids, self.envs):
+            if reset is None or reset[k]:
+                reset_buffer[k] = env.reset().select(
+                    *reset_buffer.keys(True, True)
+                )
+
+    def step(self, input_buffer: TensorDictBase, next_buffer: TensorDictBase):
+        for k, env in zip(self.task_ids, self.envs):
+            tensordict = env.step(input_buffer[k].clone())
+            next_buffer[k] = tensordict.get("next").select(
+                *next_buffer.keys(True, True)
+            )
+
+    def close(self):
+        for env in self.envs:
+            env.close()
+
+
+def _run_worker(pipe, make_env_fns, task_ids, seed, buffers):
+    torch.set_num_threads(1)
+    input_buffer, next_buffer, reset_buffer = buffers
+    shard = TaskShard(make_env_fns, task_ids, seed)
+    while True:
+        cmd, data = pipe.recv()
+        try:
+            if cmd == "reset":
+                shard.reset(reset_buffer, data)
+            elif cmd == "step":
+                shard.step(input_buffer, next_buffer)
+            elif cmd == "seed":
+                shard.set_seed(data)
+            elif cmd == "close":
+                shard.close()
+                pipe.send(("closed", None))
+                break
+            else:
+                raise NotImplementedError("Unknown command: {}".format(cmd))
+            pipe.send(("done", None))
+        except Exception:
+            pipe.send(("error", traceback.format_exc()))
+
+
+class ParallelMetaEnv(EnvBase):
+    def __init__(
+        self,
+        make_env_list: List[Callable[[], EnvBase]],
+        num_workers: int = 0,
+        seed: Optional[int] = None,
+        mp_start_method: str = "spawn",
+    ):
+        """Steps the envs of all meta tasks as one env with batch size (task_num,), sharding the tasks across
+        worker processes.
+
+        Every worker owns the envs of a contiguous range of tasks, and reads the inputs of its tasks from and
+        writes their outputs to tensordict buffers in shared memory, so only short commands go through the
+        pipes. The env of every task is built by its own ``make_env_list`` function, so "idx" is still
+        written by its ``MetaIdxTransform``, and task ``k`` is seeded with ``seed + k`` whatever the number
+        of workers. With ``num_workers=0`` the tasks are stepped serially in the main process, with the same
+        results, which is easier to debug.
+
+        The workers are started lazily at the first reset, so the env can be passed to a multiprocessed
+        collector before.
+
+        Args:
+            make_env_list (List[Callable]): the env constructors of the tasks, e.g. from ``create_make_env_list``.
+            num_workers (int, optional): the number of worker processes, 0 to step the tasks serially.
+                Defaults to 0.
+            seed (int, optional): the base seed of the tasks. Defaults to None.
+            mp_start_method (str, optional): the start method of the workers. Defaults to "spawn".
+        """
+        self.make_env_list = list(make_env_list)
+        task_num = len(self.make_env_list)
+        super().__init__(device="cpu", batch_size=torch.Size([task_num]))
+        self.num_workers = min(num_workers, task_num)
+        self.seed = seed
+        self.mp_start_method = mp_start_method
+
+        env = self.make_env_list[0]()
+        for name in ["observation_spec", "action_spec", "reward_spec"]:
+            spec = getattr(env, name)
+            setattr(self, name, spec.expand(task_num, *spec.shape))
+        self.done_spec = env.full_done_spec.expand(
+            task_num, *env.full_done_spec.shape
+        )
+        if len(env.state_spec.keys()) > 0:
+            self.state_spec = env.state_spec.expand(
+                task_num, *env.state_spec.shape
+            )
+        env.close()
+
+        self._shard = None
+        self._workers = None
+        self._pipes = None
+
+    @property
+    def started(self):
+        return self._shard is not None or self._workers is not None
+
+    def start(self):
+        # the buffers are built from the specs, so the env holds no tensor to pickle before starting
+        self._reset_buffer = self.observation_spec.zero()
+        self._reset_buffer.update(self.full_done_spec.zero())
+        self._input_buffer = self._reset_buffer.clone()
+        self._input_buffer.update(self.full_action_spec.zero())
+        if len(self.state_spec.keys()) > 0:
+            self._input_buffer.update(self.state_spec.zero())
+        self._next_buffer = self._reset_buffer.clone()
+        self._next_buffer.update(self.full_reward_spec.zero())
+        task_num = self.batch_size[0]
+
+        if self.num_workers == 0:
+            self._shard = TaskShard(
+                self.make_env_list, range(task_num), self.seed
+            )
+            return
+
+        buffers = tuple(
+            buffer.share_memory_()
+            for buffer in [
+                self._input_buffer,
+                self._next_buffer,
+                self._reset_buffer,
+            ]
+        )
+        ctx = mp.get_context(self.mp_start_method)
+        self._workers, self._pipes = [], []
+        for task_ids in np.array_split(np.arange(task_num), self.num_workers):
+            parent_pipe, child_pipe = ctx.Pipe()
+            worker = ctx.Process(
+                target=_run_worker,
+                args=(
+                    child_pipe,
+                    [self.make_env_list[k] for k in task_ids],
+                    task_ids.tolist(),
+                    self.seed,
+                    buffers,
+                ),
+                daemon=True,
+            )
+            worker.start()
+            child_pipe.close()
+            self._workers.append(worker)
+            self._pipes.append(parent_pipe)
+
+    def run(self, cmd, data=None):
+        if self._shard is not None:
+            if cmd == "reset":
+                self._shard.reset(self._reset_buffer, data)
+            elif cmd == "step":
+                self._shard.step(self._input_buffer, self._next_buffer)
+            elif cmd == "seed":
+                self._shard.set_seed(data)
+            return
+
+        for pipe in self._pipes:
+            pipe.send((cmd, data))
+        errors = []
+        for pipe in self._pipes:
+            status, msg = pipe.recv()
+            if status == "error":
+                errors.append(msg)
+        if len(errors) > 0:
+            raise RuntimeError(
+                "{} failed in a worker:\n{}".format(cmd, errors[0])
+            )
+
+    def _reset(
+        self, tensordict: Optional[TensorDictBase] = None, **kwargs
+    ) -> TensorDictBase:
+        if not self.started:
+            self.start()
+
+        reset = None if tensordict is None else tensordict.get("_reset", None)
+        if reset is not None:
+            reset = reset.reshape(self.batch_size).clone()
+        self.run("reset", reset)
+
+        tensordict_reset = self._reset_buffer.clone()
+        if reset is not None:
+            # the envs that are not reset keep their last outputs
+            tensordict_reset[~reset] = self._next_buffer.select(
+                *tensordict_reset.keys(True, True)
+            )[~reset]
+        return tensordict_reset
+
+    def _step(self, tensordict: TensorDictBase) -> TensorDictBase:
+        self._input_buffer.update_(
+            tensordict.select(
+                *self._input_buffer.keys(True, True), strict=False
+            )
+        )
+        self.run("step")
+        return self._next_buffer.clone()
+
+    def _set_seed(self, seed: Optional[int]):
+        self.seed = seed
+        if self.started:
+            self.run("seed", seed)
+        return None if seed is None else seed + self.batch_size[0]
+
+    def close(self):
+        if self._shard is not None:
+            self._shard.close()
+            self._shard = None
+        if self._workers is not None:
+            for pipe in self._pipes:
+                pipe.send(("close", None))
+            for pipe, worker in zip(self._pipes, self._workers):
+                pipe.recv()
+                worker.join()
+            self._workers, self._pipes = None, None
+        super().close()
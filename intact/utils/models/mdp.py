@@ -59,6 +59,8 @@ def make_mdp_model(
         max_context_dim=cfg.max_context_dim,
         task_num=cfg.task_num,
         hidden_dims=[cfg.hidden_size] * cfg.hidden_layers,
+        ensemble_size=cfg.ensemble_size,
+        amortized_context=cfg.amortized_context,
     )
     world_model = MDPWrapper(world_model).to(device)
 
@@ -66,6 +68,8 @@ def make_mdp_model(
         world_model,
         termination_fns=cfg.termination_fns,
         reward_fns=cfg.reward_fns,
+        ensemble_sampling=cfg.ensemble_sampling,
+        compile_step=cfg.compile_step,
     ).to(device)
     model_based_env.set_specs_from_env(proof_env)
 
@@ -84,6 +88,10 @@ class MDPConfig:
     task_num = 20
     hidden_size = 200
     hidden_layers = 2
+    ensemble_size = 0
+    ensemble_sampling = "TS1"
+    compile_step = False
+    amortized_context = False
 
     termination_fns = ""
     reward_fns = ""
@@ -0,0 +1,167 @@
+import queue
+import threading
+import time
+from typing import Callable, Optional
+
+from tensordict import TensorDictBase
+from torchrl.collectors.collectors import (
+    DataCollectorBase,
+    MultiaSyncDataCollector,
+    MultiSyncDataCollector,
+)
+
+_STOP = object()
+
+
+class CollectorPipeline:
+    def __init__(
+        self,
+        collector: DataCollectorBase,
+        replay_buffer=None,
+        preprocess_fn: Optional[Callable] = None,
+        max_queue_size: int = 2,
+        max_staleness: int = 0,
+        logger=None,
+        log_prefix: str = "pipeline",
+    ):
+        """Overlaps the data collection with the training of the main loop.
+
+        A background thread keeps pulling batches from the collector, preprocesses them (e.g.
+        ``match_length``) and puts them in a queue of at most ``max_queue_size`` batches, so the collector
+        keeps going while the main loop trains. Iterating the pipeline yields the queued batches, after
+        extending the replay buffer with them.
+
+        The collector must run the policy in its own processes (``MultiSyncDataCollector``,
+        ``MultiaSyncDataCollector`` or ``aSyncDataCollector``): the background thread only waits for their
+        batches. An in-process collector such as ``SyncDataCollector`` would run the policy (and the world
+        model of a model-based env) in the background thread while the main loop trains the same modules,
+        so it is rejected.
+
+        The main loop reports its optimization steps with ``record_updates``, and the weights are published
+        to the collector (``update_policy_weights_``) once ``max_staleness`` steps have been taken since the
+        last publication. This only bounds the lag of collectors whose workers hold a copy of the weights,
+        e.g. a policy on another device. A policy on the device of its collector is kept in shared memory
+        by the multi-process collectors: the workers see every optimization step as it is taken, and the
+        publications have no effect.
+
+        Every yielded batch logs "queue_depth" (the number of batches waiting), "learner_idle_time" (the
+        seconds the main loop waited for it), "collector_idle_time" (the seconds the collection waited for
+        room in the queue since the last batch) and "data_staleness" (the number of optimization steps
+        recorded since the batch was received from the collector, a lower bound of how many steps the
+        trained weights are ahead of those the batch was collected with).
+
+        Args:
+            collector (DataCollectorBase): the multi-process collector, e.g. an ``aSyncDataCollector``.
+            replay_buffer (optional): the replay buffer extended with every (preprocessed) batch.
+                Defaults to None.
+            preprocess_fn (Callable, optional): maps every collected batch to the yielded one, in the
+                background thread. Defaults to None.
+            max_queue_size (int, optional): the maximum number of batches waiting. Defaults to 2.
+            max_staleness (int, optional): the number of optimization steps between two publications of the
+                weights, 0 to publish after every ``record_updates``. Defaults to 0.
+            logger (optional): the logger of the metrics. Defaults to None.
+            log_prefix (str, optional): the prefix of the metrics. Defaults to "pipeline".
+        """
+        if not isinstance(
+            collector, (MultiSyncDataCollector, MultiaSyncDataCollector)
+        ):
+            raise TypeError(
+                "CollectorPipeline needs a multi-process collector, "
+                "got {}".format(type(collector).__name__)
+            )
+        self.collector = collector
+        self.replay_buffer = replay_buffer
+        self.preprocess_fn = preprocess_fn
+        self.max_staleness = max_staleness
+        self.logger = logger
+        self.log_prefix = log_prefix
+
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.weight_version = 0
+        self.num_updates = 0
+        self.updates_since_publish = 0
+        self.collector_idle_time = 0.0
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _collect(self):
+        try:
+            for tensordict in self.collector:
+                num_updates = self.num_updates
+                if self.preprocess_fn is not None:
+                    tensordict = self.preprocess_fn(tensordict)
+                if not self._put((tensordict, num_updates)):
+                    return
+        except Exception as err:
+            self._put(err)
+            return
+        self._put(_STOP)
+
+    def _put(self, item) -> bool:
+        start = time.perf_counter()
+        while not self._stop_event.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        with self._lock:
+            self.collector_idle_time += time.perf_counter() - start
+        return not self._stop_event.is_set()
+
+    def __iter__(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._collect, daemon=True)
+            self._thread.start()
+
+        while True:
+            start = time.perf_counter()
+            queue_depth = self.queue.qsize()
+            item = self.queue.get()
+            learner_idle_time = time.perf_counter() - start
+
+            if item is _STOP:
+                return
+            if isinstance(item, Exception):
+                raise item
+            tensordict, num_updates = item
+
+            if self.replay_buffer is not None:
+                self.replay_buffer.extend(tensordict)
+
+            if self.logger is not None:
+                with self._lock:
+                    collector_idle_time = self.collector_idle_time
+                    self.collector_idle_time = 0.0
+                metrics = {
+                    "queue_depth": float(queue_depth),
+                    "learner_idle_time": learner_idle_time,
+                    "collector_idle_time": collector_idle_time,
+                    "data_staleness": float(self.num_updates - num_updates),
+                }
+                for name, value in metrics.items():
+                    self.logger.add_scaler(
+                        "{}/{}".format(self.log_prefix, name), value
+                    )
+            yield tensordict
+
+    def record_updates(self, num_updates: int = 1):
+        """Records optimization steps of the main loop, and publishes the weights once they are stale."""
+        self.num_updates += num_updates
+        self.updates_since_publish += num_updates
+        if self.updates_since_publish >= self.max_staleness:
+            self.publish()
+
+    def publish(self):
+        self.collector.update_policy_weights_()
+        self.weight_version += 1
+        self.updates_since_publish = 0
+
+    def shutdown(self):
+        """Stops the background thread, the collector still has to be shut down."""
+        self._stop_event.set()
+        if self._thread is not None:
+            # the thread may be waiting for the collector, which only returns once it is shut down
+            self._thread.join(timeout=1.0)
+            self._thread = None
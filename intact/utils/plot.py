@@ -1,35 +1,39 @@
 import math
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 import torch
 from matplotlib import cm
 from matplotlib import colors as mcolors
 from matplotlib import pyplot as plt
+from matplotlib.figure import Figure
 
+from intact.stats.mcc import MCCTracker
 
-def plot_context(
-    cfg,
-    world_model,
-    oracle_context,
-    logger=None,
-    log_idx=0,
-    log_prefix="model",
-    color_values=None,
-):
-    context_model = world_model.context_model
-    context_gt = torch.stack(
-        [v for v in oracle_context.values()], dim=-1
-    ).cpu()
 
+def get_valid_context_idx(cfg, world_model):
     if cfg.model_type == "causal":
-        valid_context_idx = world_model.causal_mask.valid_context_idx
+        return world_model.causal_mask.valid_context_idx
     else:
-        valid_context_idx = torch.arange(context_model.max_context_dim)
+        return torch.arange(world_model.context_model.max_context_dim)
 
-    mcc, permutation, context_hat = context_model.get_mcc(
-        context_gt, valid_context_idx
-    )
+
+def save_context_plot(
+    path,
+    context_gt,
+    context_hat,
+    permutation,
+    context_names,
+    valid_context_idx,
+    color_values=None,
+):
+    """Saves the scatter plots of the matched true and estimated contexts to ``path``.png, and the
+    estimated contexts to ``path``.npy.
+
+    Only the object-oriented matplotlib api is used, so it can run outside of the main thread.
+    """
     idxes_hat, idxes_gt = permutation
 
     if color_values is None:
@@ -40,21 +44,21 @@ def plot_context(
         )
         cmap = cm.ScalarMappable(norm, plt.get_cmap("Blues")).cmap
 
-    if len(idxes_gt) == 0:
-        pass
-    elif len(idxes_gt) == 1:
-        plt.scatter(
-            context_gt[:, idxes_gt[0]],
-            context_hat[:, idxes_hat[0]],
-            c=color_values,
-            cmap=cmap,
-        )
+    if len(idxes_gt) <= 1:
+        fig = Figure()
+        if len(idxes_gt) == 1:
+            fig.add_subplot().scatter(
+                context_gt[:, idxes_gt[0]],
+                context_hat[:, idxes_hat[0]],
+                c=color_values,
+                cmap=cmap,
+            )
     else:
         num_rows = math.ceil(math.sqrt(len(idxes_gt)))
         num_cols = math.ceil(len(idxes_gt) / num_rows)
-        fig, axs = plt.subplots(num_rows, num_cols, figsize=(10, 10))
+        fig = Figure(figsize=(10, 10))
+        axs = fig.subplots(num_rows, num_cols)
 
-        context_names = list(oracle_context.keys())
         scatters = []
         for j, (idx_gt, idx_hat) in enumerate(zip(idxes_gt, idxes_hat)):
             ax = axs.flatten()[j]
@@ -74,12 +78,42 @@ def plot_context(
             axs.flat[j].set_visible(False)
 
         if color_values is not None and len(scatters) > 0:
-            plt.colorbar(scatters[0], ax=axs)
+            fig.colorbar(scatters[0], ax=axs)
+
+    fig.savefig(f"{path}.png")
+    np.save(f"{path}.npy", context_hat)
+
+
+def plot_context(
+    cfg,
+    world_model,
+    oracle_context,
+    logger=None,
+    log_idx=0,
+    log_prefix="model",
+    color_values=None,
+):
+    context_model = world_model.context_model
+    context_gt = torch.stack(
+        [v for v in oracle_context.values()], dim=-1
+    ).cpu()
+
+    valid_context_idx = get_valid_context_idx(cfg, world_model)
+
+    mcc, permutation, context_hat = context_model.get_mcc(
+        context_gt, valid_context_idx
+    )
 
     os.makedirs(log_prefix, exist_ok=True)
-    plt.savefig(os.path.join(log_prefix, f"{log_idx}.png"))
-    plt.close()
-    np.save(os.path.join(log_prefix, f"{log_idx}.npy"), context_hat)
+    save_context_plot(
+        os.path.join(log_prefix, f"{log_idx}"),
+        context_gt,
+        context_hat,
+        permutation,
+        list(oracle_context.keys()),
+        valid_context_idx,
+        color_values,
+    )
 
     if logger is not None:
         logger.add_scaler(
@@ -87,3 +121,98 @@ def plot_context(
             float(len(valid_context_idx)),
         )
         logger.add_scaler("{}/mcc".format(log_prefix), mcc)
+
+
+class ContextPlotter:
+    def __init__(
+        self,
+        cfg,
+        oracle_context,
+        logger=None,
+        log_prefix="model",
+        plot_interval=60.0,
+    ):
+        """Logs the mcc of the estimated contexts and plots them at a limited rate.
+
+        The calls are skipped unless ``plot_interval`` seconds have passed since the last plot and the
+        previous plot is finished. Otherwise the mcc is computed on the device of the context model by
+        ``MCCTracker`` and logged, while the full plots are drawn and saved by a background worker, so the
+        training loop neither syncs the device nor waits on matplotlib on every call.
+
+        Args:
+            cfg: the config, ``cfg.model_type`` decides the valid contexts.
+            oracle_context (dict): the true contexts of the tasks, by name.
+            logger (optional): the logger of the scalars. Defaults to None.
+            log_prefix (str, optional): the directory of the plots and the prefix of the scalars.
+                Defaults to "model".
+            plot_interval (float, optional): the minimum number of seconds between two plots and mcc logs,
+                0 for every call. Defaults to 60.0.
+        """
+        self.cfg = cfg
+        self.context_names = list(oracle_context.keys())
+        self.context_gt = torch.stack(
+            [v for v in oracle_context.values()], dim=-1
+        ).cpu()
+        self.tracker = MCCTracker(self.context_gt)
+        self.logger = logger
+        self.log_prefix = log_prefix
+        self.plot_interval = plot_interval
+
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._job = None
+        self._last_plot_time = -math.inf
+
+    def plot_ready(self):
+        if time.monotonic() - self._last_plot_time < self.plot_interval:
+            return False
+        if self._job is not None:
+            if not self._job.done():
+                return False
+            # surfaces the errors of the previous plot
+            self._job.result()
+        return True
+
+    def __call__(self, world_model, log_idx, color_values=None):
+        """Logs the mcc and plots the contexts if the plot interval has passed, otherwise does nothing.
+
+        Returns:
+            torch.Tensor: the mcc, or None if the call is skipped.
+        """
+        if not self.plot_ready():
+            # the mcc is only read at the plot interval, every read syncs the device
+            return None
+        self._last_plot_time = time.monotonic()
+
+        valid_context_idx = get_valid_context_idx(self.cfg, world_model)
+        context_hat = world_model.context_model.context_hat[
+            :, valid_context_idx
+        ].detach()
+        mcc = self.tracker.update(context_hat)
+
+        if self.logger is not None:
+            self.logger.add_scaler(
+                "{}/valid_context_num".format(self.log_prefix),
+                float(len(valid_context_idx)),
+            )
+            self.logger.add_scaler(
+                "{}/mcc".format(self.log_prefix), mcc.item()
+            )
+
+        os.makedirs(self.log_prefix, exist_ok=True)
+        self._job = self._executor.submit(
+            save_context_plot,
+            os.path.join(self.log_prefix, f"{log_idx}"),
+            self.context_gt,
+            context_hat.cpu().numpy(),
+            self.tracker.permutation,
+            self.context_names,
+            torch.as_tensor(valid_context_idx).cpu(),
+            color_values,
+        )
+        return mcc
+
+    def close(self):
+        """Waits for the pending plot and stops the background worker."""
+        if self._job is not None:
+            self._job.result()
+        self._executor.shutdown(wait=True)
@@ -11,3 +11,53 @@ def test_heating_env():
         obs, _, _, _, _ = env.step(action)
         env.render()
         assert obs is not None
+
+
+def test_batch_cartpole_env():
+    import numpy as np
+    import torch
+    from torchrl.envs.utils import check_env_specs
+
+    from intact.envs.gym_like.cartpole import BatchCartPoleEnv
+
+    env_num = 6
+    gravity = torch.rand(env_num) * 15 + 5
+    cart_vel_bias = torch.rand(env_num) * 2 - 1
+    envs = [
+        CartPoleEnv(gravity=g.item(), cart_vel_bias=b.item())
+        for g, b in zip(gravity, cart_vel_bias)
+    ]
+    batch_env = BatchCartPoleEnv(
+        env_num, gravity=gravity, cart_vel_bias=cart_vel_bias, seed=0
+    )
+    check_env_specs(batch_env)
+
+    tensordict = batch_env.reset()
+    assert (tensordict["idx"].squeeze(-1) == torch.arange(env_num)).all()
+    for env, state in zip(envs, batch_env.state):
+        env.reset()
+        env.state = state.double().numpy().copy()
+
+    for _ in range(10):
+        action = torch.rand(env_num, 1) * 2 - 1
+        tensordict["action"] = action
+        tensordict = batch_env.step(tensordict)
+        outputs = [env.step(a.numpy()) for env, a in zip(envs, action)]
+        assert np.allclose(
+            tensordict["next", "observation"].numpy(),
+            np.stack([output[0] for output in outputs]),
+            atol=1e-4,
+        )
+        assert np.array_equal(
+            tensordict["next", "terminated"].squeeze(-1).numpy(),
+            np.array([output[2] for output in outputs]),
+        )
+        tensordict = tensordict["next"].clone()
+
+    # the done envs are reset row by row along a non-stopping rollout
+    rollout = batch_env.rollout(100, break_when_any_done=False)
+    done = rollout["next", "done"][:, :-1].squeeze(-1)
+    assert done.any()
+    state = rollout["observation"][:, 1:][done]
+    state[:, 1] -= cart_vel_bias.unsqueeze(-1).expand_as(done)[done]
+    assert (state.abs() <= 0.05).all()
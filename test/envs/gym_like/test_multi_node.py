@@ -9,3 +9,56 @@ def test_heating_env():
     action = env.action_space.sample()
     obs, _, _, _, _ = env.step(action)
     assert obs is not None
+
+
+def test_batch_multi_node_env():
+    import numpy as np
+    import torch
+    from torchrl.envs.utils import check_env_specs
+
+    from intact.envs.gym_like.multi_node import BatchMultiNodeEnv
+
+    env_num = 4
+    for context_influence_type in ["neural", "linear", "tanh"]:
+        contexts = torch.rand(env_num, 3) * 2 - 1
+        envs = [
+            MultiNodeEnv(
+                context_influence_type=context_influence_type,
+                **{f"c{i + 1}": c.item() for i, c in enumerate(context)},
+            )
+            for context in contexts
+        ]
+        batch_env = BatchMultiNodeEnv(
+            contexts, context_influence_type=context_influence_type
+        )
+        check_env_specs(batch_env)
+
+        tensordict = batch_env.reset()
+        assert (tensordict["idx"].squeeze(-1) == torch.arange(env_num)).all()
+        for env, temperature in zip(envs, batch_env.temperature):
+            env.temperature = temperature.double().numpy().copy()
+
+        for _ in range(10):
+            action = torch.rand(env_num, 5) * 2 - 1
+            tensordict["action"] = action
+            tensordict = batch_env.step(tensordict)
+            outputs = [env.step(a.numpy()) for env, a in zip(envs, action)]
+            assert np.allclose(
+                tensordict["next", "observation"].numpy(),
+                np.stack([output[0] for output in outputs]),
+                atol=1e-4,
+            )
+            assert np.allclose(
+                tensordict["next", "reward"].squeeze(-1).numpy(),
+                np.array([output[1] for output in outputs]),
+                atol=1e-3,
+            )
+            tensordict = tensordict["next"].clone()
+
+    # only the envs flagged by "_reset" are reset
+    observation = tensordict["observation"].clone()
+    tensordict["_reset"] = torch.zeros(env_num, 1, dtype=torch.bool)
+    tensordict["_reset"][0] = True
+    tensordict = batch_env.reset(tensordict)
+    assert (tensordict["observation"][0] != observation[0]).any()
+    assert (tensordict["observation"][1:] == observation[1:]).all()
@@ -0,0 +1,36 @@
+import pytest
+import torch
+from tensordict import TensorDict
+
+from intact.envs.rollout import compacted_rollout
+
+
+def test_compacted_rollout():
+    done_step = torch.tensor([0, 2, 4, 1])
+
+    def step_fn(tensordict, t, active_idx):
+        done = (done_step[active_idx] == t).unsqueeze(-1)
+        tensordict.set(
+            "next",
+            TensorDict(
+                {
+                    "observation": tensordict["observation"] + 1,
+                    "done": done,
+                    "terminated": done.clone(),
+                },
+                tensordict.batch_size,
+            ),
+        )
+        return tensordict
+
+    tensordict = TensorDict({"observation": torch.zeros(4, 1)}, [4])
+    rollout = compacted_rollout(step_fn, tensordict, max_steps=10)
+    assert rollout.shape == (4, 5)
+
+    valid = rollout["collector", "mask"]
+    assert (valid == (torch.arange(5) <= done_step.unsqueeze(-1))).all()
+    assert (rollout["next", "observation"][~valid] == 0).all()
+    assert rollout["next", "done"][~valid].all()
+
+    with pytest.raises(ValueError):
+        compacted_rollout(step_fn, tensordict, max_steps=0)
@@ -30,3 +30,127 @@ def test_mdp_env():
         10, auto_reset=False, tensordict=td, break_when_any_done=False
     )
     # print(td)
+
+
+def test_ensemble_sampling():
+    from intact.modules.models.mdp_world_model import PlainMDPWorldModel
+    from intact.modules.tensordict_module.mdp_wrapper import MDPWrapper
+    from torchrl.envs import GymEnv
+
+    obs_dim = 4
+    action_dim = 1
+    ensemble_size = 3
+
+    world_model = PlainMDPWorldModel(
+        obs_dim=obs_dim,
+        action_dim=action_dim,
+        meta=False,
+        ensemble_size=ensemble_size,
+    )
+    mdp_wrapper = MDPWrapper(world_model)
+    proof_env = GymEnv("MyCartPole-v0")
+
+    for ensemble_sampling in ["TS1", "TSinf", "mean"]:
+        mdp_env = MDPEnv(mdp_wrapper, ensemble_sampling=ensemble_sampling)
+        mdp_env.set_specs_from_env(proof_env)
+
+        td = proof_env.reset()
+        mdp_env.reset()
+        td = mdp_env.rollout(
+            10, auto_reset=False, tensordict=td, break_when_any_done=False
+        )
+        assert td["next", "observation"].shape == (10, obs_dim)
+
+
+def test_compile_step():
+    import torch
+    from intact.modules.models.mdp_world_model import PlainMDPWorldModel
+    from intact.modules.tensordict_module.mdp_wrapper import MDPWrapper
+    from torchrl.envs import GymEnv
+
+    obs_dim = 4
+    action_dim = 1
+
+    world_model = PlainMDPWorldModel(
+        obs_dim=obs_dim, action_dim=action_dim, meta=False
+    )
+    mdp_wrapper = MDPWrapper(world_model)
+    proof_env = GymEnv("MyCartPole-v0")
+
+    eager_env = MDPEnv(mdp_wrapper)
+    compiled_env = MDPEnv(mdp_wrapper, compile_step=True)
+
+    observation = torch.randn(5, obs_dim)
+    action = torch.randn(5, action_dim)
+    torch.manual_seed(0)
+    eager_outputs = eager_env.model_step(observation, action)
+    torch.manual_seed(0)
+    # compiled, or fallen back to eager where compilation is unavailable
+    compiled_outputs = compiled_env.model_step(observation, action)
+    for eager_value, compiled_value in zip(eager_outputs, compiled_outputs):
+        assert torch.allclose(eager_value, compiled_value, atol=1e-5)
+
+    compiled_env.set_specs_from_env(proof_env)
+    td = proof_env.reset()
+    compiled_env.reset()
+    td = compiled_env.rollout(
+        10, auto_reset=False, tensordict=td, break_when_any_done=False
+    )
+    assert td["next", "observation"].shape == (10, obs_dim)
+
+
+def test_compile_step_errors():
+    import pytest
+    import torch
+    from intact.modules.models.mdp_world_model import PlainMDPWorldModel
+    from intact.modules.tensordict_module.mdp_wrapper import MDPWrapper
+
+    world_model = PlainMDPWorldModel(obs_dim=4, action_dim=1, meta=False)
+    compiled_env = MDPEnv(MDPWrapper(world_model), compile_step=True)
+    observation = torch.randn(5, 4)
+    action = torch.randn(5, 1)
+
+    def model_error(*args):
+        raise RuntimeError("shape mismatch")
+
+    # errors of the model are raised, and do not disable compilation
+    compiled_env._compiled_model_step = model_error
+    with pytest.raises(RuntimeError, match="shape mismatch"):
+        compiled_env.model_step(observation, action)
+    assert compiled_env.compile_step
+
+    def compile_error(*args):
+        raise torch._dynamo.exc.BackendCompilerFailed(
+            compile_error, RuntimeError("no backend")
+        )
+
+    # compile failures fall back to eager
+    compiled_env._compiled_model_step = compile_error
+    with pytest.warns(UserWarning):
+        outputs = compiled_env.model_step(observation, action)
+    assert outputs[0].shape == (5, 4)
+    assert not compiled_env.compile_step
+
+
+def test_tensordict_module_world_model():
+    import torch
+    from tensordict.nn import TensorDictModule
+    from intact.modules.models.mdp_world_model import PlainMDPWorldModel
+    from intact.modules.tensordict_module.mdp_wrapper import MDPWrapper
+
+    world_model = PlainMDPWorldModel(obs_dim=4, action_dim=1, meta=False)
+    mdp_wrapper = MDPWrapper(world_model)
+    module = TensorDictModule(
+        world_model,
+        in_keys=["observation", "action"],
+        out_keys=mdp_wrapper.out_keys,
+    )
+
+    observation = torch.randn(5, 4)
+    action = torch.randn(5, 1)
+    torch.manual_seed(0)
+    wrapper_outputs = MDPEnv(mdp_wrapper).model_step(observation, action)
+    torch.manual_seed(0)
+    module_outputs = MDPEnv(module).model_step(observation, action)
+    for wrapper_value, module_value in zip(wrapper_outputs, module_outputs):
+        assert torch.allclose(wrapper_value, module_value)
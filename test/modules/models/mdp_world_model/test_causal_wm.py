@@ -97,3 +97,158 @@ def test_reset():
         task_num=task_num,
     )
     world_model.reset()
+
+
+def test_sparse_inference():
+    obs_dim = 4
+    action_dim = 1
+    max_context_dim = 10
+    task_num = 100
+    batch_size = 32
+
+    world_model = CausalWorldModel(
+        obs_dim=obs_dim,
+        action_dim=action_dim,
+        meta=True,
+        max_context_dim=max_context_dim,
+        task_num=task_num,
+        sparse_inference=True,
+    )
+    with torch.no_grad():
+        world_model.causal_mask._observed_logits.normal_()
+        world_model.causal_mask._context_logits.normal_()
+
+    observation = torch.randn(batch_size, obs_dim)
+    action = torch.randn(batch_size, action_dim)
+    idx = torch.randint(0, task_num, (batch_size, 1))
+
+    sparse_outputs = world_model(
+        observation, action, idx, deterministic_mask=True
+    )
+    world_model.sparse_inference = False
+    dense_outputs = world_model(
+        observation, action, idx, deterministic_mask=True
+    )
+    for sparse_output, dense_output in zip(sparse_outputs, dense_outputs):
+        assert torch.allclose(sparse_output, dense_output, atol=1e-5)
+
+    # the packed layout is cached until the mask logits change
+    layout = world_model.causal_mask.packed_layout
+    assert world_model.causal_mask.packed_layout is layout
+    with torch.no_grad():
+        world_model.causal_mask._observed_logits.neg_()
+    assert world_model.causal_mask.packed_layout is not layout
+
+
+def test_sampling_forward():
+    obs_dim = 4
+    action_dim = 1
+    max_context_dim = 10
+    task_num = 100
+    batch_size = 32
+    sampling_times = 7
+
+    world_model = CausalWorldModel(
+        obs_dim=obs_dim,
+        action_dim=action_dim,
+        meta=True,
+        max_context_dim=max_context_dim,
+        task_num=task_num,
+    )
+
+    observation = torch.randn(batch_size, obs_dim)
+    action = torch.randn(batch_size, action_dim)
+    idx = torch.randint(0, task_num, (batch_size, 1))
+
+    (
+        next_obs_mean,
+        next_obs_log_var,
+        reward_mean,
+        reward_log_var,
+        terminated,
+        mask,
+    ) = world_model.sampling_forward(
+        observation, action, idx, sampling_times=sampling_times
+    )
+
+    assert (
+        next_obs_mean.shape
+        == next_obs_log_var.shape
+        == (sampling_times, batch_size, obs_dim)
+    )
+    assert (
+        reward_mean.shape
+        == terminated.shape
+        == (sampling_times, batch_size, 1)
+    )
+    assert mask.shape == (
+        sampling_times,
+        batch_size,
+        obs_dim + 2,
+        obs_dim + action_dim + max_context_dim,
+    )
+
+    # each sample must match a plain forward pass under the same mask
+    inputs = torch.cat(
+        [observation, action, world_model.context_model(idx)], dim=-1
+    )
+    masked_inputs = torch.einsum("boi,bi->obi", mask[0].float(), inputs)
+    mean, _ = world_model.nets["para_mlp"](masked_inputs).permute(2, 1, 0)
+    assert torch.allclose(
+        next_obs_mean[0], observation + mean[:, :-2], atol=1e-5
+    )
+
+
+def test_ensemble():
+    obs_dim = 4
+    action_dim = 1
+    max_context_dim = 10
+    task_num = 100
+    batch_size = 32
+    ensemble_size = 3
+    sampling_times = 7
+
+    world_model = CausalWorldModel(
+        obs_dim=obs_dim,
+        action_dim=action_dim,
+        meta=True,
+        max_context_dim=max_context_dim,
+        task_num=task_num,
+        ensemble_size=ensemble_size,
+    )
+
+    observation = torch.randn(batch_size, obs_dim)
+    action = torch.randn(batch_size, action_dim)
+    idx = torch.randint(0, task_num, (batch_size, 1))
+
+    next_obs_mean, _, reward_mean, _, terminated, mask = world_model(
+        observation, action, idx
+    )
+    assert next_obs_mean.shape == (batch_size, ensemble_size, obs_dim)
+    assert reward_mean.shape == (batch_size, ensemble_size, 1)
+    assert mask.shape == (
+        batch_size,
+        obs_dim + 2,
+        obs_dim + action_dim + max_context_dim,
+    )
+
+    dense_outputs = world_model(
+        observation, action, idx, deterministic_mask=True
+    )
+    world_model.sparse_inference = True
+    sparse_outputs = world_model(
+        observation, action, idx, deterministic_mask=True
+    )
+    for dense, sparse in zip(dense_outputs, sparse_outputs):
+        assert torch.allclose(dense, sparse, atol=1e-5)
+
+    next_obs_mean, *_, mask = world_model.sampling_forward(
+        observation, action, idx, sampling_times=sampling_times
+    )
+    assert next_obs_mean.shape == (
+        sampling_times,
+        batch_size,
+        ensemble_size,
+        obs_dim,
+    )
+    assert mask.shape[:2] == (sampling_times, batch_size)
@@ -54,3 +54,54 @@ def test_reset():
         max_context_dim=max_context_dim,
     )
     world_model.reset()
+
+
+def test_ensemble():
+    obs_dim = 4
+    action_dim = 1
+    batch_size = 32
+    env_num = 5
+    ensemble_size = 3
+
+    world_model = PlainMDPWorldModel(
+        obs_dim=obs_dim,
+        action_dim=action_dim,
+        meta=False,
+        ensemble_size=ensemble_size,
+    )
+
+    for batch_shape in [(), (batch_size,), (env_num, batch_size)]:
+        observation = torch.randn(*batch_shape, obs_dim)
+        action = torch.randn(*batch_shape, action_dim)
+
+        (
+            next_obs_mean,
+            next_obs_log_var,
+            reward_mean,
+            _,
+            terminated,
+        ) = world_model(observation, action)
+
+        assert (
+            next_obs_mean.shape
+            == next_obs_log_var.shape
+            == (*batch_shape, ensemble_size, obs_dim)
+        )
+        assert (
+            reward_mean.shape
+            == terminated.shape
+            == (*batch_shape, ensemble_size, 1)
+        )
+
+    # every member is an independent network on the shared batch
+    inputs = torch.cat([observation, action], dim=-1).reshape(-1, 5)
+    member_outputs = inputs
+    for layer in world_model.nets["mlp"]:
+        if hasattr(layer, "weight"):
+            member_outputs = member_outputs @ layer.weight[1].T + layer.bias[1]
+        else:
+            member_outputs = layer(member_outputs)
+    member_obs_mean = observation + member_outputs[:, :obs_dim].reshape(
+        *observation.shape
+    )
+    assert torch.allclose(next_obs_mean[..., 1, :], member_obs_mean, atol=1e-5)
@@ -59,3 +59,66 @@ def test_causal_mask_sigmoid():
     masked_inputs, _ = causal_mask(inputs, dim_map=dim_map)
 
     assert masked_inputs.shape == (mask_output_dim, batch_size, real_input_dim)
+
+
+def test_causal_mask_sampling_modes():
+    observed_input_dim = 5
+    context_input_dim = 3
+    mask_output_dim = 6
+    batch_size = 8
+    sampling_times = 10
+
+    causal_mask = CausalMask(
+        observed_input_dim=observed_input_dim,
+        context_input_dim=context_input_dim,
+        mask_output_dim=mask_output_dim,
+        meta=True,
+    )
+    inputs = torch.randn(batch_size, observed_input_dim + context_input_dim)
+
+    for sampling_mode in ["iid", "antithetic", "stratified"]:
+        head_major_mask, sampling_mask = causal_mask.sampling_forward(
+            inputs, sampling_times, sampling_mode=sampling_mode
+        )
+        assert head_major_mask.shape == (
+            mask_output_dim,
+            sampling_times,
+            batch_size,
+            observed_input_dim + context_input_dim,
+        )
+        assert head_major_mask.dtype == torch.bool
+        assert (head_major_mask.permute(1, 2, 0, 3) == sampling_mask).all()
+        assert sampling_mask.shape == (
+            sampling_times,
+            batch_size,
+            mask_output_dim,
+            observed_input_dim + context_input_dim,
+        )
+
+        sampling_loss = torch.randn(
+            sampling_times, batch_size, mask_output_dim
+        )
+        for estimator in ["difference", "loo"]:
+            grad, variance = causal_mask.total_mask_grad(
+                sampling_mask,
+                sampling_loss,
+                estimator=estimator,
+                return_variance=True,
+            )
+            assert (
+                grad.shape == variance.shape == causal_mask.mask_logits.shape
+            )
+            assert (variance >= 0).all()
+
+
+def test_stratified_sampling():
+    from intact.modules.models.causal_mask import sample_uniform
+
+    sampling_times = 10
+    noise = sample_uniform((3, sampling_times, 4), "stratified", dim=1)
+    strata = torch.sort((noise * sampling_times).floor(), dim=1)[0]
+    assert (strata == torch.arange(sampling_times).float()[:, None]).all()
+
+    noise = sample_uniform((3, sampling_times, 4), "antithetic", dim=1)
+    half = sampling_times // 2
+    assert torch.allclose(noise[:, :half] + noise[:, half:], torch.ones(1))
@@ -58,3 +58,176 @@ def test_fix():
         optim.step()
 
     assert (context_model.context_hat < 1e-5).all()
+
+
+def test_cached_context_hat():
+    max_context_dim = 3
+    task_num = 4
+    context_clip = 0.3
+
+    context_model = ContextModel(
+        meta=True,
+        max_context_dim=max_context_dim,
+        task_num=task_num,
+        init_scale=1.0,
+        context_clip=context_clip,
+    )
+    idx = torch.randint(0, task_num, (8, 1))
+
+    def expected():
+        return torch.clamp(
+            context_model._context_hat.detach(), -context_clip, context_clip
+        )
+
+    with torch.no_grad():
+        cached = context_model.context_hat
+        assert context_model.context_hat is cached
+        assert torch.equal(cached, expected())
+        assert torch.equal(context_model(idx), expected()[idx[..., 0]])
+
+        # in-place updates, e.g. optimizer steps, invalidate the cache
+        context_model._context_hat.mul_(0.5)
+        assert context_model.context_hat is not cached
+        assert torch.equal(context_model.context_hat, expected())
+
+        context_model.set_context(torch.full((task_num, max_context_dim), 0.1))
+        assert torch.equal(context_model.context_hat, expected())
+
+    # the fused lookup matches the full table and still backpropagates
+    context_model.fix([0])
+    context = context_model(idx)
+    assert torch.equal(context.detach(), expected()[idx[..., 0]])
+    context.sum().backward()
+    grad = context_model._context_hat.grad
+    assert (grad[:, 0] == 0).all()
+    assert grad[:, 1:].sum() > 0
+
+
+def test_encoder_context_model():
+    from intact.modules.models.context_model import EncoderContextModel
+
+    obs_dim = 4
+    action_dim = 1
+    max_context_dim = 3
+    task_num = 5
+    batch_size = 32
+
+    context_model = EncoderContextModel(
+        obs_dim=obs_dim,
+        action_dim=action_dim,
+        meta=True,
+        max_context_dim=max_context_dim,
+        task_num=task_num,
+    )
+    # only the encoder is learned
+    num_params = sum(p.numel() for p in context_model.parameters())
+    context_model.reset(1000)
+    assert sum(p.numel() for p in context_model.parameters()) == num_params
+    context_model.reset(task_num)
+
+    observation = torch.randn(batch_size, obs_dim)
+    action = torch.randn(batch_size, action_dim)
+    next_observation = torch.randn(batch_size, obs_dim)
+    reward = torch.randn(batch_size, 1)
+    idx = torch.randint(0, task_num - 1, (batch_size, 1))
+    transitions = (observation, action, next_observation, reward, idx)
+
+    with context_model.encoding(*transitions) as context_hat:
+        assert context_hat.shape == (task_num, max_context_dim)
+        context = context_model(idx)
+        assert context.shape == (batch_size, max_context_dim)
+        context.sum().backward()
+    assert all(p.grad is not None for p in context_model.parameters())
+
+    # out of the scope, the encoded contexts are looked up without gradients
+    assert not context_model(idx).requires_grad
+    assert torch.equal(context_model(idx), context_hat.detach()[idx[:, 0]])
+    # while the transitions were left out of their own contexts
+    assert not torch.allclose(context.detach(), context_model(idx))
+    # the task without transitions keeps its context
+    assert (context_model.context_hat[-1] == 0).all()
+    assert (
+        context_model.context_hat.abs() <= context_model.context_clip
+    ).all()
+
+    # streaming inference averages the embeddings of every batch
+    context_model.reset()
+    with torch.no_grad():
+        context_model.encode(*transitions, accumulate=True)
+        context_model.encode(*transitions, accumulate=True)
+        streamed = context_model.context_hat.clone()
+        context_model.encode(*transitions)
+    assert torch.allclose(streamed, context_model.context_hat, atol=1e-6)
+
+
+def test_encoder_context_model_mask():
+    from intact.modules.models.context_model import EncoderContextModel
+
+    obs_dim = 4
+    action_dim = 1
+    task_num = 3
+    batch_size, seq_len, valid_len = 4, 6, 2
+
+    context_model = EncoderContextModel(
+        obs_dim=obs_dim,
+        action_dim=action_dim,
+        meta=True,
+        max_context_dim=2,
+        task_num=task_num,
+    )
+    observation = torch.randn(batch_size, seq_len, obs_dim)
+    action = torch.randn(batch_size, seq_len, action_dim)
+    next_observation = torch.randn(batch_size, seq_len, obs_dim)
+    reward = torch.randn(batch_size, seq_len, 1)
+    idx = torch.tensor([0, 1, 1, 2]).expand(seq_len, -1).T.unsqueeze(-1)
+    # the padded steps are 0, indexed to task 0
+    mask = torch.arange(seq_len) < valid_len
+    mask = mask.expand(batch_size, -1)
+    transitions = [observation, action, next_observation, reward, idx]
+    padded = [torch.where(mask.unsqueeze(-1), x, 0) for x in transitions]
+
+    with torch.no_grad():
+        valid = [x[:, :valid_len] for x in transitions]
+        expected = context_model.encode(*valid)
+        context_hat = context_model.encode(*padded, mask=mask)
+        assert torch.allclose(context_hat, expected)
+        assert not torch.allclose(context_model.encode(*padded), expected)
+
+
+def test_encoder_context_model_leave_one_out():
+    from intact.modules.models.context_model import EncoderContextModel
+
+    obs_dim = 4
+    action_dim = 1
+    task_num = 3
+    batch_size = 12
+
+    context_model = EncoderContextModel(
+        obs_dim=obs_dim,
+        action_dim=action_dim,
+        meta=True,
+        max_context_dim=2,
+        task_num=task_num,
+    )
+    observation = torch.randn(batch_size, obs_dim)
+    action = torch.randn(batch_size, action_dim)
+    next_observation = torch.randn(batch_size, obs_dim)
+    reward = torch.randn(batch_size, 1)
+    idx = (torch.arange(batch_size) % task_num).unsqueeze(-1)
+
+    with torch.no_grad():
+        with context_model.encoding(
+            observation, action, next_observation, reward, idx
+        ):
+            context = context_model(idx)
+        # the targets of a transition don't change its own context
+        next_observation[0] += 1.0
+        reward[0] += 1.0
+        with context_model.encoding(
+            observation, action, next_observation, reward, idx
+        ):
+            changed_context = context_model(idx)
+    assert torch.allclose(changed_context[0], context[0], atol=1e-6)
+    # but change the contexts of the other transitions of its task
+    assert not torch.allclose(changed_context[task_num], context[task_num])
+    assert torch.allclose(changed_context[1:task_num], context[1:task_num])
@@ -1,6 +1,10 @@
 import torch
 
-from intact.modules.models.layers import ParallelLinear, ParallelGRUCell
+from intact.modules.models.layers import (
+    ParallelLinear,
+    ParallelGRUCell,
+    parallel_gru_cell,
+)
 
 
 def test_parallel_linear():
@@ -39,3 +43,150 @@ def test_parallel_gru_cell():
 
     outputs = parallel_gru_cell(inputs, hx)
     assert outputs.shape == (*extra_dims, batch_size, hidden_size)
+
+
+def test_parallel_linear_gathered_forward():
+    in_features = 6
+    out_features = 5
+    extra_dims = [4]
+    batch_size = 32
+
+    parallel_linear = ParallelLinear(
+        in_features=in_features,
+        out_features=out_features,
+        extra_dims=extra_dims,
+    )
+
+    mask = torch.rand(*extra_dims, in_features) > 0.5
+    gather_idx = torch.argsort((~mask).int(), dim=-1, stable=True)
+    gather_mask = mask.gather(-1, gather_idx)
+
+    inputs = torch.randn(batch_size, in_features)
+    outputs = parallel_linear.gathered_forward(inputs, gather_idx, gather_mask)
+    dense_outputs = parallel_linear(inputs * mask.unsqueeze(-2).float())
+
+    assert outputs.shape == (*extra_dims, batch_size, out_features)
+    assert torch.allclose(outputs, dense_outputs, atol=1e-6)
+
+    # without gradients the packed weight is cached until the weight changes
+    with torch.no_grad():
+        parallel_linear.gathered_forward(inputs, gather_idx, gather_mask)
+        packed_weight = parallel_linear._packed_weight
+        parallel_linear.gathered_forward(inputs, gather_idx, gather_mask)
+        assert parallel_linear._packed_weight is packed_weight
+
+        parallel_linear.weight.add_(1.0)
+        outputs = parallel_linear.gathered_forward(
+            inputs, gather_idx, gather_mask
+        )
+        assert parallel_linear._packed_weight is not packed_weight
+        dense_outputs = parallel_linear(inputs * mask.unsqueeze(-2).float())
+        assert torch.allclose(outputs, dense_outputs, atol=1e-5)
+
+
+def test_parallel_linear_masked_forward():
+    in_features = 6
+    out_features = 5
+    batch_size = 8
+    sampling_times = 3
+
+    for extra_dims in [[4], [2, 4]]:
+        parallel_linear = ParallelLinear(
+            in_features=in_features,
+            out_features=out_features,
+            extra_dims=extra_dims,
+        )
+
+        mask = torch.rand(4, sampling_times, batch_size, in_features) > 0.5
+        inputs = torch.randn(batch_size, in_features)
+        outputs = parallel_linear.masked_forward(inputs, mask)
+        dense_outputs = parallel_linear(
+            (mask * inputs).reshape(4, -1, in_features)
+        )
+
+        assert outputs.shape == (
+            *extra_dims,
+            sampling_times * batch_size,
+            out_features,
+        )
+        assert torch.allclose(outputs, dense_outputs, atol=1e-6)
+
+
+def test_parallel_linear_init():
+    in_features = 16
+    out_features = 8
+    extra_dims = [3, 50]
+
+    parallel_linear = ParallelLinear(
+        in_features=in_features,
+        out_features=out_features,
+        extra_dims=extra_dims,
+    )
+
+    # same bounds as nn.Linear, for every slice
+    bound = 1 / in_features**0.5
+    assert parallel_linear.weight.abs().max() <= bound
+    assert parallel_linear.bias.abs().max() <= bound
+    assert parallel_linear.weight.std() > bound / 2
+    assert not torch.allclose(
+        parallel_linear.weight[0, 0], parallel_linear.weight[2, 49]
+    )
+
+
+def test_parallel_gru_cell_rollout():
+    input_size = 3
+    hidden_size = 20
+    extra_dims = [10]
+    batch_size = 32
+    time_steps = 5
+
+    parallel_gru_cell_module = ParallelGRUCell(
+        input_size=input_size,
+        hidden_size=hidden_size,
+        extra_dims=extra_dims,
+    )
+    params = (
+        parallel_gru_cell_module.weight_ih,
+        parallel_gru_cell_module.weight_hh,
+        parallel_gru_cell_module.bias_ih,
+        parallel_gru_cell_module.bias_hh,
+    )
+
+    inputs_seq = torch.randn(time_steps, *extra_dims, batch_size, input_size)
+    h0 = torch.randn(*extra_dims, batch_size, hidden_size)
+
+    hx, expected = h0, []
+    for t in range(time_steps):
+        hx = parallel_gru_cell(inputs_seq[t], hx, *params)
+        expected.append(hx)
+    expected = torch.stack(expected)
+
+    outputs = parallel_gru_cell_module.rollout(inputs_seq, h0)
+    assert outputs.shape == (time_steps, *extra_dims, batch_size, hidden_size)
+    assert torch.allclose(outputs, expected, atol=1e-5)
+
+    # without gradient, the fused step reuses its buffers
+    with torch.no_grad():
+        outputs = parallel_gru_cell_module.rollout(inputs_seq, h0)
+        step_output = parallel_gru_cell_module(inputs_seq[0], h0)
+    assert torch.allclose(outputs, expected, atol=1e-5)
+    assert torch.allclose(step_output, expected[0], atol=1e-5)
+
+
+def test_parallel_gru_cell_state_after_no_grad():
+    parallel_gru_cell = ParallelGRUCell(
+        input_size=3, hidden_size=20, extra_dims=[10]
+    )
+    keys = set(parallel_gru_cell.state_dict().keys())
+
+    inputs = torch.randn(10, 32, 3)
+    with torch.no_grad():
+        parallel_gru_cell(inputs)
+        parallel_gru_cell.rollout(inputs.expand(5, -1, -1, -1))
+
+    # the reused gate buffers are not part of the module state
+    assert set(parallel_gru_cell.state_dict().keys()) == keys
+    parallel_gru_cell = parallel_gru_cell.to(torch.float64)
+    with torch.no_grad():
+        outputs = parallel_gru_cell(inputs.double())
+    assert outputs.dtype == torch.float64
@@ -36,3 +36,151 @@ def test_cem():
 
     mdp_env.reset()
     planner.planning(td)
+
+
+def test_tensor_backend():
+    import torch
+    from intact.modules.models.mdp_world_model import CausalWorldModel
+    from intact.modules.tensordict_module.mdp_wrapper import MDPWrapper
+    from torchrl.envs import GymEnv
+
+    obs_dim = 4
+    action_dim = 1
+
+    world_model = CausalWorldModel(
+        obs_dim=obs_dim,
+        action_dim=action_dim,
+        max_context_dim=0,
+        task_num=0,
+    )
+    causal_mdp_wrapper = MDPWrapper(world_model)
+
+    proof_env = GymEnv("MyCartPole-v0")
+    mdp_env = MDPEnv(causal_mdp_wrapper, termination_fns="cartpole")
+    mdp_env.set_specs_from_env(proof_env)
+
+    td = proof_env.reset()
+    actions = {}
+    for backend in ["tensordict", "tensor"]:
+        planner = MyCEMPlanner(
+            env=mdp_env,
+            planning_horizon=5,
+            optim_steps=3,
+            num_candidates=20,
+            top_k=4,
+            backend=backend,
+        )
+        torch.manual_seed(0)
+        actions[backend] = planner.planning(td)
+
+    assert actions["tensor"].shape == (action_dim,)
+    assert torch.allclose(actions["tensor"], actions["tensordict"])
+
+
+def test_warm_start():
+    import torch
+    from intact.modules.models.mdp_world_model import CausalWorldModel
+    from intact.modules.tensordict_module.mdp_wrapper import MDPWrapper
+    from torchrl.envs import GymEnv, StepCounter, TransformedEnv
+
+    world_model = CausalWorldModel(
+        obs_dim=4,
+        action_dim=1,
+        max_context_dim=0,
+        task_num=0,
+    )
+    causal_mdp_wrapper = MDPWrapper(world_model)
+
+    proof_env = GymEnv("MyCartPole-v0")
+    mdp_env = MDPEnv(causal_mdp_wrapper, termination_fns="cartpole")
+    mdp_env.set_specs_from_env(proof_env)
+    # episodes of at most 5 steps, reset within the rollout
+    env = TransformedEnv(GymEnv("MyCartPole-v0"), StepCounter(5))
+
+    for backend in ["tensordict", "tensor"]:
+        planner = MyCEMPlanner(
+            env=mdp_env,
+            planning_horizon=5,
+            optim_steps=3,
+            num_candidates=20,
+            top_k=4,
+            backend=backend,
+            warm_start=True,
+            warm_optim_steps=1,
+        )
+        calls = []
+
+        def policy(td):
+            last_action_means = planner._last_action_means
+            action_means, action_stds, optim_steps = planner.init_action_stats(
+                td
+            )
+            calls.append(td["step_count"].item())
+            assert not td["done"].any()
+            assert (action_stds == 1).all()
+            if td["step_count"].item() == 0:
+                # a new episode starts from scratch
+                assert optim_steps == 3
+                assert (action_means == 0).all()
+            else:
+                assert optim_steps == 1
+                assert torch.equal(
+                    action_means[..., :-1, :], last_action_means[..., 1:, :]
+                )
+                assert (action_means[..., -1, :] == 0).all()
+            return td.set("action", planner.planning(td))
+
+        with torch.no_grad():
+            env.rollout(12, policy, break_when_any_done=False)
+        assert calls.count(0) >= 3
+
+        planner.reset()
+        assert planner._last_action_means is None
+
+
+def test_compact_rollout():
+    import torch
+    from intact.modules.models.mdp_world_model import PlainMDPWorldModel
+    from intact.modules.planners.cem import _PrecomputedActionsSequentialSetter
+    from intact.modules.planners.rollout import truncated_return
+    from intact.modules.tensordict_module.mdp_wrapper import MDPWrapper
+    from torchrl.envs import GymEnv
+
+    num_candidates = 20
+    planning_horizon = 10
+
+    # a deterministic model, so both rollouts see the same transitions
+    world_model = PlainMDPWorldModel(
+        obs_dim=4, action_dim=1, learn_obs_var=False
+    )
+    mdp_wrapper = MDPWrapper(world_model)
+
+    proof_env = GymEnv("MyCartPole-v0")
+    mdp_env = MDPEnv(mdp_wrapper, termination_fns="cartpole")
+    mdp_env.set_specs_from_env(proof_env)
+
+    td = proof_env.reset()
+    actions = torch.rand(num_candidates, planning_horizon, 1) * 2 - 1
+    expanded_td = td.unsqueeze(-1).expand(num_candidates).to_tensordict()
+
+    sum_rewards = {}
+    for compact in [False, True]:
+        planner = MyCEMPlanner(
+            env=mdp_env,
+            planning_horizon=planning_horizon,
+            optim_steps=1,
+            num_candidates=num_candidates,
+            top_k=4,
+            compact_rollout=compact,
+        )
+        rollout_td = planner.reward_truncated_rollout(
+            _PrecomputedActionsSequentialSetter(actions), expanded_td.clone()
+        )
+        sum_rewards[compact] = rollout_td.get(("next", "reward")).sum(-2)
+
+        returns = truncated_return(
+            mdp_env, td["observation"], actions, compact=compact
+        )
+        assert torch.allclose(returns, sum_rewards[compact], atol=1e-5)
+
+    assert torch.allclose(sum_rewards[True], sum_rewards[False], atol=1e-5)
@@ -0,0 +1,93 @@
+import pytest
+import torch
+
+from intact.envs.mdp_env import MDPEnv
+from intact.modules.planners.icem import ICEMPlanner
+
+
+def test_icem():
+    from intact.modules.models.mdp_world_model import CausalWorldModel
+    from intact.modules.tensordict_module.mdp_wrapper import MDPWrapper
+    from torchrl.envs import GymEnv
+
+    obs_dim = 4
+    action_dim = 1
+    max_context_dim = 0
+    task_num = 0
+
+    world_model = CausalWorldModel(
+        obs_dim=obs_dim,
+        action_dim=action_dim,
+        max_context_dim=max_context_dim,
+        task_num=task_num,
+    )
+    causal_mdp_wrapper = MDPWrapper(world_model)
+
+    proof_env = GymEnv("MyCartPole-v0")
+    mdp_env = MDPEnv(causal_mdp_wrapper, termination_fns="cartpole")
+    mdp_env.set_specs_from_env(proof_env)
+
+    planner = ICEMPlanner(
+        env=mdp_env,
+        planning_horizon=5,
+        optim_steps=3,
+        num_candidates=20,
+        top_k=4,
+    )
+
+    td = proof_env.reset()
+    action = planner.planning(td)
+    assert action.shape == (action_dim,)
+
+    # the last elites are shifted and carried over to the next call
+    last_elites = planner._last_elites
+    assert last_elites.shape == (1, 5, action_dim)
+    elites = planner.init_elites(td, torch.zeros(1, 5, action_dim))
+    assert torch.equal(elites[..., :-1, :], last_elites[..., 1:, :])
+    assert (elites[..., -1, :] == 0).all()
+
+    td = planner(td)
+    assert mdp_env.action_spec.is_in(td["action"])
+
+    # a new episode drops them
+    td["done"] = torch.ones_like(td["done"])
+    elites = planner.init_elites(td, torch.zeros(1, 5, action_dim))
+    assert (elites == 0).all()
+    planner.reset()
+    assert planner.init_elites(td, torch.zeros(1, 5, action_dim)) is None
+
+    # a positive fraction keeps at least one elite
+    planner = ICEMPlanner(
+        env=mdp_env,
+        planning_horizon=5,
+        optim_steps=3,
+        num_candidates=20,
+        top_k=2,
+        keep_elite_frac=0.3,
+    )
+    assert planner.keep_elite_num == 1
+    with pytest.raises(ValueError):
+        ICEMPlanner(
+            env=mdp_env,
+            planning_horizon=5,
+            optim_steps=3,
+            num_candidates=20,
+            top_k=2,
+            keep_elite_frac=1.5,
+        )
+
+
+def test_colored_noise():
+    from intact.modules.planners.icem import colored_noise
+
+    for beta in [0.0, 2.0]:
+        noise = colored_noise((4000, 10, 2), beta, time_dim=-2)
+        assert noise.shape == (4000, 10, 2)
+        assert torch.allclose(noise.var(dim=0), torch.ones(10, 2), atol=0.15)
+
+    # smoother noise has a higher correlation between neighbouring steps
+    white = colored_noise((4000, 10), 0.0, time_dim=-1)
+    pink = colored_noise((4000, 10), 2.0, time_dim=-1)
+    white_corr = torch.corrcoef(white[:, 4:6].T)[0, 1]
+    pink_corr = torch.corrcoef(pink[:, 4:6].T)[0, 1]
+    assert pink_corr > white_corr + 0.3
@@ -0,0 +1,41 @@
+import torch
+
+from intact.envs.mdp_env import MDPEnv
+from intact.modules.planners.mppi import MPPIPlanner
+
+
+def test_mppi():
+    from intact.modules.models.mdp_world_model import CausalWorldModel
+    from intact.modules.tensordict_module.mdp_wrapper import MDPWrapper
+    from torchrl.envs import GymEnv
+
+    obs_dim = 4
+    action_dim = 1
+    max_context_dim = 0
+    task_num = 0
+
+    world_model = CausalWorldModel(
+        obs_dim=obs_dim,
+        action_dim=action_dim,
+        max_context_dim=max_context_dim,
+        task_num=task_num,
+    )
+    causal_mdp_wrapper = MDPWrapper(world_model)
+
+    proof_env = GymEnv("MyCartPole-v0")
+    mdp_env = MDPEnv(causal_mdp_wrapper, termination_fns="cartpole")
+    mdp_env.set_specs_from_env(proof_env)
+
+    planner = MPPIPlanner(
+        env=mdp_env,
+        planning_horizon=5,
+        optim_steps=3,
+        num_candidates=20,
+    )
+
+    td = proof_env.reset()
+    action = planner.planning(td)
+    assert action.shape == (action_dim,)
+
+    td = planner(td)
+    assert mdp_env.action_spec.is_in(td["action"])
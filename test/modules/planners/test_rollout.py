@@ -0,0 +1,18 @@
+import torch
+from torchrl.data import BoundedTensorSpec
+
+from intact.modules.planners.rollout import project_actions_
+
+
+def test_project_actions_():
+    action_spec = BoundedTensorSpec(
+        low=torch.tensor([-1.0, 0.0]), high=torch.tensor([1.0, 2.0])
+    )
+    actions = torch.randn(8, 10, 5, 2) * 3
+    data_ptr = actions.data_ptr()
+
+    projected = project_actions_(action_spec, actions)
+    assert projected.data_ptr() == data_ptr
+    assert action_spec.is_in(actions)
+    assert (actions[..., 0].abs() <= 1).all()
+    assert ((actions[..., 1] >= 0) & (actions[..., 1] <= 2)).all()
@@ -96,3 +96,124 @@ def test_causal_mdp_wrapper():
     causal_mdp_wrapper.causal_mask
     causal_mdp_wrapper.context_model
     causal_mdp_wrapper.reset()
+
+
+def test_infer_context():
+    obs_dim = 4
+    action_dim = 1
+    max_context_dim = 3
+    task_num = 5
+    batch_size = 500
+
+    torch.manual_seed(0)
+    for world_model_class in [PlainMDPWorldModel, CausalWorldModel]:
+        world_model = world_model_class(
+            obs_dim=obs_dim,
+            action_dim=action_dim,
+            meta=True,
+            max_context_dim=max_context_dim,
+            task_num=task_num,
+        )
+        mdp_wrapper = MDPWrapper(world_model)
+        kwargs = (
+            dict(deterministic_mask=True)
+            if world_model_class is CausalWorldModel
+            else {}
+        )
+        context_gt = (torch.rand(task_num, max_context_dim) - 0.5) * 0.5
+        world_model.context_model.set_context(context_gt)
+
+        def make_batch():
+            td = TensorDict(
+                {
+                    "observation": torch.randn(batch_size, obs_dim),
+                    "action": torch.randn(batch_size, action_dim),
+                    "idx": torch.randint(0, task_num, (batch_size, 1)),
+                },
+                batch_size=batch_size,
+            )
+            with torch.no_grad():
+                td = mdp_wrapper(td, **kwargs)
+            td["next", "observation"] = td["obs_mean"]
+            td["next", "reward"] = td["reward_mean"]
+            return td
+
+        batches = [make_batch() for _ in range(3)]
+        world_model.context_model.set_context(
+            torch.zeros(task_num, max_context_dim)
+        )
+        errors = []
+        for td in batches:
+            context_hat = mdp_wrapper.infer_context(
+                td, newton_steps=2, prior_precision=1e-2
+            )
+            errors.append((context_hat - context_gt).abs().max())
+        assert errors[-1] < 0.05
+        assert world_model.context_model.context_precision.shape == (
+            task_num,
+            max_context_dim,
+            max_context_dim,
+        )
+
+
+def test_amortized_context():
+    obs_dim = 4
+    action_dim = 1
+    max_context_dim = 3
+    task_num = 5
+    batch_size = 32
+
+    world_model = CausalWorldModel(
+        obs_dim=obs_dim,
+        action_dim=action_dim,
+        meta=True,
+        max_context_dim=max_context_dim,
+        task_num=task_num,
+        amortized_context=True,
+    )
+    mdp_wrapper = MDPWrapper(world_model)
+    td = TensorDict(
+        {
+            "observation": torch.randn(batch_size, obs_dim),
+            "action": torch.randn(batch_size, action_dim),
+            "idx": torch.randint(0, task_num, (batch_size, 1)),
+            "next": {
+                "observation": torch.randn(batch_size, obs_dim),
+                "reward": torch.randn(batch_size, 1),
+            },
+        },
+        batch_size=batch_size,
+    )
+
+    # the contexts are encoded from the transitions of the training batch
+    td = mdp_wrapper(td)
+    td["obs_mean"].sum().backward()
+    assert all(
+        p.grad is not None for p in mdp_wrapper.get_parameter("context")
+    )
+
+    # the targets of a transition don't leak into its own prediction
+    with torch.no_grad():
+        obs_mean = mdp_wrapper(td.clone(), deterministic_mask=True)["obs_mean"]
+        td["next", "observation"][0] += 1.0
+        td["next", "reward"][0] += 1.0
+        changed_obs_mean = mdp_wrapper(td.clone(), deterministic_mask=True)[
+            "obs_mean"
+        ]
+    assert torch.allclose(changed_obs_mean[0], obs_mean[0], atol=1e-6)
+    same_task = (td["idx"] == td["idx"][0]).squeeze(-1)
+    same_task[0] = False
+    if same_task.any():
+        assert not torch.allclose(
+            changed_obs_mean[same_task], obs_mean[same_task]
+        )
+
+    # and looked up without transitions, e.g. in model rollouts
+    td = mdp_wrapper(td.exclude("next"))
+    assert td["obs_mean"].shape == (batch_size, obs_dim)
+
+    # new transitions refine the contexts in one forward pass
+    td["next", "observation"] = torch.randn(batch_size, obs_dim)
+    td["next", "reward"] = torch.randn(batch_size, 1)
+    context_hat = mdp_wrapper.infer_context(td)
+    assert context_hat.shape == (task_num, max_context_dim)
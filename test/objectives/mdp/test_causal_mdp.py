@@ -1,3 +1,4 @@
+import pytest
 import torch
 from tensordict import TensorDict
 from torch.optim import Adam
@@ -97,3 +98,229 @@ def test_reinforce_forward():
 
     td = causal_mdp_wrapper(td)
     mask_grad = mdp_loss.reinforce_forward(td)
+
+
+def test_reinforce_sampling_modes():
+    obs_dim = 4
+    action_dim = 1
+    max_context_dim = 10
+    task_num = 100
+    batch_size = 32
+    batch_len = 1
+
+    world_model = CausalWorldModel(
+        obs_dim=obs_dim,
+        action_dim=action_dim,
+        meta=True,
+        max_context_dim=max_context_dim,
+        task_num=task_num,
+    )
+    causal_mdp_wrapper = MDPWrapper(world_model)
+
+    td = TensorDict(
+        {
+            "observation": torch.randn(batch_size, batch_len, obs_dim),
+            "action": torch.randn(batch_size, batch_len, action_dim),
+            "idx": torch.randint(0, task_num, (batch_size, batch_len, 1)),
+            "next": {
+                "terminated": torch.randn(batch_size, batch_len, 1) > 0,
+                "reward": torch.randn(batch_size, batch_len, 1),
+                "observation": torch.randn(batch_size, batch_len, obs_dim),
+            },
+            "collector": {
+                "mask": torch.ones(batch_size, batch_len, dtype=torch.bool)
+            },
+        },
+        batch_size=(batch_size, batch_len),
+    )
+
+    for sampling_mode in ["antithetic", "stratified"]:
+        mdp_loss = CausalWorldModelLoss(
+            causal_mdp_wrapper,
+            sampling_times=10,
+            mask_sampling_mode=sampling_mode,
+            mask_grad_estimator="loo",
+        )
+        mask_grad, mask_grad_var = mdp_loss.reinforce_forward(
+            td, return_variance=True
+        )
+        assert mask_grad.shape == mask_grad_var.shape
+        assert mask_grad.shape == world_model.causal_mask.mask_logits.shape
+
+
+def test_rollout_forward():
+    obs_dim = 4
+    action_dim = 1
+    max_context_dim = 10
+    task_num = 100
+    batch_size = 8
+    batch_len = 3
+
+    world_model = CausalWorldModel(
+        obs_dim=obs_dim,
+        action_dim=action_dim,
+        meta=True,
+        max_context_dim=max_context_dim,
+        task_num=task_num,
+    )
+    causal_mdp_wrapper = MDPWrapper(world_model)
+
+    td = TensorDict(
+        {
+            "observation": torch.randn(batch_size, batch_len, obs_dim),
+            "action": torch.randn(batch_size, batch_len, action_dim),
+            "idx": torch.randint(0, task_num, (batch_size, batch_len, 1)),
+        },
+        batch_size=(batch_size, batch_len),
+    )
+    observation = td.get("observation").clone()
+
+    mdp_loss = CausalWorldModelLoss(causal_mdp_wrapper)
+    rollout_td = mdp_loss.rollout_forward(td, deterministic_mask=True)
+    assert torch.equal(td.get("observation"), observation)
+
+    obs_mean = None
+    for t in range(batch_len):
+        step_td = td[:, t].clone()
+        if t > 0:
+            step_td.set("observation", obs_mean)
+        step_td = causal_mdp_wrapper(step_td, deterministic_mask=True)
+        obs_mean = step_td.get("obs_mean")
+        for key in ["observation", "obs_mean", "reward_mean", "causal_mask"]:
+            assert torch.allclose(rollout_td.get(key)[:, t], step_td.get(key))
+
+    mdp_loss = CausalWorldModelLoss(causal_mdp_wrapper, teacher_forcing=True)
+    rollout_td = mdp_loss.rollout_forward(td, deterministic_mask=True)
+    step_td = causal_mdp_wrapper(td[:, 1].clone(), deterministic_mask=True)
+    assert torch.allclose(
+        rollout_td.get("obs_mean")[:, 1], step_td.get("obs_mean")
+    )
+
+
+def test_weighted_loss():
+    obs_dim = 4
+    action_dim = 1
+    max_context_dim = 10
+    task_num = 100
+    batch_size = 8
+    batch_len = 3
+
+    world_model = CausalWorldModel(
+        obs_dim=obs_dim,
+        action_dim=action_dim,
+        meta=True,
+        max_context_dim=max_context_dim,
+        task_num=task_num,
+    )
+    causal_mdp_wrapper = MDPWrapper(world_model)
+
+    mask = torch.ones(batch_size, batch_len, dtype=torch.bool)
+    mask[: batch_size // 2, -1] = False
+    td = TensorDict(
+        {
+            "observation": torch.randn(batch_size, batch_len, obs_dim),
+            "action": torch.randn(batch_size, batch_len, action_dim),
+            "idx": torch.randint(0, task_num, (batch_size, batch_len, 1)),
+            "next": {
+                "terminated": torch.randn(batch_size, batch_len, 1) > 0,
+                "reward": torch.randn(batch_size, batch_len, 1),
+                "observation": torch.randn(batch_size, batch_len, obs_dim),
+            },
+            "collector": {"mask": mask},
+        },
+        batch_size=(batch_size, batch_len),
+    )
+
+    gather_loss = CausalWorldModelLoss(causal_mdp_wrapper)
+    weight_loss = CausalWorldModelLoss(
+        causal_mdp_wrapper, loss_mask_mode="weight"
+    )
+
+    gather_td, gather_total = gather_loss(td, deterministic_mask=True)
+    weight_td, weight_total = weight_loss(td, deterministic_mask=True)
+    assert torch.allclose(gather_total, weight_total)
+    assert weight_td.batch_size == mask.shape
+    assert torch.allclose(
+        weight_td["transition_loss"][mask], gather_td["transition_loss"]
+    )
+    assert (weight_td["reward_loss"][~mask] == 0).all()
+
+    loss_td, total_loss = weight_loss(
+        td, deterministic_mask=True, return_loss_td=False
+    )
+    assert loss_td is None
+    assert torch.allclose(total_loss, weight_total)
+
+
+def test_ensemble_loss():
+    obs_dim = 4
+    action_dim = 1
+    max_context_dim = 10
+    task_num = 100
+    batch_size = 32
+    batch_len = 2
+
+    world_model = CausalWorldModel(
+        obs_dim=obs_dim,
+        action_dim=action_dim,
+        meta=True,
+        max_context_dim=max_context_dim,
+        task_num=task_num,
+        ensemble_size=3,
+    )
+    causal_mdp_wrapper = MDPWrapper(world_model)
+    mdp_loss = CausalWorldModelLoss(causal_mdp_wrapper, sampling_times=5)
+
+    td = TensorDict(
+        {
+            "observation": torch.randn(batch_size, batch_len, obs_dim),
+            "action": torch.randn(batch_size, batch_len, action_dim),
+            "idx": torch.randint(0, task_num, (batch_size, batch_len, 1)),
+            "next": {
+                "terminated": torch.randn(batch_size, batch_len, 1) > 0,
+                "reward": torch.randn(batch_size, batch_len, 1),
+                "observation": torch.randn(batch_size, batch_len, obs_dim),
+            },
+            "collector": {
+                "mask": torch.ones(batch_size, batch_len, dtype=torch.bool)
+            },
+        },
+        batch_size=(batch_size, batch_len),
+    )
+
+    loss_td, total_loss = mdp_loss(td)
+    total_loss.backward()
+    assert loss_td["transition_loss"].shape == (
+        batch_size * batch_len,
+        obs_dim,
+    )
+
+    mask_grad = mdp_loss.reinforce_forward(td)
+    assert mask_grad.shape == world_model.causal_mask.mask_logits.shape
+
+    # identical members only get different gradients from the bootstrap
+    with torch.no_grad():
+        for param in world_model.nets.parameters():
+            param.copy_(param[:1].expand_as(param))
+    for bootstrap in [False, True]:
+        mdp_loss = CausalWorldModelLoss(
+            causal_mdp_wrapper, sampling_times=5, bootstrap=bootstrap
+        )
+        world_model.zero_grad()
+        mdp_loss(td, deterministic_mask=True)[1].backward()
+        grad = world_model.nets["para_mlp"][0].weight.grad
+        assert torch.allclose(grad[0], grad[1]) != bootstrap
+
+
+def test_amortized_mutual_info_warning():
+    world_model = CausalWorldModel(
+        obs_dim=4,
+        action_dim=1,
+        meta=True,
+        max_context_dim=3,
+        task_num=5,
+        amortized_context=True,
+    )
+    causal_mdp_wrapper = MDPWrapper(world_model)
+    with pytest.warns(UserWarning, match="amortized contexts"):
+        CausalWorldModelLoss(causal_mdp_wrapper, lambda_mutual_info=1.0)
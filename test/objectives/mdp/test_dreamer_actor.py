@@ -21,3 +21,29 @@ def test_dreamer_actor():
     td[("collector", "mask")] = torch.ones(10).to(bool)
 
     model_loss(td)
+
+
+def test_compact_rollout():
+    config = MDPConfig()
+    env = make_mdp_env("MyCartPole-v0")
+    world_model, model_based_env, actor, critic = make_mdp_dreamer(config, env)
+
+    model_loss = DreamActorLoss(
+        actor_model=actor,
+        value_model=critic,
+        model_based_env=model_based_env,
+        compact_rollout=True,
+    )
+
+    td = env.rollout(10, auto_reset=True)
+    td[("collector", "mask")] = torch.ones(10).to(bool)
+
+    loss_td, fake_data = model_loss(td)
+    loss_td["loss_actor"].backward()
+
+    done = fake_data.get(("next", "done"))
+    # once done, a row stays done in the compacted rollout
+    assert (done[..., 1:, :] >= done[..., :-1, :]).all()
+    # and its later steps are masked out of the losses
+    valid = fake_data.get(("collector", "mask"))
+    assert not (valid[..., 1:] & done[..., :-1, 0]).any()
@@ -25,3 +25,98 @@ def test_mcc():
 
     mcc = mean_corr_coef(x, y)
     print(mcc)
+
+
+def test_kernel_ridge_regression():
+    from sklearn.kernel_ridge import KernelRidge
+    from sklearn.metrics import r2_score
+
+    from intact.stats.mcc import kernel_ridge_regression
+
+    sample_num = 100
+    np.random.seed(0)
+
+    x = np.random.randn(sample_num, 2)
+    y = np.concatenate([np.abs(x), np.random.randn(sample_num, 1)], axis=1)
+
+    result_matrix = kernel_ridge_regression(x, y)
+    for i in range(x.shape[1]):
+        for j in range(y.shape[1]):
+            krr = KernelRidge(alpha=1.0, kernel="rbf", gamma=3.0)
+            krr.fit(x[:, i : i + 1], y[:, j])
+            r2 = r2_score(y[:, j], krr.predict(x[:, i : i + 1]))
+            assert np.isclose(result_matrix[i, j], r2)
+
+    result_matrix = kernel_ridge_regression(x, y, num_landmarks=30)
+    assert result_matrix.shape == (2, 3)
+    assert result_matrix[0, 0] > 0.5 and result_matrix[1, 1] > 0.5
+
+
+def test_kernel_independence_test():
+    from causallearn.utils.KCI.KCI import KCI_UInd
+
+    from intact.stats.mcc import kernel_independence_test
+
+    sample_num = 100
+    np.random.seed(0)
+
+    x = np.random.randn(sample_num, 2)
+    y = np.abs(x) + 0.1 * np.random.randn(sample_num, 2)
+
+    # the gamma approximation is deterministic
+    result_matrix = kernel_independence_test(x, y, approx=True)
+    ci_test = KCI_UInd(approx=True)
+    for i in range(x.shape[1]):
+        for j in range(y.shape[1]):
+            p_value, _ = ci_test.compute_pvalue(
+                x[:, i : i + 1], y[:, j : j + 1]
+            )
+            assert np.isclose(result_matrix[i, j], 1 - min(0.05, p_value) * 20)
+
+    for num_landmarks in [None, 50]:
+        result_matrix = kernel_independence_test(
+            x, y, num_landmarks=num_landmarks
+        )
+        assert np.allclose(np.diag(result_matrix), 1.0)
+
+
+def test_mcc_tracker():
+    import torch
+
+    from intact.stats.mcc import MCCTracker, mean_corr_coef
+
+    task_num = 50
+    torch.manual_seed(0)
+
+    context_gt = torch.randn(task_num, 3)
+    for method in ["pearson", "spearman"]:
+        tracker = MCCTracker(context_gt, method=method)
+        for hat_dim in [2, 3, 5]:
+            context_hat = torch.randn(task_num, hat_dim)
+            context_hat[:, 0] += context_gt[:, 1]
+            mcc = tracker.update(context_hat)
+            score, permutation = mean_corr_coef(
+                context_hat.numpy(),
+                context_gt.numpy(),
+                method=method,
+                return_permutation=True,
+            )
+            assert np.isclose(mcc.item(), score, atol=1e-5)
+            assert np.allclose(tracker.permutation[0], permutation[0])
+            assert np.allclose(tracker.permutation[1], permutation[1])
+
+    # distinct best matches are taken directly
+    tracker = MCCTracker(context_gt)
+    tracker.update(context_gt[:, [2, 0, 1]] + 0.1 * torch.randn(task_num, 3))
+    assert tracker.solve_num == 0
+
+    # two estimated dims prefer the same true dim, the assignment is solved
+    context_hat = context_gt[:, [0, 0, 2]] + 0.1 * torch.randn(task_num, 3)
+    for _ in range(5):
+        context_hat += 0.001 * torch.randn(task_num, 3)
+        mcc = tracker.update(context_hat)
+        score = mean_corr_coef(context_hat.numpy(), context_gt.numpy())
+        assert np.isclose(mcc.item(), score, atol=1e-5)
+    assert tracker.solve_num == 5
+
+    assert tracker.update(torch.zeros(task_num, 0)).item() == 0
@@ -32,3 +32,59 @@ def test_mutual_info_estimation():
     dependent_result = [single_test(False) for i in range(test_num)]
     print("independent: ", sum(independent_result) / test_num)
     print("dependent: ", sum(dependent_result) / test_num)
+
+
+def test_scalable_mutual_info_estimation():
+    from intact.stats.kernel import kernel_classes
+
+    torch.manual_seed(0)
+
+    batch_size = 200
+    dim = 4
+    values = torch.randn(batch_size, dim) @ torch.randn(dim, dim)
+
+    for kernel_type in ["gaussian", "parzen"]:
+        kernel = kernel_classes[kernel_type](bandwidth=1.0)
+        # the reference computes every marginal separately
+        expected = kernel(values, values)
+        for i in range(dim):
+            expected = expected - kernel(
+                values[:, i : i + 1], values[:, i : i + 1]
+            )
+
+        mi = mutual_info_estimation(
+            values, kernel_type=kernel_type, reduction="none"
+        )
+        assert torch.allclose(mi, expected, atol=1e-4)
+        mi = mutual_info_estimation(
+            values, kernel_type=kernel_type, reduction="none", chunk_size=64
+        )
+        assert torch.allclose(mi, expected, atol=1e-4)
+
+    mi = mutual_info_estimation(
+        values, reduction="none", num_anchors=50, chunk_size=64
+    )
+    assert mi.shape == (batch_size,) and torch.isfinite(mi).all()
+
+
+def test_chunked_mutual_info_memory():
+    torch.manual_seed(0)
+
+    batch_size = 256
+    values = torch.randn(batch_size, 4)
+
+    def saved_numel(chunk_size):
+        inputs = values.clone().requires_grad_()
+        numel = []
+        with torch.autograd.graph.saved_tensors_hooks(
+            lambda x: numel.append(x.numel()) or x, lambda x: x
+        ):
+            mi = mutual_info_estimation(inputs, chunk_size=chunk_size)
+        mi.backward()
+        return sum(numel), inputs.grad
+
+    full_numel, full_grad = saved_numel(None)
+    chunked_numel, chunked_grad = saved_numel(32)
+    assert torch.allclose(chunked_grad, full_grad, atol=1e-5)
+    # the differences of the chunks are recomputed in the backward pass
+    assert chunked_numel < full_numel / 4
@@ -5,3 +5,46 @@ def test_make_mdp_env():
     env = make_mdp_env("MyCartPole-v0")
     assert env is not None
     env.close()
+
+
+def test_make_batch_mdp_env():
+    import torch
+    from tensordict import TensorDict
+
+    from intact.utils.envs.mdp_env import make_batch_mdp_env
+
+    task_num = 10
+    oracle_context = TensorDict(
+        {"c1": torch.rand(task_num), "c2": torch.rand(task_num)},
+        batch_size=task_num,
+    )
+    env = make_batch_mdp_env("MultiNode53L-v0", oracle_context, max_steps=20)
+    assert env.batch_size == (task_num,)
+    contexts = env.base_env.contexts
+    assert (contexts[:, 0] == oracle_context["c1"]).all()
+    assert (contexts[:, 1] == oracle_context["c2"]).all()
+    assert (contexts[:, 2] == 0).all()
+
+    rollout = env.rollout(100)
+    assert rollout.shape == (task_num, 20)
+    assert rollout["next", "truncated"][:, -1].all()
+    assert (rollout["next", "step_count"][:, -1] == 20).all()
+
+
+def test_make_batch_cartpole_env():
+    import torch
+    from tensordict import TensorDict
+
+    from intact.utils.envs.mdp_env import make_batch_mdp_env
+
+    task_num = 10
+    oracle_context = TensorDict(
+        {"gravity": torch.rand(task_num) * 15 + 5},
+        batch_size=task_num,
+    )
+    env = make_batch_mdp_env("MyCartPole-v0", oracle_context, max_steps=20)
+    assert (env.base_env.gravity == oracle_context["gravity"]).all()
+
+    rollout = env.rollout(100, break_when_any_done=False)
+    assert rollout.shape == (task_num, 100)
+    assert (rollout["next", "step_count"] <= 20).all()
@@ -0,0 +1,51 @@
+import torch
+from omegaconf import DictConfig
+from torchrl.envs.utils import check_env_specs
+
+from intact.utils.envs.mdp_env import make_mdp_env
+from intact.utils.envs.meta_env import create_make_env_list
+from intact.utils.envs.parallel_env import ParallelMetaEnv
+
+
+def policy(tensordict):
+    # deterministic, so that the rollouts only depend on the env seeds
+    observation = tensordict.get("observation")
+    tensordict.set("action", torch.tanh(3 * observation[..., :1]))
+    return tensordict
+
+
+def test_parallel_meta_env():
+    task_num = 5
+    cfg = DictConfig(
+        {
+            "meta": True,
+            "env_name": "MyCartPole-v0",
+            "oracle_context": {
+                "gravity": (5.0, 20.0),
+            },
+            "task_num": task_num,
+        }
+    )
+    make_env_list, oracle_context = create_make_env_list(
+        cfg, make_mdp_env, mode="meta_train"
+    )
+
+    serial_env = ParallelMetaEnv(make_env_list, num_workers=0, seed=1)
+    check_env_specs(serial_env)
+    serial_env.set_seed(1)
+    serial_rollout = serial_env.rollout(100, policy, break_when_any_done=False)
+    serial_env.close()
+
+    assert serial_rollout.shape == (task_num, 100)
+    assert (serial_rollout["idx"][:, 0, 0] == torch.arange(task_num)).all()
+    # the done tasks are reset and go on
+    assert serial_rollout["next", "done"].any()
+
+    parallel_env = ParallelMetaEnv(make_env_list, num_workers=2, seed=1)
+    parallel_rollout = parallel_env.rollout(
+        100, policy, break_when_any_done=False
+    )
+    parallel_env.close()
+
+    for key in serial_rollout.keys(True, True):
+        assert (serial_rollout[key] == parallel_rollout[key]).all(), key
@@ -0,0 +1,89 @@
+import pytest
+import tensordict
+import torch
+from tensordict import TensorDict
+
+from intact.utils.data import (
+    match_length,
+    chunk_sequences,
+    SequenceReplayBuffer,
+)
+
+
+def make_batch(valid_len, seq_len):
+    batch_size = len(valid_len)
+    mask = torch.arange(seq_len) < torch.tensor(valid_len).unsqueeze(-1)
+    return TensorDict(
+        {
+            "observation": torch.randn(batch_size, seq_len, 3),
+            "next": {"reward": torch.randn(batch_size, seq_len, 1)},
+            "collector": {"mask": mask},
+        },
+        batch_size=[batch_size, seq_len],
+    )
+
+
+@pytest.mark.parametrize("length", [1, 4, 13, 20])
+def test_match_length(length):
+    batch_td = make_batch([13, 5, 1, 8], 13)
+    new_seq_len = (13 + length - 1) // length * length
+    expected = torch.stack(
+        [tensordict.pad(td, [0, new_seq_len - 13]) for td in batch_td], 0
+    )
+
+    matched_td = match_length(batch_td, length)
+    assert matched_td.shape == (4, new_seq_len)
+    assert (matched_td == expected).all()
+
+    chunked_td = chunk_sequences(batch_td, length)
+    assert chunked_td.shape == (4 * new_seq_len // length, length)
+    assert (chunked_td == expected.reshape(-1, length)).all()
+
+
+def test_chunk_sequences_window():
+    batch_td = make_batch([13, 5, 1, 8], 13)
+    chunked_td = chunk_sequences(batch_td, 4, mode="window")
+    # 4 windows for 13 steps, 2 for 5 steps, 1 padded for 1 step, 2 for 8 steps
+    assert chunked_td.shape == (9, 4)
+    assert chunked_td["collector", "mask"].sum() == 4 * 8 + 1
+
+    observation = batch_td["observation"]
+    assert (chunked_td["observation"][2] == observation[0, 8:12]).all()
+    # the last window ends at the last valid step
+    assert (chunked_td["observation"][3] == observation[0, 9:13]).all()
+    assert (chunked_td["observation"][5] == observation[1, 1:5]).all()
+    assert (chunked_td["observation"][6, 0] == observation[2, 0]).all()
+
+    with pytest.raises(NotImplementedError):
+        chunk_sequences(batch_td, 4, mode="unknown")
+
+
+def test_sequence_replay_buffer():
+    batch_td = make_batch([13, 5, 2], 13)
+    batch_td.set("step", torch.arange(13).expand(3, 13).unsqueeze(-1))
+    batch_td.set("idx", torch.tensor([0, 1, 1]).expand(13, 3).T.unsqueeze(-1))
+
+    replay_buffer = SequenceReplayBuffer(max_size=30, batch_length=4)
+    replay_buffer.extend(batch_td)
+    assert len(replay_buffer) == 20
+
+    sampled_td = replay_buffer.sample(1000)
+    assert sampled_td.shape == (1000, 4)
+    mask = sampled_td["collector", "mask"]
+    # 10 windows for 13 steps, 2 for 5 steps, 1 padded for 2 steps
+    assert mask.sum(-1).tolist().count(2) > 0
+    assert (mask.sum(-1) >= 2).all()
+    assert (sampled_td["step"][~mask] == 0).all()
+
+    # the windows are consecutive steps of one episode of one task
+    step, idx = sampled_td["step"][..., 0], sampled_td["idx"][..., 0]
+    assert ((step[:, 1:] == step[:, :-1] + 1) | ~mask[:, 1:]).all()
+    assert ((idx == idx[:, :1]) | ~mask).all()
+
+    # the oldest transitions are overwritten
+    replay_buffer.extend(batch_td)
+    assert len(replay_buffer) == 30
+    sampled_td = replay_buffer.sample(1000)
+    mask = sampled_td["collector", "mask"]
+    step = sampled_td["step"][..., 0]
+    assert ((step[:, 1:] == step[:, :-1] + 1) | ~mask[:, 1:]).all()
@@ -0,0 +1,86 @@
+import time
+from functools import partial
+
+import pytest
+from torchrl.collectors.collectors import (
+    aSyncDataCollector,
+    RandomPolicy,
+    SyncDataCollector,
+)
+from torchrl.data.replay_buffers import TensorDictReplayBuffer, ListStorage
+
+from intact.utils.data import match_length
+from intact.utils.envs.mdp_env import make_mdp_env
+from intact.utils.pipeline import CollectorPipeline
+
+
+class ScalarLogger:
+    def __init__(self):
+        self.scalers = {}
+
+    def add_scaler(self, name, value):
+        self.scalers.setdefault(name, []).append(value)
+
+
+def test_collector_pipeline():
+    batch_num, frames_per_batch, batch_length = 5, 40, 4
+    env = make_mdp_env("MyCartPole-v0")
+    collector = aSyncDataCollector(
+        create_env_fn=partial(make_mdp_env, "MyCartPole-v0"),
+        policy=RandomPolicy(env.action_spec),
+        total_frames=batch_num * frames_per_batch,
+        frames_per_batch=frames_per_batch,
+        split_trajs=True,
+    )
+    replay_buffer = TensorDictReplayBuffer(storage=ListStorage(max_size=1000))
+    logger = ScalarLogger()
+
+    pipeline = CollectorPipeline(
+        collector,
+        replay_buffer,
+        preprocess_fn=lambda td: match_length(td, batch_length).reshape(
+            -1, batch_length
+        ),
+        max_queue_size=2,
+        max_staleness=2,
+        logger=logger,
+    )
+    frames, sequences = 0, 0
+    for tensordict in pipeline:
+        assert tensordict.shape[-1] == batch_length
+        frames += tensordict.get(("collector", "mask")).sum().item()
+        sequences += tensordict.shape[0]
+        # the collection goes on while training
+        time.sleep(0.05)
+        pipeline.record_updates(1)
+    pipeline.shutdown()
+    collector.shutdown()
+
+    assert frames == batch_num * frames_per_batch
+    assert len(replay_buffer) == sequences
+    # the weights are published every 2 updates
+    assert pipeline.weight_version == batch_num // 2
+    for name in [
+        "queue_depth",
+        "learner_idle_time",
+        "collector_idle_time",
+        "data_staleness",
+    ]:
+        assert len(logger.scalers["pipeline/{}".format(name)]) == batch_num
+    assert max(logger.scalers["pipeline/queue_depth"]) > 0
+    # the queued batches are behind the updates recorded while they waited
+    assert max(logger.scalers["pipeline/data_staleness"]) > 0
+
+
+def test_collector_pipeline_in_process():
+    env = make_mdp_env("MyCartPole-v0")
+    collector = SyncDataCollector(
+        create_env_fn=env,
+        policy=RandomPolicy(env.action_spec),
+        total_frames=40,
+        frames_per_batch=40,
+    )
+    # the policy would run in the background thread while it is trained
+    with pytest.raises(TypeError):
+        CollectorPipeline(collector)
+    collector.shutdown()
@@ -6,7 +6,7 @@ import numpy as np
 
 from intact.utils.envs.mdp_env import make_mdp_env
 from intact.utils.envs.meta_env import create_make_env_list
-from intact.utils.plot import plot_context
+from intact.utils.plot import plot_context, ContextPlotter
 
 tmp_dir = tempfile.gettempdir()
 
@@ -58,3 +58,37 @@ def test_plot_context2():
         log_prefix=log_prefix,
         color_values=np.random.randn(task_num),
     )
+
+
+def test_context_plotter():
+    task_num = 5
+
+    config = MDPConfig()
+    config.env_name = "MyCartPole-v0"
+    config.oracle_context = {
+        "gravity": (5.0, 20.0),
+        "cart_vel_bias": (-1.0, 1.0),
+    }
+    config.meta = True
+    config.task_num = task_num
+
+    make_env_list, oracle_context = create_make_env_list(
+        config, make_mdp_env, mode="meta_train"
+    )
+
+    env = make_mdp_env(config.env_name)
+    world_model, model_based_env = make_mdp_model(config, env)
+
+    log_prefix = os.path.join(tmp_dir, "test_context_plotter")
+    plotter = ContextPlotter(
+        config, oracle_context, log_prefix=log_prefix, plot_interval=1e3
+    )
+    mcc = plotter(world_model, 0)
+    assert 0 <= mcc.item() <= 1
+    for log_idx in range(1, 3):
+        assert plotter(world_model, log_idx) is None
+    plotter.close()
+
+    # only the first call is logged and plotted within the interval
+    assert os.path.exists(os.path.join(log_prefix, "0.png"))
+    assert not os.path.exists(os.path.join(log_prefix, "1.png"))